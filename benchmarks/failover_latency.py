@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    Measures the time elapsed between the detection of a node failure
+    (or recovery) and the execution of the corresponding action, with
+    the legacy polling loop and with the event-driven loop used by
+    `OnionServer`.
+
+    Usage: python3 benchmarks/failover_latency.py [rounds]
+'''
+
+from os.path import dirname, abspath
+from sys import argv, path
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from src.models import Cluster, Node
+
+from statistics import mean, median
+from threading import Thread, Event
+from time import monotonic as time, sleep
+
+
+_DEADTIME = 1
+_HEARTBEAT_INTERVAL = 0.05
+
+
+def _create_cluster():
+    cluster = Cluster()
+    cluster.register(*(
+        Node(
+            id=i,
+            address=f'10.0.0.1{i}',
+            port=7500,
+            deadtime=_DEADTIME,
+            is_current_node=i == 2)
+        for i in (1, 2)
+    ))
+
+    return cluster
+
+
+def _polling_loop(cluster, wakeup, on_change, stop):
+    wakeups = 0
+
+    while not stop.is_set():
+        on_change(cluster.get_next_active_node())
+        wakeups += 1
+        sleep(0.5)
+
+    return wakeups
+
+
+def _event_loop(cluster, wakeup, on_change, stop):
+    wakeups = 0
+
+    while not stop.is_set():
+        wakeup.clear()
+        on_change(cluster.get_next_active_node())
+        wakeups += 1
+        wakeup.wait(cluster.next_expiry)
+
+    return wakeups
+
+
+def _heartbeat(node, running):
+    while running.is_set():
+        node.mark_as_alive()
+        sleep(_HEARTBEAT_INTERVAL)
+
+
+def measure(loop, rounds):
+    '''
+    Runs the specified main loop and returns the failover latencies,
+    the failback latencies and the number of wakeups per second.
+
+    '''
+    cluster = _create_cluster()
+    master, current_node = cluster.nodes
+    wakeup, stop = Event(), Event()
+    master_running, current_running = Event(), Event()
+    cluster.add_listener(lambda node: wakeup.set())
+
+    elected = {'node': None, 'time': 0}
+
+    def on_change(node):
+        if node is not elected['node']:
+            elected['node'] = node
+            elected['time'] = time()
+
+    master_running.set()
+    current_running.set()
+    Thread(target=_heartbeat, args=(master, master_running)).start()
+    Thread(target=_heartbeat, args=(current_node, current_running)).start()
+
+    thread = Thread(target=loop, args=(cluster, wakeup, on_change, stop))
+
+    sleep(0.2)
+    thread.start()
+
+    failovers, failbacks = [], []
+
+    for _ in range(rounds):
+        # The master stops sending heartbeats
+        sleep(0.3)
+        master_running.clear()
+        expiry = time() + master.expires_in
+
+        while elected['node'] is not current_node:
+            sleep(0.001)
+
+        failovers.append(elected['time'] - expiry)
+
+        # The master comes back
+        sleep(0.3)
+        recovery = time()
+        master_running.set()
+        Thread(target=_heartbeat, args=(master, master_running)).start()
+
+        while elected['node'] is not master:
+            sleep(0.001)
+
+        failbacks.append(elected['time'] - recovery)
+
+    stop.set()
+    wakeup.set()
+    thread.join()
+    master_running.clear()
+    current_running.clear()
+
+    # Counts the wakeups of an idle loop over a fixed period
+    stop.clear()
+    result = {}
+    thread = Thread(target=lambda: result.update(
+        wakeups=loop(cluster, wakeup, lambda node: None, stop)))
+
+    master_running.set()
+    current_running.set()
+    Thread(target=_heartbeat, args=(master, master_running)).start()
+    Thread(target=_heartbeat, args=(current_node, current_running)).start()
+
+    sleep(0.2)
+    start = time()
+    thread.start()
+    sleep(5)
+    stop.set()
+    wakeup.set()
+    thread.join()
+    idle_wakeups = result['wakeups'] / (time() - start)
+
+    master_running.clear()
+    current_running.clear()
+
+    return failovers, failbacks, idle_wakeups
+
+
+def main():
+    rounds = int(argv[1]) if len(argv) > 1 else 5
+
+    print(f'Rounds: {rounds}, dead time: {_DEADTIME} s, '
+          f'heartbeat interval: {_HEARTBEAT_INTERVAL} s\n')
+
+    print(f'{"Mode":10} {"Failover (ms)":>22} {"Failback (ms)":>22} '
+          f'{"Idle wakeups/s":>16}')
+    print(f'{"":10} {"mean":>10} {"median":>11} {"mean":>10} '
+          f'{"median":>11}')
+
+    for name, loop in (('polling', _polling_loop),
+                       ('event', _event_loop)):
+        failovers, failbacks, idle_wakeups = measure(loop, rounds)
+
+        print(f'{name:10} '
+              f'{mean(failovers) * 1000:10.1f} '
+              f'{median(failovers) * 1000:11.1f} '
+              f'{mean(failbacks) * 1000:10.1f} '
+              f'{median(failbacks) * 1000:11.1f} '
+              f'{idle_wakeups:16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    Measures the packets sent per second and the CPU time spent per
+    node to send and process heartbeats, in unicast and in multicast
+    mode, for clusters of 10, 50 and 200 simulated nodes.
+
+    The datagrams are really sent on the loopback interface (multicast
+    datagrams with a TTL of 0). In multicast mode, every node is
+    assumed to acknowledge the multicast heartbeats.
+
+    Usage: python3 benchmarks/heartbeat_fanout.py [ticks]
+'''
+
+from os.path import dirname, abspath
+from sys import argv, path
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from src.models import Cluster, Node, Gateway
+from src.services import HeartbeatService, ListenerService
+from src.sockets import UDPSocket
+from src import protocol
+
+from time import process_time
+
+
+_INTERVAL = 0.5
+_PORT = 17599
+_GROUP = '239.255.75.0'
+
+
+class _CountingSocket:
+    '''
+    Forwards the datagrams to a real socket and counts them.
+
+    '''
+    def __init__(self, socket):
+        self._socket = socket
+        self.sent = 0
+
+    def send(self, payload, address, port):
+        self.sent += 1
+
+        try:
+            self._socket.send(payload, address, port)
+
+        except OSError:
+            pass
+
+    @property
+    def port(self):
+        return _PORT
+
+
+def _create_cluster(size):
+    cluster = Cluster()
+    cluster.register(*(
+        Node(
+            id=i,
+            address=f'127.0.{i // 256}.{i % 256}',
+            port=_PORT,
+            deadtime=2.5,
+            is_current_node=i == 1)
+        for i in range(1, size + 1)
+    ))
+
+    return cluster
+
+
+def _incoming(cluster, multicast, tick):
+    '''
+    Returns the heartbeats received from the other nodes during one
+    interval.
+
+    '''
+    return [
+        (protocol.encode(
+            type=protocol.HEARTBEAT,
+            node_id=node.id,
+            sequence=tick,
+            flags=protocol.FLAG_MULTICAST if multicast else 0,
+            payload=protocol.encode_bitmap([1]) if multicast else b''),
+         node.address)
+        for node in cluster.nodes[1:]
+    ]
+
+
+def measure(size, multicast, ticks):
+    '''
+    Returns the number of packets sent per second by a node and the CPU
+    time spent per second by this node (in milliseconds).
+
+    '''
+    cluster = _create_cluster(size)
+    gateways = [Gateway(1, '127.0.0.1', 2)]
+    udp_socket = UDPSocket()
+
+    if multicast:
+        udp_socket.join_multicast_group(_GROUP, '127.0.0.1', ttl=0)
+
+    socket = _CountingSocket(udp_socket)
+
+    heartbeat = HeartbeatService(
+        cluster, gateways, socket,
+        interval=_INTERVAL,
+        multicast_group=_GROUP if multicast else None)
+
+    listener = ListenerService(cluster, gateways, socket)
+
+    # The first interval, during which the protocol of the nodes and
+    # the multicast acknowledgements are learned, is not measured
+    incoming = [
+        _incoming(cluster, multicast, tick)
+        for tick in range(ticks + 1)
+    ]
+
+    for tick in range(ticks + 1):
+        if tick == 1:
+            socket.sent = 0
+            start = process_time()
+
+        heartbeat._repeat(cluster, gateways, socket)
+
+        for payload, address in incoming[tick]:
+            listener._process(cluster, socket, payload, address, _PORT)
+
+    elapsed = process_time() - start
+    udp_socket.close()
+
+    packets = socket.sent / ticks / _INTERVAL
+    cpu = elapsed / ticks / _INTERVAL * 1000
+
+    return packets, cpu
+
+
+def main():
+    ticks = int(argv[1]) if len(argv) > 1 else 200
+
+    print(f'Ticks: {ticks}, heartbeat interval: {_INTERVAL} s\n')
+    print(f'{"Nodes":>6} {"Mode":>10} {"Sent/s per node":>16} '
+          f'{"Sent/s cluster":>15} {"CPU ms/s per node":>18}')
+
+    for size in (10, 50, 200):
+        for multicast in (False, True):
+            packets, cpu = measure(size, multicast, ticks)
+            mode = 'multicast' if multicast else 'unicast'
+
+            print(f'{size:>6} {mode:>10} {packets:>16.1f} '
+                  f'{packets * size:>15.1f} {cpu:>18.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    Measures the memory used per node, the time needed to evaluate the
+    liveness of all the nodes and the time needed to copy their state,
+    with and without the liveness table, for clusters of 10, 100 and
+    500 simulated nodes.
+
+    Usage: python3 benchmarks/liveness_table.py [repeats]
+'''
+
+from os.path import dirname, abspath
+from sys import argv, path
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from time import perf_counter
+from tracemalloc import start, stop, get_traced_memory
+
+from src.models import Cluster, Node
+
+
+def _create_cluster(size, liveness_table):
+    cluster = Cluster(liveness_table=liveness_table)
+    cluster.register(*(
+        Node(
+            id=i,
+            address=f'10.0.{i // 256}.{i % 256}',
+            port=7500,
+            deadtime=2,
+            is_current_node=i == 1)
+        for i in range(1, size + 1)
+    ))
+
+    for node in cluster.nodes:
+        node.mark_as_alive()
+
+    return cluster
+
+
+def _copy(cluster):
+    if cluster.table is not None:
+        return cluster.table.copy()
+
+    return [
+        (node.detector.expires_at, node.detector.last_heartbeat,
+         node.is_active)
+        for node in cluster.nodes
+    ]
+
+
+def _timeit(function, repeats):
+    start_time = perf_counter()
+
+    for _ in range(repeats):
+        function()
+
+    return (perf_counter() - start_time) / repeats * 1e6
+
+
+def measure(size, liveness_table, repeats):
+    '''
+    Returns the memory used per node (in bytes), the time needed to
+    evaluate the liveness of all the nodes and the time needed to copy
+    their state (in microseconds).
+
+    '''
+    start()
+    cluster = _create_cluster(size, liveness_table)
+    memory = get_traced_memory()[0] / size
+    stop()
+
+    liveness = _timeit(cluster.liveness, repeats)
+    copy = _timeit(lambda: _copy(cluster), repeats)
+
+    return memory, liveness, copy
+
+
+def main():
+    repeats = int(argv[1]) if len(argv) > 1 else 1000
+
+    print(f'Repeats: {repeats}\n')
+    print(f'{"Nodes":>6} {"Table":>6} {"Bytes per node":>15} '
+          f'{"Liveness (us)":>14} {"Copy (us)":>10}')
+
+    for size in (10, 100, 500):
+        for liveness_table in (False, True):
+            memory, liveness, copy = measure(size, liveness_table, repeats)
+            table = 'yes' if liveness_table else 'no'
+
+            print(f'{size:>6} {table:>6} {memory:>15.0f} '
+                  f'{liveness:>14.1f} {copy:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
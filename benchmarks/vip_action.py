@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    Checks the built-in `vip` action and compares the time needed to
+    add and remove a virtual IP address through rtnetlink and by
+    running `ip address add/del`, without the announcements.
+
+    Run it in an unprivileged network namespace, on a dummy or veth
+    interface (created if possible) or on the loopback interface:
+
+    Usage: unshare -rn python3 benchmarks/vip_action.py [rounds]
+'''
+
+from os.path import dirname, abspath
+from sys import argv, path
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from src.actions import VirtualIPAction
+from src.netlink import NetlinkSocket
+from src.utils import run_command
+
+from ipaddress import ip_interface
+from statistics import mean, median
+from time import monotonic as time
+
+
+_ADDRESSES = ('10.0.0.100/24', 'fd00::100/64')
+
+
+def _create_interface():
+    '''
+    Creates a dummy interface (or a veth pair) in the current network
+    namespace. Returns its name, or `lo` if none of them is supported.
+
+    '''
+    if (run_command(['ip', 'link', 'add', 'vip0', 'type', 'dummy']) or
+        run_command(['ip', 'link', 'add', 'vip0', 'type', 'veth',
+                     'peer', 'name', 'vip1'])):
+        interface = 'vip0'
+        run_command(['ip', 'link', 'set', 'vip1', 'up'])
+
+    else:
+        interface = 'lo'
+
+    run_command(['ip', 'link', 'set', interface, 'up'])
+    return interface
+
+
+def check(interface):
+    '''
+    Verifies that the action assigns and removes the addresses and that
+    both operations are idempotent.
+
+    '''
+    with NetlinkSocket() as netlink:
+        for address in _ADDRESSES:
+            action = VirtualIPAction(address, interface)
+
+            for _ in range(2):
+                action.activate()
+                assert (ip_interface(address) in
+                        netlink.get_addresses(interface))
+
+            for _ in range(2):
+                action.deactivate()
+                assert (ip_interface(address) not in
+                        netlink.get_addresses(interface))
+
+
+def measure(add, remove, rounds):
+    '''
+    Returns the durations of the `add` then `remove` operations (in
+    seconds).
+
+    '''
+    durations = []
+
+    for _ in range(rounds):
+        start = time()
+        add()
+        remove()
+        durations.append(time() - start)
+
+    return durations
+
+
+def main():
+    rounds = int(argv[1]) if len(argv) > 1 else 100
+    interface = _create_interface()
+    address = _ADDRESSES[0]
+
+    check(interface)
+    print(f'Interface: {interface}, rounds: {rounds}\n')
+    print('The vip action is idempotent.\n')
+
+    action = VirtualIPAction(address, interface, announce_count=0)
+
+    modes = (
+        ('netlink', action.activate, action.deactivate),
+        ('iproute2',
+         lambda: run_command(['ip', 'address', 'add', address,
+                              'dev', interface]),
+         lambda: run_command(['ip', 'address', 'del', address,
+                              'dev', interface])),
+    )
+
+    print(f'{"Mode":10} {"Add + del (ms)":>22}')
+    print(f'{"":10} {"mean":>10} {"median":>11}')
+
+    for name, add, remove in modes:
+        durations = measure(add, remove, rounds)
+
+        print(f'{name:10} '
+              f'{mean(durations) * 1000:10.2f} '
+              f'{median(durations) * 1000:11.2f}')
+
+
+if __name__ == '__main__':
+    main()
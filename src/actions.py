@@ -0,0 +1,499 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+
+from .logs import Logger
+from .netlink import NetlinkSocket
+from .arp import Announcer
+
+from os import killpg
+from signal import SIGTERM, SIGKILL
+from subprocess import Popen, STDOUT, DEVNULL, TimeoutExpired
+from tempfile import TemporaryFile
+from threading import Thread, Condition, Timer, Event
+from time import monotonic
+
+
+class ActionExecutor:
+    '''
+    Executes the actions of Onion HA (the commands run when the node
+    becomes active or passive) in a dedicated thread, one at a time, so
+    that the election never waits for them.
+
+    Only the last action submitted matters: an action waiting for its
+    turn is dropped when a new one is submitted, and the running action
+    is cancelled if the new one is different. An action exceeding its
+    timeout is stopped. A stopped action receives SIGTERM, then SIGKILL
+    after `kill_delay` seconds, along with the processes it started.
+
+    An action ends when its process exits: the processes it leaves in
+    the background do not delay it. The output of the commands is
+    written to a temporary file, which these processes can keep open,
+    then to the log. An action can
+    also be a built-in action (a function such as
+    `VirtualIPAction.activate`): it runs in the thread of the executor
+    and cannot be cancelled.
+
+    :type timeout: float
+    :param timeout: (Optional) The maximum execution time of an action
+        (in seconds). The default timeout is 60 seconds.
+
+    :type kill_delay: float
+    :param kill_delay: (Optional) The waiting time between SIGTERM and
+        SIGKILL (in seconds). The default delay is 5 seconds.
+
+    '''
+    _MAX_OUTPUT_LINES = 50
+
+    def __init__(self, timeout=60, kill_delay=5):
+        self._timeout = timeout
+        self._kill_delay = kill_delay
+        self._listeners = []
+
+        self._pending = None
+        self._process = None
+        self._current = None
+        self._cancelled = False
+        self._is_running = True
+
+        self._condition = Condition()
+        self._thread = Thread(target=self._run)
+
+    def add_listener(self, callback):
+        '''
+        Registers a function to call when an action starts or ends. The
+        function receives the name of the action, its result (`None`
+        when it starts, then `success`, `failure`, `timeout` or
+        `cancelled`) and its duration (in seconds).
+
+        '''
+        self._listeners.append(callback)
+
+    def _notify(self, name, result, duration):
+        for callback in self._listeners:
+            callback(name, result, duration)
+
+    def submit(self, name, command):
+        '''
+        Submits an action. This operation is non-blocking.
+
+        :type name: str
+        :param name: The name of the action (`active` or `passive`).
+
+        :type command: list of str or callable
+        :param command: The command to execute or a built-in action.
+
+        '''
+        with self._condition:
+            if self._pending:
+                Logger.get().info(
+                    f'The {self._pending[0]} action has been '
+                    f'superseded by the {name} action')
+
+            self._pending = (name, command)
+
+            if self._process and self._current != name:
+                self._cancelled = True
+                self._stop(self._process)
+
+            self._condition.notify()
+
+    def _stop(self, process):
+        '''
+        Sends SIGTERM to the process group of an action, then SIGKILL
+        after `kill_delay` seconds. The group is signaled even if the
+        process of the action has exited, since the processes it
+        started may still be running.
+
+        '''
+        def kill(signal):
+            try:
+                killpg(process.pid, signal)
+
+            except OSError:
+                pass
+
+        kill(SIGTERM)
+
+        timer = Timer(self._kill_delay, kill, [SIGKILL])
+        timer.daemon = True
+        timer.start()
+
+    def _log_output(self, name, output):
+        lines = output.decode(errors='replace').splitlines()
+        logger = Logger.get()
+
+        truncated = len(lines) - self._MAX_OUTPUT_LINES
+
+        if truncated > 0:
+            logger.info(f'[{name}] ({truncated} lines truncated)')
+            lines = lines[truncated:]
+
+        for line in lines:
+            logger.info(f'[{name}] {line}')
+
+    def _execute_builtin(self, name, function):
+        logger = Logger.get()
+        start = monotonic()
+
+        with self._condition:
+            self._current = name
+
+        self._notify(name, None, 0)
+
+        try:
+            function()
+            result = 'success'
+
+        # Any error is reported, so that the executor keeps running the
+        # next actions
+        except Exception as err:
+            logger.error(f'The {name} action failed: {err}')
+            result = 'failure'
+
+        with self._condition:
+            self._current = None
+
+        duration = monotonic() - start
+
+        if result == 'success':
+            logger.info(f'The {name} action succeeded in '
+                        f'{duration * 1000:.1f} ms')
+
+        self._notify(name, result, duration)
+
+    def _wait(self, process):
+        '''
+        Waits for the end of the process of an action. Returns `True`
+        if it exits before the timeout.
+
+        '''
+        try:
+            process.wait(timeout=self._timeout)
+            return True
+
+        except TimeoutExpired:
+            pass
+
+        self._stop(process)
+
+        # SIGKILL is sent after `kill_delay` seconds. A process stuck
+        # in an uninterruptible sleep is abandoned.
+        try:
+            process.wait(timeout=self._kill_delay + 1)
+
+        except TimeoutExpired:
+            Logger.get().error(f'The process {process.pid} cannot be '
+                               f'killed')
+
+        return False
+
+    def _execute(self, name, command):
+        if callable(command):
+            self._execute_builtin(name, command)
+            return
+
+        with TemporaryFile() as output:
+            self._execute_command(name, command, output)
+
+    def _execute_command(self, name, command, output):
+        logger = Logger.get()
+        start = monotonic()
+
+        try:
+            process = Popen(
+                command,
+                stdin=DEVNULL,
+                stdout=output,
+                stderr=STDOUT,
+                start_new_session=True)
+
+        except OSError as err:
+            logger.error(f'The {name} action cannot be executed: {err}')
+            self._notify(name, 'failure', 0)
+            return
+
+        with self._condition:
+            self._process = process
+            self._current = name
+            self._cancelled = False
+
+        self._notify(name, None, 0)
+
+        if self._wait(process):
+            result = 'success' if process.returncode == 0 else 'failure'
+
+        else:
+            result = 'timeout'
+
+        with self._condition:
+            self._process = None
+            self._current = None
+
+            if self._cancelled:
+                result = 'cancelled'
+
+        duration = monotonic() - start
+
+        output.seek(0)
+        self._log_output(name, output.read())
+
+        if result == 'success':
+            logger.info(f'The {name} action succeeded in '
+                        f'{duration * 1000:.0f} ms')
+
+        elif result == 'failure':
+            logger.error(f'The {name} action failed with exit code '
+                         f'{process.returncode} in '
+                         f'{duration * 1000:.0f} ms')
+
+        elif result == 'timeout':
+            logger.error(f'The {name} action has been stopped after '
+                         f'{self._timeout} seconds')
+
+        else:
+            logger.warn(f'The {name} action has been cancelled')
+
+        self._notify(name, result, duration)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._is_running:
+                    self._condition.wait()
+
+                if self._pending is None:
+                    return
+
+                name, command = self._pending
+                self._pending = None
+
+            self._execute(name, command)
+
+    def start(self):
+        '''
+        Starts the executor. This operation is non-blocking.
+
+        '''
+        self._thread.start()
+
+    def shutdown(self):
+        '''
+        Executes the pending action, then stops the executor and waits
+        for the end of its execution.
+
+        '''
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+        self._thread.join()
+
+    @property
+    def timeout(self):
+        '''
+        The maximum execution time of an action (in seconds).
+
+        '''
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self._timeout = timeout
+
+    @property
+    def is_busy(self):
+        '''
+        Indicates whether an action is running or waiting for its turn.
+        Returns a `boolean`.
+
+        '''
+        return self._process is not None or self._pending is not None
+
+
+class VirtualIPAction:
+    '''
+    The built-in `vip` action: assigns a virtual IP address to an
+    interface when the node becomes active and removes it when the node
+    becomes passive. The address is changed through rtnetlink, without
+    starting any process, and both operations are idempotent.
+
+    Once the address is assigned, a burst of gratuitous ARP requests
+    (or unsolicited neighbor advertisements for an IPv6 address) is
+    sent on the interface, so that the clients stop sending their
+    packets to the previous active node without waiting for their ARP
+    cache to expire. The first announcement is sent by the action, the
+    others in the background.
+
+    :type address: str
+    :param address: The virtual IP address and its prefix length (for
+        example, `10.0.0.100/24`). IPv6 addresses are supported.
+
+    :type interface: str
+    :param interface: The name of the interface (for example, `ens32`).
+
+    :type announce_count: int
+    :param announce_count: (Optional) The number of announcements sent
+        after the address is assigned. 0 disables them. The default
+        value is 5.
+
+    :type announce_interval: float
+    :param announce_interval: (Optional) The interval between two
+        announcements (in seconds). The default interval is 0.2
+        seconds.
+
+    '''
+    def __init__(self, address, interface, announce_count=5,
+            announce_interval=0.2):
+        self._address = address
+        self._interface = interface
+        self._announce_count = announce_count
+        self._announce_interval = announce_interval
+        self._cancel_burst = None
+
+    def _announce(self, announcer, cancelled, start, first):
+        '''
+        Sends the remaining announcements of a burst, then logs its
+        timing. Stops early once the `cancelled` event of the burst is
+        set.
+
+        '''
+        sent = 1
+
+        try:
+            while (sent < self._announce_count and
+                   not cancelled.wait(
+                       self._announce_interval)):
+                announcer.send()
+                sent += 1
+
+        except OSError as err:
+            Logger.get().warn(f'Unable to announce the virtual IP '
+                              f'address {self._address}: {err}')
+
+        finally:
+            announcer.close()
+
+        Logger.get().info(
+            f'{sent} {announcer.kind} sent for {self._address} on '
+            f'{self._interface} in {(monotonic() - start) * 1000:.0f} '
+            f'ms (the first one {first * 1000:.1f} ms after the start '
+            f'of the takeover)')
+
+    def _cancel_announcements(self):
+        '''
+        Stops the current burst of announcements, if any.
+
+        '''
+        cancelled, self._cancel_burst = self._cancel_burst, None
+
+        if cancelled:
+            cancelled.set()
+
+    def activate(self):
+        '''
+        Assigns the virtual IP address to the interface and starts
+        announcing it.
+
+        :raises OSError: If the address cannot be assigned.
+
+        '''
+        start = monotonic()
+        self._cancel_announcements()
+
+        with NetlinkSocket() as netlink:
+            added = netlink.add_address(self._address, self._interface)
+
+        if not added:
+            Logger.get().info(f'The virtual IP address {self._address} '
+                              f'is already assigned to {self._interface}')
+
+        if not self._announce_count:
+            return
+
+        # The address is assigned: a failed announcement only delays
+        # the update of the ARP caches
+        announcer = None
+
+        try:
+            announcer = Announcer(self._address, self._interface)
+            announcer.send()
+
+        except OSError as err:
+            Logger.get().warn(f'Unable to announce the virtual IP '
+                              f'address {self._address}: {err}')
+
+            if announcer:
+                announcer.close()
+
+            return
+
+        first = monotonic() - start
+
+        # Each burst has its own event, so that cancelling a burst
+        # never revives a previous one
+        cancelled = Event()
+        self._cancel_burst = cancelled
+
+        thread = Thread(
+            target=self._announce,
+            args=(announcer, cancelled, start, first),
+            daemon=True)
+
+        thread.start()
+
+    def deactivate(self):
+        '''
+        Removes the virtual IP address from the interface.
+
+        :raises OSError: If the address cannot be removed.
+
+        '''
+        self._cancel_announcements()
+
+        with NetlinkSocket() as netlink:
+            removed = netlink.delete_address(
+                self._address, self._interface)
+
+        if not removed:
+            Logger.get().info(f'The virtual IP address {self._address} '
+                              f'is not assigned to {self._interface}')
+
+    @property
+    def address(self):
+        '''
+        The virtual IP address and its prefix length.
+
+        '''
+        return self._address
+
+    @property
+    def interface(self):
+        '''
+        The name of the interface.
+
+        '''
+        return self._interface
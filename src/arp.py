@@ -0,0 +1,170 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from ipaddress import ip_interface
+import socket
+import struct
+
+
+_ETH_P_ARP = 0x0806
+_ETH_P_IP = 0x0800
+_BROADCAST = b'\xff' * 6
+
+_ARP_REQUEST = 1
+_ND_NEIGHBOR_ADVERT = 136
+_ND_OPT_TARGET_LINKADDR = 2
+_ND_NA_FLAG_OVERRIDE = 0x20000000
+_ALL_NODES = 'ff02::1'
+
+_ETHERNET_HEADER = struct.Struct('!6s6sH')
+_ARP_PACKET = struct.Struct('!HHBBH6s4s6s4s')
+_NEIGHBOR_ADVERT = struct.Struct('!BBHI16sBB6s')
+
+
+class Announcer:
+    '''
+    Announces that an IP address is now reachable through an interface
+    of this host, so that the neighbors update their ARP or neighbor
+    cache at once: gratuitous ARP requests for IPv4 addresses and
+    unsolicited neighbor advertisements for IPv6 addresses.
+
+    Requires the CAP_NET_RAW capability.
+
+    :type address: str
+    :param address: The announced IP address. A prefix length is
+        allowed (for example, `10.0.0.100/24`).
+
+    :type interface: str
+    :param interface: The name of the interface.
+
+    :raises OSError: If the sockets cannot be created.
+
+    '''
+    def __init__(self, address, interface):
+        self._address = ip_interface(address).ip
+        self._interface = interface
+
+        self._socket = None
+
+        # The socket is closed if it cannot be set up, since the caller
+        # does not get an announcer to close
+        try:
+            if self._address.version == 4:
+                self._socket = socket.socket(
+                    socket.AF_PACKET,
+                    socket.SOCK_RAW,
+                    socket.htons(_ETH_P_ARP))
+
+                self._socket.bind((interface, _ETH_P_ARP))
+                mac_address = self._socket.getsockname()[4]
+                self._packet = self._build_arp(mac_address)
+
+            else:
+                index = socket.if_nametoindex(interface)
+
+                # The MAC address is only read from a packet socket
+                with socket.socket(socket.AF_PACKET, socket.SOCK_RAW) as sock:
+                    sock.bind((interface, 0))
+                    mac_address = sock.getsockname()[4]
+
+                self._socket = socket.socket(
+                    socket.AF_INET6,
+                    socket.SOCK_RAW,
+                    socket.IPPROTO_ICMPV6)
+
+                # Neighbor discovery messages require a hop limit of 255
+                self._socket.setsockopt(
+                    socket.IPPROTO_IPV6,
+                    socket.IPV6_MULTICAST_HOPS,
+                    255)
+
+                self._socket.setsockopt(
+                    socket.IPPROTO_IPV6,
+                    socket.IPV6_MULTICAST_IF,
+                    index)
+
+                self._socket.bind((str(self._address), 0, 0, index))
+                self._destination = (_ALL_NODES, 0, 0, index)
+                self._packet = self._build_neighbor_advert(mac_address)
+
+        except Exception:
+            if self._socket:
+                self._socket.close()
+
+            raise
+
+    def _build_arp(self, mac_address):
+        ip_address = self._address.packed
+
+        return _ETHERNET_HEADER.pack(
+            _BROADCAST, mac_address, _ETH_P_ARP) + _ARP_PACKET.pack(
+            1, _ETH_P_IP, 6, 4, _ARP_REQUEST,
+            mac_address, ip_address,
+            b'\x00' * 6, ip_address)
+
+    def _build_neighbor_advert(self, mac_address):
+        # The checksum is computed by the kernel
+        return _NEIGHBOR_ADVERT.pack(
+            _ND_NEIGHBOR_ADVERT, 0, 0,
+            _ND_NA_FLAG_OVERRIDE, self._address.packed,
+            _ND_OPT_TARGET_LINKADDR, 1, mac_address.ljust(6, b'\x00'))
+
+    def send(self):
+        '''
+        Sends one announcement.
+
+        :raises OSError: If the packet cannot be sent.
+
+        '''
+        if self._address.version == 4:
+            self._socket.send(self._packet)
+
+        else:
+            self._socket.sendto(self._packet, self._destination)
+
+    def close(self):
+        '''
+        Close the sockets. They cannot be used after this call.
+
+        '''
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def kind(self):
+        '''
+        The name of the announcements sent.
+
+        '''
+        if self._address.version == 4:
+            return 'gratuitous ARP'
+
+        return 'unsolicited NA'
@@ -0,0 +1,182 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from . import protocol
+
+from collections import Counter
+from threading import Event, Lock
+from time import monotonic
+
+
+class Bootstrap:
+    '''
+    Collects the state of the cluster from the remote nodes when the
+    current node starts, instead of waiting for their heartbeats.
+
+    The remote nodes are sent a STATUS_REQUEST frame and reply with a
+    STATUS frame describing their view of the cluster, which proves
+    that they are alive. The view is consistent as soon as each remote
+    node has replied or has been reported as dead by a node that
+    replied. Nodes running a version prior to the binary protocol are
+    not waited for.
+
+    :type cluster: Cluster
+    :param cluster: The Onion HA cluster correctly initialized.
+
+    '''
+    def __init__(self, cluster):
+        self._cluster = cluster
+        self._replies = {}
+        self._lock = Lock()
+        self._ready = Event()
+        self._sequence = 0
+
+    def _is_consistent(self):
+        for node in self._cluster.nodes:
+            # The versions prior to the binary protocol cannot reply
+            if (node.is_current_node or
+                node in self._replies or
+                node.protocol == 'text'):
+                continue
+
+            if not any(
+                    statuses[node.id].status == 0
+                    for statuses in self._replies.values()
+                    if node.id in statuses):
+                return False
+
+        return True
+
+    def request(self, socket):
+        '''
+        Sends a STATUS_REQUEST frame to the remote nodes that have not
+        replied yet.
+
+        '''
+        frame = protocol.encode(
+            type=protocol.STATUS_REQUEST,
+            node_id=self._cluster.current_node.id,
+            sequence=self._sequence)
+
+        self._sequence += 1
+
+        for node in self._cluster.nodes:
+            if (node.is_current_node or
+                node in self._replies or
+                node.ip_address is None):
+                continue
+
+            try:
+                socket.send(
+                    payload=frame,
+                    address=node.ip_address,
+                    port=node.port)
+
+            except OSError:
+                pass
+
+    def process(self, node, statuses):
+        '''
+        Records the view of the cluster sent by a remote node in a
+        STATUS frame. Called by the listener.
+
+        :type node: Node
+        :param node: The node that replied.
+
+        :type statuses: dict
+        :param statuses: The entries of the frame (see
+            `protocol.decode_status`).
+
+        '''
+        if self._ready.is_set():
+            return
+
+        node.mark_as_alive()
+
+        with self._lock:
+            self._replies[node] = statuses
+
+            if self._is_consistent():
+                self._ready.set()
+
+    def wait(self, socket, interval, timeout):
+        '''
+        Requests the state of the cluster and waits until the view is
+        consistent or the timeout expires. The requests are sent again
+        every `interval` seconds to the nodes that have not replied.
+        Returns `True` if the view is consistent.
+
+        '''
+        deadline = monotonic() + timeout
+
+        with self._lock:
+            if self._is_consistent():
+                self._ready.set()
+
+        while not self._ready.is_set():
+            remaining = deadline - monotonic()
+
+            if remaining <= 0:
+                break
+
+            self.request(socket)
+            self._ready.wait(min(interval, remaining))
+
+        # The late replies are ignored
+        self._ready.set()
+
+        with self._lock:
+            return self._is_consistent()
+
+    @property
+    def replies(self):
+        '''
+        The number of remote nodes that replied.
+
+        '''
+        return len(self._replies)
+
+    @property
+    def active_node(self):
+        '''
+        The remote node reported as active by most of the nodes that
+        replied. Returns `None` if there is none.
+
+        '''
+        votes = Counter(
+            node_id
+            for statuses in self._replies.values()
+            for node_id, status in statuses.items()
+            if status.status == 2
+        )
+
+        for node_id, _ in votes.most_common():
+            node = self._cluster.get_by_id(node_id)
+
+            if node and not node.is_current_node and node.is_alive:
+                return node
+
+        return None
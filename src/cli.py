@@ -26,14 +26,19 @@
 
 from .core import OnionServer
 from .sockets import UDPSocket
-from .logs import Logger, StreamHandler, FileHandler
-from .config import read_config
+from .logs import Logger, StreamHandler, FileHandler, QueueHandler
+from .config import read_config, changed_options
+from .control import send_message, receive_message
+from .actions import VirtualIPAction
+from . import protocol
 from .utils import *
 from .version import __author__, __copyright__, __license__, \
                      __version__, __date__, __build__
 
+from datetime import datetime
 from sys import argv
-from signal import signal, SIGINT, SIGTERM
+from signal import signal, SIGINT, SIGTERM, SIGHUP
+from socket import socket, AF_UNIX, SOCK_STREAM
 
 
 _CONFIG_FILE = '/etc/onion-ha/oniond.conf'
@@ -53,6 +58,8 @@ Commands:
 Options:
 
     -c, --config FILE       Specify another configuration file
+    -w, --watch             With 'status', keep displaying the events
+                            of the cluster as they occur
 
 'start' is the default command.\
 '''
@@ -72,6 +79,26 @@ _ABOUT = f'''
        `-+syyhddys+:`       https://github.com/ValentinBELYN/OnionHA
 '''
 
+_LOG_LEVELS = {
+    'info': Logger.INFO,
+    'warning': Logger.WARN,
+    'error': Logger.ERROR
+}
+
+# The options applied by a reload of the configuration
+_RELOADABLE_OPTIONS = (
+    ('cluster', 'nodes'),
+    ('logging', 'level'),
+    ('actions', 'type'),
+    ('actions', 'active'),
+    ('actions', 'passive'),
+    ('actions', 'virtualIP'),
+    ('actions', 'interface'),
+    ('actions', 'announceCount'),
+    ('actions', 'announceInterval'),
+    ('actions', 'timeout')
+)
+
 _VERSION = f'oniond {__version__} (build {__build__}) ' \
            f'released on {__date__}'
 
@@ -117,6 +144,12 @@ def cli():
         if option in ('-c', '--config') and value:
             options['config'] = value
 
+        elif option in ('-w', '--watch'):
+            options['watch'] = True
+
+            if value:
+                i -= 1
+
         i += 1
 
     code = commands[command](options)
@@ -156,47 +189,183 @@ def start(options):
               'Type \'oniond check\' to solve this error.')
         return 1
 
-    if (config['general']['address'] not in
-        config['cluster']['nodes']):
-        print('Error: the address of this node must be entered in '
-              'the \'cluster\' section of the configuration file.')
+    error = _validate(config)
+
+    if error:
+        print(f'Error: {error}')
         return 1
 
+    action_active, action_passive = _create_actions(config)
+
     write_pid_file()
 
     if config['logging']['enable']:
         logger = Logger.get()
 
-        logger.add_handlers(
+        logger.add_handlers(QueueHandler(
             StreamHandler(),
-            FileHandler(config['logging']['file'])
-        )
+            FileHandler(
+                filename=config['logging']['file'],
+                max_size=config['logging']['maxSize'] * 1024 ** 2,
+                backup_count=config['logging']['backupCount']),
+            flush_interval=config['logging']['flushInterval'],
+            capacity=config['logging']['queueSize']))
 
-        logger.level = {
-            'info': Logger.INFO,
-            'warning': Logger.WARN,
-            'error': Logger.ERROR
-        }[config['logging']['level']]
+        logger.level = _LOG_LEVELS[config['logging']['level']]
 
     server = OnionServer(
         address=config['general']['address'],
         port=config['cluster']['port'],
-        gateway=config['general']['gateway'],
+        gateways=config['general']['gateway'],
+        gateway_quorum=config['general']['gatewayQuorum'],
         init_delay=config['general']['initDelay'],
         deadtime=config['cluster']['deadTime'],
+        heartbeat_interval=config['cluster']['heartbeatInterval'],
         node_addresses=config['cluster']['nodes'],
-        action_active=config['actions']['active'],
-        action_passive=config['actions']['passive'])
+        action_active=action_active,
+        action_passive=action_passive,
+        action_timeout=config['actions']['timeout'],
+        multicast_group=config['cluster']['multicastGroup'] or None,
+        multicast_ttl=config['cluster']['multicastTTL'],
+        multicast_interface=config['cluster']['multicastInterface'],
+        membership=config['cluster']['membership'],
+        indirect_probes=config['cluster']['indirectProbes'],
+        failure_detector=config['cluster']['failureDetector'],
+        phi_threshold=config['cluster']['phiThreshold'],
+        runtime=config['general']['runtime'],
+        control_socket=config['general']['controlSocket'] or None,
+        resolve_interval=config['general']['resolveInterval'],
+        echo_interval=config['cluster']['echoInterval'],
+        preemption=config['cluster']['preemption'],
+        hold_down=config['cluster']['holdDown'],
+        damping_half_life=config['cluster']['dampingHalfLife'],
+        damping_threshold=config['cluster']['dampingThreshold'],
+        liveness_table=config['cluster']['livenessTable'],
+        metrics_address=(config['metrics']['address']
+                         if config['metrics']['enable'] else None),
+        metrics_port=config['metrics']['port'])
 
     signal(SIGINT, lambda *args: server.stop())
     signal(SIGTERM, lambda *args: server.stop())
 
+    def reload():
+        nonlocal config
+        config = _reload(server, config_file, config)
+
+    # The configuration is read by the main loop of the server, not by
+    # the signal handler
+    signal(SIGHUP, lambda *args: server.request_reload(reload))
+
     server.serve_forever()
+    Logger.get().close()
     unlink_pid_file()
 
     return 0
 
 
+def _validate(config):
+    '''
+    Checks the consistency of the settings of a configuration without
+    error. Returns an error message, or `None` if the settings are
+    consistent.
+
+    '''
+    if (config['general']['address'] not in
+        config['cluster']['nodes']):
+        return ('the address of this node must be entered in the '
+                '\'cluster\' section of the configuration file.')
+
+    if (config['general']['gatewayQuorum'] >
+        len(config['general']['gateway'])):
+        return 'the gateway quorum cannot exceed the number of gateways.'
+
+    if (config['cluster']['heartbeatInterval'] >=
+        config['cluster']['deadTime']):
+        return ('the heartbeat interval must be shorter than the dead '
+                'time.')
+
+    if config['actions']['type'] == 'vip':
+        if (not config['actions']['virtualIP'] or
+            not config['actions']['interface']):
+            return ('the virtualIP and interface options are required '
+                    'by the vip action type.')
+
+    elif (not config['actions']['active'] or
+          not config['actions']['passive']):
+        return ('the active and passive actions are required by the '
+                'command action type.')
+
+    return None
+
+
+def _create_actions(config):
+    '''
+    Creates the active and passive actions described by a
+    configuration. Returns a tuple.
+
+    '''
+    if config['actions']['type'] == 'vip':
+        virtual_ip = VirtualIPAction(
+            address=config['actions']['virtualIP'],
+            interface=config['actions']['interface'],
+            announce_count=config['actions']['announceCount'],
+            announce_interval=config['actions']['announceInterval'])
+
+        return virtual_ip.activate, virtual_ip.deactivate
+
+    return config['actions']['active'], config['actions']['passive']
+
+
+def _reload(server, config_file, config):
+    '''
+    Reads the configuration file again and applies the changes to the
+    running server. The options that cannot be reloaded are ignored
+    until the next restart. Returns the configuration in use.
+
+    '''
+    logger = Logger.get()
+    logger.info('Reloading the configuration...')
+
+    new_config = read_config(config_file)
+
+    if not new_config.is_opened or new_config.errors:
+        logger.error('The configuration cannot be reloaded: the '
+                     'configuration file is not valid')
+        return config
+
+    error = _validate(new_config)
+
+    if error:
+        logger.error(f'The configuration cannot be reloaded: {error}')
+        return config
+
+    changes = changed_options(config, new_config)
+
+    for section, option in changes:
+        if (section, option) not in _RELOADABLE_OPTIONS:
+            logger.warn(f'The {option} option of the {section} section '
+                        'will be applied at the next restart')
+
+    if ('logging', 'level') in changes:
+        logger.level = _LOG_LEVELS[new_config['logging']['level']]
+
+    # The built-in actions are only recreated if they have changed
+    if any(section == 'actions' and option != 'timeout'
+           for section, option in changes):
+        action_active, action_passive = _create_actions(new_config)
+
+    else:
+        action_active, action_passive = server.actions
+
+    server.reload(
+        node_addresses=new_config['cluster']['nodes'],
+        action_active=action_active,
+        action_passive=action_passive,
+        action_timeout=new_config['actions']['timeout'])
+
+    return new_config
+
+
 def check(options):
     '''
     Checks the configuration file and displays potential errors. This
@@ -226,6 +395,13 @@ def check(options):
         return 0
 
     if not config.errors:
+        # The consistency of the settings is checked as on start-up
+        error = _validate(config)
+
+        if error:
+            print(f'Error: {error}')
+            return 0
+
         print('Your configuration file looks good!')
         return 0
 
@@ -276,40 +452,166 @@ def status(options):
         print('Onion HA is not running.')
         return 0
 
-    socket = UDPSocket()
     pid = get_instance_pid()
-
     print(f'PID: {pid}\n')
 
     try:
-        socket.send(
-            payload=b'GET STATUS',
-            address='127.0.0.1',
-            port=config['cluster']['port'])
+        if config['general']['controlSocket']:
+            try:
+                nodes = _query_control_socket(
+                    config['general']['controlSocket'])
+
+            except (OSError, EOFError):
+                nodes = _query_udp(config['cluster']['port'], pid)
+
+        else:
+            nodes = _query_udp(config['cluster']['port'], pid)
+
+        addresses = config['cluster']['nodes']
 
-        payload, address, port = socket.receive(timeout=1)
-        socket.close()
+        cluster_status = {
+            addresses[node['id'] - 1]: node
+            for node in nodes
+        }
 
-    except OSError:
+    except (OSError, EOFError, IndexError, KeyError, ValueError):
         print('Error: unable to retrieve the cluster status.')
-        socket.close()
         return 1
 
-    cluster_status = read_cluster_dump(payload.decode())
-
     status = {
         0: '[ \033[91mFAILED\033[0m ]',
         1: '[ PASSIVE ]',
         2: '[ ACTIVE ]'
     }
 
+    def milliseconds(duration):
+        if duration is None:
+            return '-'
+
+        return f'{duration * 1000:.2f}'
+
     i = 0
     print('Cluster status:\n')
+    print(f'    {"":10} {"":20} {"RTT p50":>9} {"RTT p99":>9} '
+          f'{"Jitter p99":>11}\n')
 
-    for address, status_code in cluster_status.items():
+    for address, node_status in cluster_status.items():
         i += 1
-        print(f'    {i:<10} {address:20} {status[status_code]}')
+        print(f'    {i:<10} {address:20} '
+              f'{milliseconds(node_status["rtt_median"]):>9} '
+              f'{milliseconds(node_status["rtt_p99"]):>9} '
+              f'{milliseconds(node_status["jitter_p99"]):>11}   '
+              f'{status[node_status["status"]]}')
+
+    print('\nLatencies in milliseconds.')
 
     print(f'\nNodes: {i}')
 
+    if 'watch' in options:
+        if not config['general']['controlSocket']:
+            print('\nError: the control socket is required to watch '
+                  'the cluster.')
+            return 1
+
+        try:
+            _watch(config['general']['controlSocket'])
+
+        except KeyboardInterrupt:
+            pass
+
+        except (OSError, EOFError, ValueError):
+            print('Error: the connection to Onion HA has been lost.')
+            return 1
+
     return 0
+
+
+def _query_control_socket(path):
+    '''
+    Retrieves the status of the nodes from the control socket of the
+    running instance. Returns a list of dictionaries.
+
+    '''
+    with socket(AF_UNIX, SOCK_STREAM) as sock:
+        sock.settimeout(1)
+        sock.connect(path)
+        send_message(sock, {'command': 'status'})
+        response = receive_message(sock)
+
+    if response.get('status') != 'ok':
+        raise ValueError(response.get('message'))
+
+    return response['result']['nodes']
+
+
+def _watch(path):
+    '''
+    Subscribes to the events of the running instance and displays them
+    until the connection is closed.
+
+    '''
+    with socket(AF_UNIX, SOCK_STREAM) as sock:
+        sock.settimeout(1)
+        sock.connect(path)
+        send_message(sock, {'command': 'subscribe'})
+        receive_message(sock)
+        sock.settimeout(None)
+
+        print('\nEvents:\n')
+
+        while True:
+            event = receive_message(sock)
+            date = datetime.fromtimestamp(event['time'])
+            date = date.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+            if event['event'] in ('node_up', 'node_down', 'election'):
+                node = event['node']
+                detail = node['address'] if node else 'no active node'
+
+            elif event['event'] in ('gateway_up', 'gateway_down'):
+                detail = event['gateway']['address']
+
+            elif event['event'] == 'action_started':
+                detail = event['action']
+
+            elif event['event'] == 'action_finished':
+                result = 'succeeded' if event['success'] else 'failed'
+                detail = (f'{event["action"]} {result} in '
+                          f'{event["duration"] * 1000:.0f} ms')
+
+            else:
+                detail = ''
+
+            print(f'    [{date}] {event["event"]:16} {detail}',
+                  flush=True)
+
+
+def _query_udp(port, pid):
+    '''
+    Retrieves the status of the nodes from the running instance with a
+    STATUS_REQUEST frame, if its control socket is not available.
+    Returns a list of dictionaries.
+
+    '''
+    udp_socket = UDPSocket()
+
+    try:
+        udp_socket.send(
+            payload=protocol.encode(protocol.STATUS_REQUEST, 0, pid),
+            address='127.0.0.1',
+            port=port)
+
+        payload, address, port = udp_socket.receive(timeout=1)
+        frame = protocol.decode(payload)
+
+    finally:
+        udp_socket.close()
+
+    if not frame or frame.type != protocol.STATUS:
+        raise ValueError('Invalid response')
+
+    return [
+        dict(node_status._asdict(), id=node_id)
+        for node_id, node_status in protocol.decode_status(
+            payload, frame).items()
+    ]
@@ -25,7 +25,21 @@
 '''
 
 from configpilot import ConfigPilot, OptionSpec
-from .utils import parse_command
+from .utils import parse_command, parse_ip_interface
+
+
+class _Interval:
+    '''
+    An interval of real numbers that supports the `in` operator, unlike
+    the `range` object.
+
+    '''
+    def __init__(self, start, stop):
+        self._start = start
+        self._stop = stop
+
+    def __contains__(self, value):
+        return self._start <= value < self._stop
 
 
 _OPTIONS = [
@@ -37,7 +51,16 @@ _OPTIONS = [
 
     OptionSpec(
         section='general',
-        option='gateway'
+        option='gateway',
+        type=[str]
+    ),
+
+    OptionSpec(
+        section='general',
+        option='gatewayQuorum',
+        allowed=range(1, 100),
+        default=1,
+        type=int
     ),
 
     OptionSpec(
@@ -47,6 +70,27 @@ _OPTIONS = [
         type=int
     ),
 
+    OptionSpec(
+        section='general',
+        option='runtime',
+        allowed=('asyncio', 'threaded'),
+        default='asyncio'
+    ),
+
+    OptionSpec(
+        section='general',
+        option='controlSocket',
+        default='/var/run/oniond.sock'
+    ),
+
+    OptionSpec(
+        section='general',
+        option='resolveInterval',
+        allowed=_Interval(1, 86400),
+        default=60.0,
+        type=float
+    ),
+
     # Logging
     OptionSpec(
         section='logging',
@@ -67,6 +111,60 @@ _OPTIONS = [
         default='/var/log/oniond.log'
     ),
 
+    OptionSpec(
+        section='logging',
+        option='maxSize',
+        allowed=range(0, 10000),
+        default=10,
+        type=int
+    ),
+
+    OptionSpec(
+        section='logging',
+        option='backupCount',
+        allowed=range(0, 100),
+        default=5,
+        type=int
+    ),
+
+    OptionSpec(
+        section='logging',
+        option='flushInterval',
+        allowed=_Interval(0.01, 60),
+        default=1.0,
+        type=float
+    ),
+
+    OptionSpec(
+        section='logging',
+        option='queueSize',
+        allowed=range(100, 1000000),
+        default=10000,
+        type=int
+    ),
+
+    # Metrics
+    OptionSpec(
+        section='metrics',
+        option='enable',
+        default=False,
+        type=bool
+    ),
+
+    OptionSpec(
+        section='metrics',
+        option='address',
+        default='127.0.0.1'
+    ),
+
+    OptionSpec(
+        section='metrics',
+        option='port',
+        allowed=range(1024, 65536),
+        default=9750,
+        type=int
+    ),
+
     # Cluster
     OptionSpec(
         section='cluster',
@@ -78,27 +176,177 @@ _OPTIONS = [
     OptionSpec(
         section='cluster',
         option='deadTime',
-        allowed=range(2, 3600),
+        allowed=_Interval(0.1, 3600),
+        type=float
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='heartbeatInterval',
+        allowed=_Interval(0.01, 60),
+        default=0.5,
+        type=float
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='echoInterval',
+        allowed=_Interval(0, 3600),
+        default=1.0,
+        type=float
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='membership',
+        allowed=('mesh', 'swim'),
+        default='mesh'
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='indirectProbes',
+        allowed=range(1, 11),
+        default=3,
         type=int
     ),
 
+    OptionSpec(
+        section='cluster',
+        option='multicastGroup',
+        default=''
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='multicastTTL',
+        allowed=range(0, 256),
+        default=1,
+        type=int
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='multicastInterface',
+        default='0.0.0.0'
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='failureDetector',
+        allowed=('deadline', 'phi'),
+        default='deadline'
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='phiThreshold',
+        allowed=_Interval(1, 17),
+        default=8.0,
+        type=float
+    ),
+
     OptionSpec(
         section='cluster',
         option='nodes',
         type=[str]
     ),
 
+    OptionSpec(
+        section='cluster',
+        option='preemption',
+        allowed=('always', 'delayed', 'never'),
+        default='always'
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='holdDown',
+        allowed=_Interval(0, 86400),
+        default=60.0,
+        type=float
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='dampingHalfLife',
+        allowed=_Interval(0, 86400),
+        default=0.0,
+        type=float
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='dampingThreshold',
+        allowed=_Interval(1, 100),
+        default=3.0,
+        type=float
+    ),
+
+    OptionSpec(
+        section='cluster',
+        option='livenessTable',
+        default=False,
+        type=bool
+    ),
+
     # Actions
+    OptionSpec(
+        section='actions',
+        option='type',
+        allowed=('command', 'vip'),
+        default='command'
+    ),
+
     OptionSpec(
         section='actions',
         option='active',
+        default=[],
         type=parse_command
     ),
 
     OptionSpec(
         section='actions',
         option='passive',
+        default=[],
         type=parse_command
+    ),
+
+    OptionSpec(
+        section='actions',
+        option='virtualIP',
+        default='',
+        type=parse_ip_interface
+    ),
+
+    OptionSpec(
+        section='actions',
+        option='interface',
+        default=''
+    ),
+
+    OptionSpec(
+        section='actions',
+        option='announceCount',
+        allowed=range(0, 101),
+        default=5,
+        type=int
+    ),
+
+    OptionSpec(
+        section='actions',
+        option='announceInterval',
+        allowed=_Interval(0.01, 10),
+        default=0.2,
+        type=float
+    ),
+
+    OptionSpec(
+        section='actions',
+        option='timeout',
+        allowed=_Interval(0.1, 86400),
+        default=60.0,
+        type=float
     )
 ]
 
@@ -113,3 +361,18 @@ def read_config(file):
     config.read(file)
 
     return config
+
+
+def changed_options(config, new_config):
+    '''
+    Compares two configurations read by the `read_config` function.
+    Returns the list of the options whose value differs, as
+    `(section, option)` tuples.
+
+    '''
+    return [
+        (spec.section, spec.option)
+        for spec in _OPTIONS
+        if (config[spec.section][spec.option] !=
+            new_config[spec.section][spec.option])
+    ]
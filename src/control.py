@@ -0,0 +1,375 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+
+from .logs import Logger
+
+from json import dumps, loads
+from os import chmod, unlink
+from os.path import exists
+from queue import Queue, Full
+from socketserver import ThreadingUnixStreamServer, StreamRequestHandler
+from struct import Struct
+from threading import Thread, Lock
+from time import monotonic
+
+
+# Every message exchanged on the control socket is a JSON object
+# prefixed by its length (4 bytes, network byte order). A request
+# contains a `command` key. A response contains a `status` key (`ok`
+# or `error`) and the result of the command or an error `message`.
+#
+# After a `subscribe` command, the server pushes a message for each
+# event until the connection is closed. An event contains an `event`
+# key (its name), a `time` key (seconds since the epoch) and its own
+# data.
+
+_LENGTH = Struct('!I')
+_MAX_MESSAGE_SIZE = 16 * 1024 ** 2
+
+
+def send_message(sock, message):
+    '''
+    Sends a message on a stream socket.
+
+    :type sock: socket.socket
+    :param sock: A connected stream socket.
+
+    :type message: dict
+    :param message: The message to send. It must be serializable in
+        JSON.
+
+    '''
+    data = dumps(message, separators=(',', ':')).encode()
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _receive_exactly(sock, size):
+    data = bytearray()
+
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+
+        if not chunk:
+            raise EOFError
+
+        data += chunk
+
+    return bytes(data)
+
+
+def receive_message(sock):
+    '''
+    Receives a message from a stream socket. Returns a `dict`.
+
+    :raises EOFError: If the connection is closed by the peer.
+    :raises ValueError: If the message is invalid.
+
+    '''
+    size, = _LENGTH.unpack(_receive_exactly(sock, _LENGTH.size))
+
+    if size > _MAX_MESSAGE_SIZE:
+        raise ValueError('The message is too large')
+
+    message = loads(_receive_exactly(sock, size))
+
+    if not isinstance(message, dict):
+        raise ValueError('The message must be a JSON object')
+
+    return message
+
+
+def _describe_node(snapshot):
+    node = snapshot.node
+
+    return {
+        'id': snapshot.id,
+        'address': snapshot.address,
+        'addresses': list(snapshot.addresses),
+        'status': snapshot.status,
+        'is_alive': snapshot.is_alive,
+        'is_active': snapshot.is_active,
+        'is_current_node': snapshot.is_current_node,
+        'protocol': node.protocol,
+        'packets_received': node.packets_received,
+        'packets_lost': node.packets_lost,
+        'packets_reordered': node.packets_reordered,
+        'rtt_median': node.rtt_histogram.percentile(50),
+        'rtt_p99': node.rtt_histogram.percentile(99),
+        'jitter_p99': node.jitter_histogram.percentile(99)
+    }
+
+
+def _describe_gateway(gateway):
+    return {
+        'id': gateway.id,
+        'address': gateway.address,
+        'is_alive': gateway.is_alive,
+        'rtt': gateway.smoothed_rtt
+    }
+
+
+class _RequestHandler(StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = receive_message(self.connection)
+
+            except (EOFError, OSError):
+                return
+
+            except ValueError as err:
+                send_message(self.connection, {
+                    'status': 'error',
+                    'message': str(err)
+                })
+                return
+
+            if request.get('command') == 'subscribe':
+                self.server.control.stream(self.connection)
+                return
+
+            response = self.server.control.execute(request)
+
+            try:
+                send_message(self.connection, response)
+
+            except OSError:
+                return
+
+
+class ControlServer:
+    '''
+    A server answering the requests of the command-line interface on a
+    Unix domain socket, in its own threads. Unlike the UDP socket used
+    by the nodes, the size of the responses is not limited.
+
+    The `status` command returns a snapshot of the cluster. The
+    snapshot is cached until a new snapshot of the cluster is published
+    (see `Cluster.snapshot`) and for at most 1 second, so that the
+    latency statistics it contains remain fresh.
+
+    The `subscribe` command turns the connection into a stream of the
+    events passed to `publish` (see `EventBus`). A subscriber that does
+    not read its events fast enough is disconnected.
+
+    :type path: str
+    :param path: The path of the Unix domain socket. An existing file
+        is replaced.
+
+    :type cluster: Cluster
+    :param cluster: The Onion HA cluster correctly initialized.
+
+    :type gateways: list of Gateway
+    :param gateways: The gateways used to check the connectivity.
+
+    '''
+    _SNAPSHOT_LIFETIME = 1
+    _SUBSCRIBER_QUEUE_SIZE = 1024
+
+    def __init__(self, path, cluster, gateways):
+        self._path = path
+        self._cluster = cluster
+        self._gateways = gateways
+        self._commands = {'status': self._status}
+        self._subscribers = set()
+
+        self._snapshot = None
+        self._snapshot_key = None
+        self._snapshot_expires_at = 0
+        self._lock = Lock()
+
+        if exists(path):
+            unlink(path)
+
+        self._server = ThreadingUnixStreamServer(path, _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.control = self
+        self._thread = Thread(target=self._server.serve_forever)
+
+        chmod(path, 0o660)
+
+    def _status(self, request):
+        snapshot = self._cluster.snapshot
+        key = (snapshot.version, tuple(
+            gateway.is_alive
+            for gateway in self._gateways))
+
+        with self._lock:
+            if (key != self._snapshot_key or
+                monotonic() >= self._snapshot_expires_at):
+                active_node = snapshot.active_node
+
+                self._snapshot = {
+                    'version': snapshot.version,
+                    'current_node': snapshot.current_node.id,
+                    'active_node': active_node.id if active_node else None,
+                    'nodes': [
+                        _describe_node(node)
+                        for node in snapshot.nodes
+                    ],
+                    'gateways': [
+                        _describe_gateway(gateway)
+                        for gateway in self._gateways
+                    ]
+                }
+
+                self._snapshot_key = key
+                self._snapshot_expires_at = \
+                    monotonic() + self._SNAPSHOT_LIFETIME
+
+            return self._snapshot
+
+    def register(self, command, function):
+        '''
+        Registers a command. The function receives the request and
+        returns the result of the command, serializable in JSON.
+
+        '''
+        self._commands[command] = function
+
+    def execute(self, request):
+        '''
+        Executes a request and returns the response.
+
+        '''
+        command = self._commands.get(request.get('command'))
+
+        if not command:
+            return {
+                'status': 'error',
+                'message': f'Unknown command: {request.get("command")}'
+            }
+
+        try:
+            return {
+                'status': 'ok',
+                'result': command(request)
+            }
+
+        except Exception as err:
+            Logger.get().debug(f'Control command failed: {err}')
+
+            return {
+                'status': 'error',
+                'message': str(err)
+            }
+
+    def publish(self, event):
+        '''
+        Pushes an event to the subscribers. This operation is
+        non-blocking. Subscriber of the event bus.
+
+        :type event: Event
+        :param event: The event, whose data is serializable in JSON.
+
+        '''
+        message = dict(event.data, event=event.type, time=event.time)
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for queue in subscribers:
+            try:
+                queue.put_nowait(message)
+
+            except Full:
+                with self._lock:
+                    self._subscribers.discard(queue)
+
+                Logger.get().debug('A slow control subscriber has been '
+                                   'disconnected')
+
+    def stream(self, connection):
+        '''
+        Sends the events to a subscriber until it disconnects or the
+        server stops. This method blocks the calling thread.
+
+        '''
+        queue = Queue(self._SUBSCRIBER_QUEUE_SIZE)
+
+        with self._lock:
+            self._subscribers.add(queue)
+
+        try:
+            send_message(connection, {'status': 'ok', 'result': None})
+
+            while True:
+                message = queue.get()
+
+                # The server is stopping or the subscriber is too slow
+                if message is None or queue not in self._subscribers:
+                    return
+
+                send_message(connection, message)
+
+        except OSError:
+            pass
+
+        finally:
+            with self._lock:
+                self._subscribers.discard(queue)
+
+    def start(self):
+        '''
+        Starts the server. This operation is non-blocking.
+
+        '''
+        self._thread.start()
+
+    def shutdown(self):
+        '''
+        Stops the server, waits for the end of its execution and
+        deletes the socket file. The subscribers are disconnected.
+
+        '''
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+
+        for queue in subscribers:
+            try:
+                queue.put_nowait(None)
+
+            except Full:
+                pass
+
+        self._server.shutdown()
+        self._thread.join()
+        self._server.server_close()
+
+        try:
+            unlink(self._path)
+
+        except OSError:
+            pass
+
+    @property
+    def path(self):
+        '''
+        The path of the Unix domain socket.
+
+        '''
+        return self._path
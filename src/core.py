@@ -25,13 +25,25 @@
 '''
 
 from .models import Cluster, Node, Gateway
+from .detectors import PhiAccrualDetector, MembershipDetector
+from .swim import SwimService
 from .sockets import UDPSocket
 from .services import *
+from .runtime import ThreadedRuntime, AsyncRuntime
 from .logs import Logger
+from .metrics import Registry, MetricsServer
+from .control import ControlServer
+from .actions import ActionExecutor
+from .election import ElectionPolicy
+from .bootstrap import Bootstrap
+from .events import EventBus
+from . import events
+from .utils import notify_systemd
 from .version import __version__, __build__, __date__
-from .utils import run_command
 
-from time import sleep
+from threading import Thread, Event
+from os import pipe, read, write, close, set_blocking
+from time import sleep, monotonic
 
 
 class OnionServer:
@@ -51,18 +63,24 @@ class OnionServer:
     :param port: The listening port of the cluster nodes, including
         this server.
 
-    :type gateway: str
-    :param gateway: The IP address or FQDN of the gateway. The gateway
-        is used to check the connectivity of this node.
+    :type gateways: list of str
+    :param gateways: The IP address or FQDN of the gateways. The
+        gateways are pinged concurrently to check the connectivity of
+        this node.
 
     :type init_delay: int
     :param init_delay: The delay before starting the server to ensure
         that the system services are operational (in seconds).
 
-    :type deadtime: int
+    :type deadtime: float
     :param deadtime: The delay before considering a node as dead (in
         seconds).
 
+    :type heartbeat_interval: float
+    :param heartbeat_interval: The interval between two heartbeats sent
+        to the other nodes and between two connectivity checks (in
+        seconds). It must be shorter than `deadtime`.
+
     :type node_addresses: list of str
     :param node_addresses: The IP address or FQDN of the nodes,
         including this node. The order of the nodes is important: in
@@ -70,53 +88,552 @@ class OnionServer:
         active node. The first node registered is the master node and
         is active by default.
 
-    :type action_active: list of str
+    :type action_active: list of str or callable
     :param action_active: The command or script to execute when this
-        node becomes active.
+        node becomes active, or a built-in action such as
+        `VirtualIPAction.activate`.
 
-    :type action_passive: list of str
+    :type action_passive: list of str or callable
     :param action_passive: The command or script to execute when this
-        node becomes passive.
+        node becomes passive, or a built-in action such as
+        `VirtualIPAction.deactivate`.
+
+    :type gateway_quorum: int
+    :param gateway_quorum: The number of gateways that must respond to
+        consider this node as connected. The default quorum is 1.
+
+    :type multicast_group: str
+    :param multicast_group: (Optional) The IPv4 multicast group used to
+        send the heartbeats. Nodes that do not receive the multicast
+        heartbeats keep receiving them in unicast. By default, only
+        unicast is used.
+
+    :type multicast_ttl: int
+    :param multicast_ttl: The time to live of the multicast heartbeats.
+        The default value is 1 (local network).
+
+    :type multicast_interface: str
+    :param multicast_interface: The IP address of the interface used to
+        send and receive the multicast heartbeats. By default, the
+        interface is chosen by the system.
+
+    :type membership: str
+    :param membership: The protocol used to monitor the remote nodes:
+        `mesh` to send heartbeats to all the nodes or `swim` to use the
+        SWIM membership protocol, which scales to hundreds of nodes.
+        With `swim`, the heartbeat interval is the protocol period,
+        `deadtime` is the suspicion period and the failure detector
+        options are ignored. The default protocol is `mesh`.
+
+    :type indirect_probes: int
+    :param indirect_probes: The number of nodes asked to probe a node
+        that did not respond, with the `swim` protocol. The default
+        value is 3.
+
+    :type failure_detector: str
+    :param failure_detector: The failure detector used to determine if
+        the remote nodes are alive: `deadline` to consider them as dead
+        after `deadtime` seconds without heartbeat or `phi` to use an
+        adaptive phi accrual failure detector bounded by `deadtime`.
+        The default detector is `deadline`.
+
+    :type phi_threshold: float
+    :param phi_threshold: The suspicion level from which a remote node
+        is considered as dead with the `phi` failure detector. The
+        default threshold is 8.
+
+    :type runtime: str
+    :param runtime: The runtime used to run the services: `asyncio` to
+        run them in a single thread driven by an event loop or
+        `threaded` to run each of them in its own thread. The default
+        runtime is `asyncio`.
+
+    :type resolve_interval: float
+    :param resolve_interval: The interval between two resolutions of
+        the FQDN of the nodes and gateways (in seconds). The default
+        interval is 60 seconds.
+
+    :type echo_interval: float
+    :param echo_interval: (Optional) The interval between two
+        heartbeats echoed by the remote nodes to measure the round-trip
+        time (in seconds). 0 disables the measurement. The default
+        interval is 1 second.
+
+    :type action_timeout: float
+    :param action_timeout: (Optional) The maximum execution time of an
+        action (in seconds). Actions run in the background and are
+        stopped beyond this time. The default timeout is 60 seconds.
+
+    :type preemption: str
+    :param preemption: (Optional) When a node with a higher priority
+        than the active node comes back to life: `always` to activate
+        it at once, `delayed` to activate it once it has been alive for
+        `hold_down` seconds, or `never` to keep the active node until
+        it dies. The default mode is `always`.
+
+    :type hold_down: float
+    :param hold_down: (Optional) The time a node must stay alive before
+        taking over with the `delayed` mode (in seconds). The default
+        value is 60 seconds.
+
+    :type damping_half_life: float
+    :param damping_half_life: (Optional) The half-life of the penalty
+        given to a node each time it dies (in seconds). 0 disables the
+        flap damping, which is the default.
+
+    :type damping_threshold: float
+    :param damping_threshold: (Optional) The penalty from which a
+        flapping node cannot become active. The default threshold is 3.
+
+    :type liveness_table: bool
+    :param liveness_table: (Optional) Indicates whether the liveness of
+        the nodes is mirrored in a compact table (see `LivenessTable`).
+        Disabled by default.
+
+    :type control_socket: str
+    :param control_socket: (Optional) The path of the Unix domain
+        socket on which the command-line interface queries the server.
+        By default, the control socket is disabled.
+
+    :type metrics_address: str
+    :param metrics_address: (Optional) The IP address on which the
+        metrics are exposed in the Prometheus text format. By default,
+        the metrics are not exposed.
+
+    :type metrics_port: int
+    :param metrics_port: (Optional) The listening port of the metrics
+        server. The default port is 9750.
 
     '''
-    def __init__(self, address, port, gateway, init_delay, deadtime,
-            node_addresses, action_active, action_passive):
+    def __init__(self, address, port, gateways, init_delay, deadtime,
+            heartbeat_interval, node_addresses, action_active,
+            action_passive, gateway_quorum=1, multicast_group=None,
+            multicast_ttl=1, multicast_interface='0.0.0.0', membership='mesh',
+            indirect_probes=3, failure_detector='deadline',
+            phi_threshold=8, runtime='asyncio', resolve_interval=60,
+            echo_interval=1, action_timeout=60, preemption='always',
+            hold_down=60, damping_half_life=0, damping_threshold=3,
+            liveness_table=False, control_socket=None,
+            metrics_address=None, metrics_port=9750):
 
         self._address = address
         self._port = port
-        self._gateway = gateway
+        self._gateways = gateways
+        self._gateway_quorum = gateway_quorum
         self._init_delay = init_delay
         self._deadtime = deadtime
+        self._heartbeat_interval = heartbeat_interval
         self._node_addresses = node_addresses
         self._action_active = action_active
         self._action_passive = action_passive
+        self._multicast_group = multicast_group
+        self._multicast_ttl = multicast_ttl
+        self._multicast_interface = multicast_interface
+        self._membership = membership
+        self._indirect_probes = indirect_probes
+        self._failure_detector = failure_detector
+        self._phi_threshold = phi_threshold
+        self._runtime = runtime
+        self._resolve_interval = resolve_interval
+        self._echo_interval = echo_interval
+        self._control_socket = control_socket
+        self._metrics_address = metrics_address
+        self._metrics_port = metrics_port
+        self._liveness_table = liveness_table
         self._is_running = False
+        self._wakeup = Event()
+        self._wakeup_pipe = None
+        self._reload_handler = None
+        self._pending_reload = None
 
-    def _active_mode(self, node):
+        self._policy = ElectionPolicy(
+            preemption=preemption,
+            hold_down=hold_down,
+            damping_half_life=damping_half_life,
+            damping_threshold=damping_threshold)
+
+        self._events = EventBus()
+        self._executor = ActionExecutor(timeout=action_timeout)
+        self._executor.add_listener(self._on_action)
+
+        registry = Registry.get()
+
+        self._elections = registry.counter(
+            'oniond_elections_total',
+            'Changes of the active node of the cluster.')
+
+        self._action_durations = registry.histogram(
+            'oniond_action_duration_seconds',
+            'Execution time of the actions.', ('action',))
+
+        self._action_failures = registry.counter(
+            'oniond_action_failures_total',
+            'Actions that failed.', ('action',))
+
+    def _on_action(self, action, result, duration):
         '''
-        Puts the server in active mode.
+        Publishes the events of the actions. Called by the action
+        executor.
+
+        '''
+        if result is None:
+            self._events.publish(events.ACTION_STARTED, action=action)
+            return
+
+        self._events.publish(
+            events.ACTION_FINISHED,
+            action=action,
+            success=result == 'success',
+            result=result,
+            duration=duration)
+
+    def _publish_changes(self, snapshot, history):
+        '''
+        Publishes a `node_up` or `node_down` event for each node whose
+        status changed since the last call. `history` maps the nodes to
+        their last known status and is updated.
+
+        '''
+        for node in snapshot.nodes:
+            if history.get(node.node, node.is_alive) is not node.is_alive:
+                self._events.publish(
+                    events.NODE_UP if node.is_alive else events.NODE_DOWN,
+                    node=events.describe(node))
+
+            history[node.node] = node.is_alive
+
+    def _log_event(self, event):
+        '''
+        Logs the changes of state of the remote nodes and gateways.
+        Subscriber of the event bus.
+
+        '''
+        if event.type in (events.NODE_UP, events.NODE_DOWN):
+            device = event.data['node']
+
+            # The current node is monitored through the gateways
+            if device['address'] == self._address:
+                return
+
+            device_name = f'node {device["address"]}'
+
+        else:
+            device_name = f'gateway {event.data["gateway"]["address"]}'
+
+        if event.type in (events.NODE_UP, events.GATEWAY_UP):
+            status = 'up'
+
+        else:
+            status = 'down'
+
+        Logger.get().info(f'The {device_name} is {status}')
+
+    def _record_event(self, event):
+        '''
+        Records the metrics of the elections and of the actions.
+        Subscriber of the event bus.
+
+        '''
+        if event.type == events.ELECTION:
+            self._elections.inc()
+            return
+
+        action = event.data['action']
+        self._action_durations.labels(action).observe(
+            event.data['duration'])
+
+        if not event.data['success']:
+            self._action_failures.labels(action).inc()
+
+    def _register_metrics(self, cluster, gateways):
+        '''
+        Registers the metrics computed from the state of the nodes and
+        gateways when they are exposed.
+
+        '''
+        registry = Registry.get()
+
+        up = registry.gauge(
+            'oniond_node_up',
+            'Whether the node is alive.', ('node',))
+
+        active = registry.gauge(
+            'oniond_node_active',
+            'Whether the node is the active node.', ('node',))
+
+        last_heartbeat = registry.gauge(
+            'oniond_node_last_heartbeat_seconds',
+            'Time elapsed since the last heartbeat of the node.',
+            ('node',))
+
+        rtt = registry.gauge(
+            'oniond_node_rtt_seconds',
+            'Round-trip time of the heartbeats echoed by the node.',
+            ('node', 'quantile'))
+
+        jitter = registry.gauge(
+            'oniond_node_jitter_seconds',
+            'One-way jitter of the frames sent by the node.',
+            ('node', 'quantile'))
+
+        gateway_up = registry.gauge(
+            'oniond_gateway_up',
+            'Whether the gateway replies.', ('gateway',))
+
+        def elapsed(device):
+            last = device.detector.last_heartbeat
+
+            if last == float('-inf'):
+                return None
+
+            return monotonic() - last
+
+        for node in cluster.nodes:
+            up.labels(node.address).set_function(
+                lambda node=node: int(node.is_alive))
+
+            active.labels(node.address).set_function(
+                lambda node=node: int(node.is_active))
+
+            last_heartbeat.labels(node.address).set_function(
+                lambda node=node: elapsed(node))
+
+            for quantile in (0.5, 0.99):
+                rtt.labels(node.address, quantile).set_function(
+                    lambda node=node, quantile=quantile:
+                        node.rtt_histogram.percentile(quantile * 100))
+
+                jitter.labels(node.address, quantile).set_function(
+                    lambda node=node, quantile=quantile:
+                        node.jitter_histogram.percentile(quantile * 100))
+
+        for gateway in gateways:
+            gateway_up.labels(gateway.address).set_function(
+                lambda gateway=gateway: int(gateway.is_alive))
 
+    def _unregister_metrics(self, nodes):
         '''
+        Removes the metrics of the nodes removed from the cluster.
+
+        '''
+        registry = Registry.get()
+
+        for node in nodes:
+            for name in ('oniond_node_up', 'oniond_node_active',
+                         'oniond_node_last_heartbeat_seconds'):
+                registry.gauge(name, '').remove(node.address)
+
+            for name in ('oniond_node_rtt_seconds',
+                         'oniond_node_jitter_seconds'):
+                for quantile in (0.5, 0.99):
+                    registry.gauge(name, '').remove(
+                        node.address, quantile)
+
+    def _create_node(self, id, address):
+        '''
+        Creates a node of the cluster with the failure detector matching
+        the configuration.
+
+        '''
+        deadtime = self._deadtime + self._heartbeat_interval
+        is_current_node = address == self._address
+        detector = None
+
+        # The current node is monitored through the gateways
+        if is_current_node:
+            pass
+
+        elif self._membership == 'swim':
+            detector = MembershipDetector(deadtime)
+
+        elif self._failure_detector == 'phi':
+            detector = PhiAccrualDetector(
+                deadtime=deadtime,
+                threshold=self._phi_threshold)
+
+        return Node(
+            id=id,
+            address=address,
+            port=self._port,
+            deadtime=deadtime,
+            is_current_node=is_current_node,
+            detector=detector)
+
+    def _apply_reload(self, cluster, gateways, resolver):
+        '''
+        Applies the settings passed to the `reload` method. The nodes
+        kept keep their state.
+
+        '''
+        settings, self._pending_reload = self._pending_reload, None
         logger = Logger.get()
 
-        logger.warn(f'This node ({node.address}) is now active')
+        node_addresses = settings['node_addresses']
+        nodes = {node.address: node for node in cluster.nodes}
+        new_nodes = []
+
+        for i, address in enumerate(node_addresses, 1):
+            node = nodes.pop(address, None)
+
+            if node is None:
+                node = self._create_node(i, address)
+                logger.info(f'{node} has been added to the cluster')
+
+            # The identifiers are assigned by the cluster
+            new_nodes.append((node, i))
+
+        for node in nodes.values():
+            logger.info(f'{node} has been removed from the cluster')
+
+        if node_addresses != self._node_addresses:
+            cluster.reconfigure(new_nodes)
+            self._node_addresses = node_addresses
+
+            if self._metrics_address:
+                self._unregister_metrics(nodes.values())
+                self._register_metrics(cluster, gateways)
+
+            resolver.invalidate()
 
-        if not run_command(self._action_active):
-            logger.error('An error occurred during the execution of '
-                         'your actions')
+        if (settings['action_active'] != self._action_active or
+            settings['action_passive'] != self._action_passive):
+            self._action_active = settings['action_active']
+            self._action_passive = settings['action_passive']
+
+            logger.info('The new actions will be executed at the next '
+                        'change of state')
+
+        self._executor.timeout = settings['action_timeout']
+        logger.info('The configuration has been reloaded')
+
+    def reload(self, node_addresses, action_active, action_passive,
+            action_timeout):
+        '''
+        Applies a new configuration to the running server, without
+        restarting it. The nodes are matched by address: the nodes kept
+        keep their state, the others are added or removed. The new
+        actions are executed at the next change of state. This
+        operation is non-blocking. From a signal handler, use the
+        `request_reload` method instead.
+
+        :type node_addresses: list of str
+        :param node_addresses: The IP address or FQDN of the nodes,
+            including this node, in order of priority.
+
+        :type action_active: list of str or callable
+        :param action_active: The command or built-in action to execute
+            when this node becomes active.
+
+        :type action_passive: list of str or callable
+        :param action_passive: The command or built-in action to
+            execute when this node becomes passive.
+
+        :type action_timeout: float
+        :param action_timeout: The maximum execution time of an action
+            (in seconds).
+
+        '''
+        self._pending_reload = {
+            'node_addresses': node_addresses,
+            'action_active': action_active,
+            'action_passive': action_passive,
+            'action_timeout': action_timeout
+        }
+
+        self._wakeup.set()
+
+    def request_reload(self, handler):
+        '''
+        Asks the main loop to call a function, typically to read the
+        configuration again and pass it to the `reload` method. This
+        operation only records the request and can be called from a
+        signal handler.
+
+        :type handler: callable
+        :param handler: The function called by the main loop, without
+            argument.
+
+        '''
+        self._reload_handler = handler
+        self._notify()
+
+    def _notify(self):
+        '''
+        Wakes the main loop up from a signal handler. A byte is written
+        to a pipe, which is forwarded to the main loop by a thread:
+        neither the locks of the event nor those of the logger are
+        taken by the signal handler.
+
+        '''
+        if self._wakeup_pipe is None:
+            return
+
+        try:
+            write(self._wakeup_pipe[1], b'\0')
+
+        except OSError:
+            # A wakeup is already pending or the server is stopped
+            pass
+
+    def _forward_wakeups(self, reader):
+        '''
+        Wakes the main loop up each time the `_notify` method is
+        called, until the pipe is closed.
+
+        '''
+        while read(reader, 64):
+            self._wakeup.set()
+
+        close(reader)
+
+    def _active_mode(self, node):
+        '''
+        Puts the server in active mode.
+
+        '''
+        Logger.get().warn(f'This node ({node.address}) is now active')
+        self._executor.submit('active', self._action_active)
 
     def _passive_mode(self, node):
         '''
         Puts the server in passive mode.
 
         '''
-        logger = Logger.get()
+        Logger.get().warn(f'This node ({node.address}) is now passive')
+        self._executor.submit('passive', self._action_passive)
+
+    def _elect(self, cluster):
+        '''
+        Determines the active node of the cluster and executes the
+        actions of this node if its status has changed.
+
+        '''
+        now = monotonic()
+        self._policy.update(cluster.nodes, now)
+        node = self._policy.elect(cluster, now)
 
-        logger.warn(f'This node ({node.address}) is now passive')
+        # We execute the actions on this node
+        if node is cluster.current_node:
+            if not cluster.current_node.is_active:
+                self._active_mode(cluster.current_node)
 
-        if not run_command(self._action_passive):
-            logger.error('An error occurred during the execution of '
-                         'your actions')
+        else:
+            if cluster.current_node.is_active:
+                self._passive_mode(cluster.current_node)
+
+        # We update the status of the nodes
+        if node:
+            if node is not cluster.active_node:
+                cluster.activate(node)
+
+                self._events.publish(
+                    events.ELECTION,
+                    node=events.describe(node))
+
+        else:
+            if cluster.active_node:
+                cluster.reset_active_node()
+                self._events.publish(events.ELECTION, node=None)
 
     def serve_forever(self):
         '''
@@ -127,47 +644,114 @@ class OnionServer:
         self._is_running = True
         logger = Logger.get()
 
+        reader, writer = pipe()
+        set_blocking(writer, False)
+        self._wakeup_pipe = reader, writer
+
+        Thread(
+            target=self._forward_wakeups,
+            args=(reader,),
+            daemon=True).start()
+
         logger.info(f'Onion HA {__version__} (build {__build__}) '
                     f'released on {__date__}')
 
         logger.info('Starting Onion HA...')
 
         socket = UDPSocket()
-        cluster = Cluster()
-        gateway = Gateway(0, self._gateway, self._deadtime)
+        cluster = Cluster(liveness_table=self._liveness_table)
+        gateways = [
+            Gateway(i, address, self._deadtime)
+            for i, address in enumerate(self._gateways, 1)
+        ]
 
-        for i, address in enumerate(self._node_addresses, 1):
-            node = Node(
-                id=i,
-                address=address,
-                port=self._port,
-                deadtime=self._deadtime + 1,
-                is_current_node=address == self._address)
+        cluster.register(*(
+            self._create_node(i, address)
+            for i, address in enumerate(self._node_addresses, 1)
+        ))
+
+        cluster.add_listener(lambda node: self._wakeup.set())
+
+        # The initial status of the nodes is known before collecting
+        # information from the remote nodes, so that the nodes found
+        # alive are reported
+        history = {
+            node.node: node.is_alive
+            for node in cluster.snapshot.nodes
+        }
+
+        self._events.subscribe(
+            name='logger',
+            callback=self._log_event,
+            types=(events.NODE_UP, events.NODE_DOWN,
+                   events.GATEWAY_UP, events.GATEWAY_DOWN))
+
+        self._events.subscribe(
+            name='metrics',
+            callback=self._record_event,
+            types=(events.ELECTION, events.ACTION_FINISHED))
+
+        # The FQDN are resolved before starting the services, which
+        # only use IP addresses
+        resolver = ResolverService(
+            cluster=cluster,
+            gateways=gateways,
+            socket=socket,
+            ttl=self._resolve_interval)
+
+        resolver.refresh(cluster, gateways)
+        bootstrap = Bootstrap(cluster)
+
+        if self._membership == 'swim':
+            membership = SwimService(
+                cluster=cluster,
+                gateways=gateways,
+                socket=socket,
+                interval=self._heartbeat_interval,
+                indirect_probes=self._indirect_probes)
 
-            cluster.register(node)
+            heartbeat = membership
 
-        services = [
-            HeartbeatService(
+        else:
+            membership = None
+
+            heartbeat = HeartbeatService(
                 cluster=cluster,
-                gateway=gateway,
-                socket=socket),
+                gateways=gateways,
+                socket=socket,
+                interval=self._heartbeat_interval,
+                multicast_group=self._multicast_group,
+                echo_interval=self._echo_interval)
+
+        services = [
+            heartbeat,
 
             ConnectivityService(
                 cluster=cluster,
-                gateway=gateway,
-                socket=socket),
+                gateways=gateways,
+                socket=socket,
+                interval=self._heartbeat_interval,
+                quorum=self._gateway_quorum,
+                timeout=min(1, self._deadtime / 2),
+                events=self._events),
 
             ListenerService(
                 cluster=cluster,
-                gateway=gateway,
-                socket=socket),
+                gateways=gateways,
+                socket=socket,
+                membership=membership,
+                resolver=resolver,
+                bootstrap=bootstrap),
 
-            SupervisorService(
-                cluster=cluster,
-                gateway=gateway,
-                socket=socket),
+            resolver
         ]
 
+        if self._runtime == 'asyncio':
+            runtime = AsyncRuntime(services, socket)
+
+        else:
+            runtime = ThreadedRuntime(services)
+
         sleep(self._init_delay)
 
         try:
@@ -178,63 +762,164 @@ class OnionServer:
                          'assigned to the socket')
             return
 
-        logger.info('Starting services...')
+        if self._multicast_group:
+            try:
+                socket.join_multicast_group(
+                    group=self._multicast_group,
+                    interface=self._multicast_interface,
+                    ttl=self._multicast_ttl)
+
+            except OSError:
+                logger.error('The multicast group '
+                             f'{self._multicast_group} cannot be '
+                             'joined')
+                socket.close()
+                return
+
+        control_server = None
+        metrics_server = None
+
+        if self._control_socket:
+            try:
+                control_server = ControlServer(
+                    path=self._control_socket,
+                    cluster=cluster,
+                    gateways=gateways)
+
+            except OSError:
+                logger.error('The control socket '
+                             f'{self._control_socket} cannot be created')
+                socket.close()
+                return
+
+            control_server.start()
+
+            self._events.subscribe(
+                name='control',
+                callback=control_server.publish)
+
+        if self._metrics_address:
+            self._register_metrics(cluster, gateways)
+
+            try:
+                metrics_server = MetricsServer(
+                    address=self._metrics_address,
+                    port=self._metrics_port)
+
+            except OSError:
+                logger.error('The metrics server cannot listen on '
+                             f'{self._metrics_address} port '
+                             f'{self._metrics_port}')
+
+                if control_server:
+                    control_server.shutdown()
+
+                socket.close()
+                return
+
+            metrics_server.start()
+
+        logger.info(f'Starting services ({self._runtime} runtime)...')
+        self._executor.start()
+        runtime.start()
+
+        # The state of the cluster is requested from the remote nodes.
+        # Beyond the detection time, the heartbeats are enough.
+        logger.info('Collecting information from remote nodes...')
+        start = monotonic()
 
-        for service in services:
-            service.start()
+        is_consistent = bootstrap.wait(
+            socket=socket,
+            interval=self._heartbeat_interval,
+            timeout=self._deadtime + self._heartbeat_interval)
 
-        logger.info('Collecting information from remote nodes...')
-        sleep(2)
+        logger.info(f'{bootstrap.replies} of {len(cluster.nodes) - 1} '
+                    f'remote nodes replied in '
+                    f'{(monotonic() - start) * 1000:.0f} ms')
+
+        if not is_consistent:
+            logger.warn('Some remote nodes did not reply: their status '
+                        'only depends on their heartbeats')
+
+        active_node = bootstrap.active_node
+
+        if active_node:
+            cluster.activate(active_node)
 
         logger.info('Onion HA is started')
+        notify_systemd('READY=1')
+
+        version = None
 
+        # The election is performed each time a node comes back to
+        # life, when the next node still alive expires, and at the end
+        # of a hold-down period or of a suppression
         while self._is_running:
-            node = cluster.get_next_active_node()
+            self._wakeup.clear()
+
+            handler, self._reload_handler = self._reload_handler, None
+
+            if handler:
+                handler()
 
-            # We execute the actions on this node
-            if node is cluster.current_node:
-                if not cluster.current_node.is_active:
-                    self._active_mode(cluster.current_node)
+            if self._pending_reload:
+                self._apply_reload(cluster, gateways, resolver)
 
-            else:
-                if cluster.current_node.is_active:
-                    self._passive_mode(cluster.current_node)
+            snapshot = cluster.snapshot
 
-            # We update the status of the nodes
-            if node:
-                if node is not cluster.active_node:
-                    cluster.activate(node)
+            if snapshot.version != version:
+                self._publish_changes(snapshot, history)
+                version = snapshot.version
 
-            else:
-                if cluster.active_node:
-                    cluster.reset_active_node()
+            self._elect(cluster)
 
-            sleep(0.5)
+            delays = [
+                delay
+                for delay in (cluster.next_expiry,
+                              self._policy.next_change(monotonic()))
+                if delay is not None
+            ]
+
+            self._wakeup.wait(min(delays) if delays else None)
 
         logger.info('Stopping Onion HA...')
+        notify_systemd('STOPPING=1')
         sleep(1)
 
         if cluster.current_node.is_active:
             self._passive_mode(cluster.current_node)
 
+        # The last action is completed before stopping
+        self._executor.shutdown()
+
         logger.info('Stopping services...')
+        runtime.shutdown()
+
+        # The pending events are delivered before stopping the
+        # subscribers
+        self._events.close()
 
-        for service in services:
-            service.shutdown()
+        if control_server:
+            control_server.shutdown()
 
-        for service in services:
-            service.join()
+        if metrics_server:
+            metrics_server.shutdown()
 
         socket.close()
 
+        self._wakeup_pipe = None
+        close(writer)
+
         logger.info('Shutdown completed')
 
     def stop(self):
         '''
-        Stops the Onion HA server. This operation is non-blocking.
+        Stops the Onion HA server. This operation is non-blocking and
+        can be called from a signal handler.
 
         '''
         self._is_running = False
+        self._notify()
 
     @property
     def address(self):
@@ -252,6 +937,15 @@ class OnionServer:
         '''
         return self._port
 
+    @property
+    def actions(self):
+        '''
+        The active and passive actions of the server. Returns a
+        `tuple`.
+
+        '''
+        return self._action_active, self._action_passive
+
     @property
     def is_running(self):
         '''
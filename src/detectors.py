@@ -0,0 +1,344 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from collections import deque
+from math import erfc, log10, sqrt
+
+
+def _phi(deviation):
+    '''
+    Computes the phi value of a heartbeat arriving the specified number
+    of standard deviations after the mean interval.
+
+    '''
+    probability = erfc(deviation / sqrt(2)) / 2
+
+    return -log10(max(probability, 1e-300))
+
+
+class FailureDetector:
+    '''
+    Base class for failure detectors. A failure detector receives the
+    heartbeats of a device and determines the time at which the device
+    must be considered as dead if no other heartbeat is received.
+
+    All times are expressed in seconds on a monotonic clock.
+
+    :type deadtime: float
+    :param deadtime: The maximum waiting time before considering the
+        device as dead.
+
+    '''
+    __slots__ = ('_deadtime', '_last_heartbeat')
+
+    def __init__(self, deadtime):
+        self._deadtime = deadtime
+        self._last_heartbeat = float('-inf')
+
+    def heartbeat(self, now):
+        '''
+        Records a heartbeat received at the specified time.
+        May be overridden.
+
+        '''
+        self._last_heartbeat = now
+
+    def suspect(self, now):
+        '''
+        Reports that the device is suspected to be dead by another
+        node. Ignored by default. May be overridden.
+
+        '''
+        pass
+
+    def kill(self):
+        '''
+        Reports that the device is dead. It remains dead until the next
+        heartbeat. May be overridden.
+
+        '''
+        self._last_heartbeat = float('-inf')
+
+    def suspicion(self, now):
+        '''
+        The suspicion level of the device at the specified time. The
+        device is considered as dead when this level reaches the
+        threshold of the detector. Must be overridden.
+
+        '''
+        raise NotImplementedError
+
+    @property
+    def expires_at(self):
+        '''
+        The time at which the device will be considered as dead if no
+        other heartbeat is received. May be overridden.
+
+        '''
+        return self._last_heartbeat + self._deadtime
+
+    @property
+    def deadtime(self):
+        '''
+        The maximum waiting time before considering the device as dead.
+
+        '''
+        return self._deadtime
+
+    @property
+    def last_heartbeat(self):
+        '''
+        The time at which the last heartbeat was received.
+
+        '''
+        return self._last_heartbeat
+
+
+class DeadlineDetector(FailureDetector):
+    '''
+    A failure detector that considers a device as dead when no
+    heartbeat has been received for a fixed period of time.
+
+    The suspicion level is the ratio between the time elapsed since the
+    last heartbeat and the dead time: the device is dead when it
+    reaches 1.
+
+    :type deadtime: float
+    :param deadtime: The waiting time before considering the device as
+        dead.
+
+    '''
+    __slots__ = ()
+
+    def suspicion(self, now):
+        return (now - self._last_heartbeat) / self._deadtime
+
+
+class PhiAccrualDetector(FailureDetector):
+    '''
+    An adaptive failure detector based on the phi accrual failure
+    detector (Hayashibara et al.).
+
+    The detector keeps a sliding window of the intervals between the
+    last heartbeats and assumes that they follow a normal distribution.
+    The suspicion level, called phi, is `-log10(P)` where `P` is the
+    probability that a heartbeat arrives later than the time elapsed
+    since the last one. A phi of 8 means that the detector has one
+    chance in 10^8 to be wrong when it declares the device as dead.
+
+    Until enough intervals are collected, or if phi does not reach its
+    threshold in time, the device is considered as dead after the dead
+    time, like `DeadlineDetector`. The intervals longer than the dead
+    time are not collected.
+
+    :type deadtime: float
+    :param deadtime: The maximum waiting time before considering the
+        device as dead.
+
+    :type threshold: float
+    :param threshold: The phi value from which the device is considered
+        as dead. The default threshold is 8.
+
+    :type window_size: int
+    :param window_size: The number of intervals used to estimate the
+        distribution of the heartbeats. The default size is 100.
+
+    :type min_samples: int
+    :param min_samples: The minimum number of intervals required to
+        use phi. The default value is 5.
+
+    :type min_std_ratio: float
+    :param min_std_ratio: The minimum standard deviation of the
+        intervals, as a ratio of their mean. It prevents a perfectly
+        regular link from making the detector too sensitive. The
+        default ratio is 0.25.
+
+    '''
+    __slots__ = ('_threshold', '_min_samples', '_min_std_ratio',
+                 '_intervals', '_sum', '_sum_squares', '_expires_at', '_z')
+
+    def __init__(self, deadtime, threshold=8, window_size=100,
+            min_samples=5, min_std_ratio=0.25):
+
+        super().__init__(deadtime)
+        self._threshold = threshold
+        self._min_samples = min_samples
+        self._min_std_ratio = min_std_ratio
+        self._intervals = deque(maxlen=window_size)
+        self._sum = 0
+        self._sum_squares = 0
+        self._expires_at = float('-inf')
+
+        # The distance from the mean (in standard deviations) at which
+        # phi reaches its threshold. It only depends on the threshold.
+        self._z = self._find_deviation(threshold)
+
+    @staticmethod
+    def _find_deviation(threshold):
+        '''
+        Solves `phi(z) = threshold` by bisection, where `z` is a number
+        of standard deviations.
+
+        '''
+        low, high = -10, 40
+
+        for _ in range(100):
+            middle = (low + high) / 2
+
+            if _phi(middle) < threshold:
+                low = middle
+
+            else:
+                high = middle
+
+        return high
+
+    def _distribution(self):
+        '''
+        Returns the mean and the standard deviation of the intervals.
+
+        '''
+        count = len(self._intervals)
+        mean = self._sum / count
+        variance = max(self._sum_squares / count - mean ** 2, 0)
+        std = max(sqrt(variance), mean * self._min_std_ratio)
+
+        return mean, std
+
+    def heartbeat(self, now):
+        interval = now - self._last_heartbeat
+
+        # The intervals longer than the dead time span an outage or a
+        # restart of the device: they would inflate the distribution
+        # and slow down the detection of the next failure
+        if interval <= self._deadtime:
+            if len(self._intervals) == self._intervals.maxlen:
+                oldest = self._intervals[0]
+                self._sum -= oldest
+                self._sum_squares -= oldest ** 2
+
+            self._intervals.append(interval)
+            self._sum += interval
+            self._sum_squares += interval ** 2
+
+        self._last_heartbeat = now
+        self._expires_at = now + self._deadtime
+
+        if len(self._intervals) >= self._min_samples:
+            mean, std = self._distribution()
+            delay = mean + self._z * std
+
+            if delay < self._deadtime:
+                self._expires_at = now + delay
+
+    def kill(self):
+        super().kill()
+        self._expires_at = float('-inf')
+
+    def suspicion(self, now):
+        '''
+        The phi value of the device at the specified time. Returns 0
+        if not enough heartbeats have been received yet.
+
+        '''
+        if len(self._intervals) < self._min_samples:
+            return 0.0
+
+        mean, std = self._distribution()
+        elapsed = now - self._last_heartbeat
+
+        return _phi((elapsed - mean) / std)
+
+    @property
+    def expires_at(self):
+        return self._expires_at
+
+    @property
+    def threshold(self):
+        '''
+        The phi value from which the device is considered as dead.
+
+        '''
+        return self._threshold
+
+
+class MembershipDetector(FailureDetector):
+    '''
+    A failure detector driven by a membership protocol such as SWIM.
+    The device is alive from its first heartbeat until it is declared
+    dead or, if it is suspected, until the end of the suspicion period.
+    A new heartbeat clears the suspicion.
+
+    The suspicion level is 0 for a device that is not suspected, then
+    grows from 0 to 1 during the suspicion period.
+
+    :type deadtime: float
+    :param deadtime: The duration of the suspicion period.
+
+    '''
+    __slots__ = ('_suspected_at', '_expires_at')
+
+    def __init__(self, deadtime):
+        super().__init__(deadtime)
+        self._suspected_at = None
+        self._expires_at = float('-inf')
+
+    def heartbeat(self, now):
+        super().heartbeat(now)
+        self._suspected_at = None
+        self._expires_at = float('inf')
+
+    def suspect(self, now):
+        if self._suspected_at is None and now < self._expires_at:
+            self._suspected_at = now
+            self._expires_at = now + self._deadtime
+
+    def kill(self):
+        super().kill()
+        self._suspected_at = None
+        self._expires_at = float('-inf')
+
+    def suspicion(self, now):
+        if now >= self._expires_at:
+            return 1.0
+
+        if self._suspected_at is None:
+            return 0.0
+
+        return (now - self._suspected_at) / self._deadtime
+
+    @property
+    def expires_at(self):
+        return self._expires_at
+
+    @property
+    def is_suspected(self):
+        '''
+        Indicates whether the device is currently suspected. Returns a
+        `boolean`.
+
+        '''
+        return self._suspected_at is not None
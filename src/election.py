@@ -0,0 +1,284 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from .logs import Logger
+from . import protocol
+
+from math import log2
+
+
+class _NodeHistory:
+    '''
+    The liveness history of a node, as seen by the election policy.
+
+    '''
+    def __init__(self, is_alive, now):
+        self.is_alive = is_alive
+        self.changed_at = now
+        self.penalty = 0
+        self.penalty_at = now
+        self.is_suppressed = False
+        self.is_deferred = False
+
+
+class ElectionPolicy:
+    '''
+    Determines the active node of the cluster among the nodes still
+    alive, with preemption control and flap damping.
+
+    The active node is the node with the highest priority, except that
+    a node coming back to life only takes over from a healthy active
+    node according to the `preemption` mode. A dead active node is
+    always replaced at once.
+
+    A node is penalized each time it dies. The penalty halves every
+    `damping_half_life` seconds. A node whose penalty reaches
+    `damping_threshold` is suppressed: it cannot become active until
+    its penalty falls below half the threshold, unless no other node is
+    alive. An active node that becomes suppressed stays active.
+
+    All the nodes apply the same policy to the same observations, so
+    they elect the same node as long as they see the same flaps.
+
+    All times are expressed in seconds on a monotonic clock.
+
+    :type preemption: str
+    :param preemption: (Optional) `always` to let a node with a higher
+        priority take over as soon as it is alive, `delayed` to wait
+        until it has been alive for `hold_down` seconds, or `never` to
+        keep the active node until it dies. The default mode is
+        `always`.
+
+    :type hold_down: float
+    :param hold_down: (Optional) The time a node must stay alive before
+        preempting the active node, with the `delayed` mode (in
+        seconds). The default value is 60 seconds.
+
+    :type damping_half_life: float
+    :param damping_half_life: (Optional) The half-life of the penalty
+        of the nodes (in seconds). 0 disables the flap damping, which
+        is the default.
+
+    :type damping_threshold: float
+    :param damping_threshold: (Optional) The penalty from which a node
+        is suppressed. The default threshold is 3.
+
+    '''
+    def __init__(self, preemption='always', hold_down=60,
+            damping_half_life=0, damping_threshold=3):
+        self._preemption = preemption
+        self._hold_down = hold_down
+        self._damping_half_life = damping_half_life
+        self._damping_threshold = damping_threshold
+        self._history = {}
+
+    def _penalty(self, history, now):
+        if not history.penalty:
+            return 0
+
+        elapsed = now - history.penalty_at
+
+        return history.penalty * 2 ** (-elapsed / self._damping_half_life)
+
+    def _reuse_in(self, history, now):
+        '''
+        The time remaining before a suppressed node can become active
+        again (in seconds).
+
+        '''
+        penalty = self._penalty(history, now)
+        reuse = self._damping_threshold / 2
+
+        return max(self._damping_half_life * log2(penalty / reuse), 0)
+
+    def update(self, nodes, now):
+        '''
+        Records the changes of state of the nodes since the last call.
+        Must be called before each election.
+
+        :type nodes: list of Node
+        :param nodes: The nodes of the cluster.
+
+        :type now: float
+        :param now: The current time.
+
+        '''
+        logger = Logger.get()
+
+        # The nodes removed by a configuration reload are forgotten,
+        # even if other nodes took their place
+        for node in self._history.keys() - set(nodes):
+            del self._history[node]
+
+        for node in nodes:
+            is_alive = node.is_alive
+            history = self._history.get(node)
+
+            if history is None:
+                self._history[node] = _NodeHistory(is_alive, now)
+                continue
+
+            if history.is_alive is not is_alive:
+                history.is_alive = is_alive
+                history.changed_at = now
+                history.is_deferred = False
+
+                if not is_alive and self._damping_half_life:
+                    history.penalty = self._penalty(history, now) + 1
+                    history.penalty_at = now
+
+            if not history.penalty:
+                continue
+
+            if (not history.is_suppressed and
+                self._penalty(history, now) >= self._damping_threshold):
+                history.is_suppressed = True
+
+                logger.warn(f'{node} is flapping: it cannot become '
+                            f'active for {self._reuse_in(history, now):.0f} '
+                            f'seconds')
+
+            elif (history.is_suppressed and
+                  not self._reuse_in(history, now)):
+                history.is_suppressed = False
+                history.penalty = 0
+
+                logger.info(f'{node} is stable again: it can become '
+                            f'active')
+
+    def _is_eligible(self, node):
+        history = self._history.get(node)
+
+        return history is None or not history.is_suppressed
+
+    def _advertised_active_node(self, nodes):
+        '''
+        Gets the remote node alive that advertises itself as active.
+        Used to avoid a takeover when this node has just started. Only
+        the flags of the nodes speaking the binary protocol are up to
+        date.
+
+        '''
+        for node in nodes:
+            if (not node.is_current_node and
+                node.protocol == 'binary' and
+                node.flags & protocol.FLAG_ACTIVE):
+                return node
+
+        return None
+
+    def elect(self, cluster, now):
+        '''
+        Gets the node that must be active. Returns `None` if no node is
+        alive.
+
+        :type cluster: Cluster
+        :param cluster: The cluster.
+
+        :type now: float
+        :param now: The current time.
+
+        '''
+        nodes = cluster.nodes_alive
+
+        if not nodes:
+            return None
+
+        eligible_nodes = [
+            node
+            for node in nodes
+            if self._is_eligible(node)
+        ]
+
+        best_node = (eligible_nodes or nodes)[0]
+        active_node = cluster.active_node
+
+        if active_node not in nodes:
+            if self._preemption == 'always':
+                return best_node
+
+            active_node = self._advertised_active_node(nodes)
+
+            if active_node is None:
+                return best_node
+
+        if not best_node < active_node or self._preemption == 'never':
+            return active_node
+
+        if self._preemption == 'always':
+            return best_node
+
+        history = self._history.get(best_node)
+
+        if history is None or now - history.changed_at >= self._hold_down:
+            return best_node
+
+        if not history.is_deferred:
+            history.is_deferred = True
+
+            Logger.get().info(
+                f'{best_node} will take over in '
+                f'{self._hold_down - (now - history.changed_at):.0f} '
+                f'seconds if it remains alive')
+
+        return active_node
+
+    def next_change(self, now):
+        '''
+        The time remaining before the end of the next hold-down period
+        or suppression (in seconds). Returns `None` if there is none.
+
+        '''
+        delays = []
+
+        for history in self._history.values():
+            if history.is_suppressed:
+                delays.append(self._reuse_in(history, now))
+
+            if (self._preemption == 'delayed' and history.is_alive and
+                now - history.changed_at < self._hold_down):
+                delays.append(self._hold_down - (now - history.changed_at))
+
+        if delays:
+            return min(delays)
+
+        return None
+
+    def is_suppressed(self, node):
+        '''
+        Indicates whether a node is suppressed by the flap damping.
+        Returns a `boolean`.
+
+        '''
+        return not self._is_eligible(node)
+
+    @property
+    def preemption(self):
+        '''
+        The preemption mode: `always`, `delayed` or `never`.
+
+        '''
+        return self._preemption
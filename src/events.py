@@ -0,0 +1,264 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from .logs import Logger
+from .metrics import Registry
+
+from collections import namedtuple
+from queue import Queue, Full
+from threading import Thread, Lock
+from time import time
+
+
+# The types of events. The data of each event is serializable in JSON:
+# `node_up`, `node_down` and `election` carry a `node` (its `id` and
+# `address`, or `None` for an election without active node),
+# `gateway_up` and `gateway_down` a `gateway`, `action_started` the
+# `action` and `action_finished` the `action`, its `result`, whether it
+# succeeded (`success`) and its `duration` in seconds.
+NODE_UP         = 'node_up'
+NODE_DOWN       = 'node_down'
+GATEWAY_UP      = 'gateway_up'
+GATEWAY_DOWN    = 'gateway_down'
+ELECTION        = 'election'
+ACTION_STARTED  = 'action_started'
+ACTION_FINISHED = 'action_finished'
+
+TYPES = (NODE_UP, NODE_DOWN, GATEWAY_UP, GATEWAY_DOWN, ELECTION,
+         ACTION_STARTED, ACTION_FINISHED)
+
+
+Event = namedtuple('Event', [
+    'type', 'time', 'data'
+])
+
+
+def describe(device):
+    '''
+    Describes a node or a gateway in the data of an event.
+
+    '''
+    return {'id': device.id, 'address': device.address}
+
+
+class Subscription:
+    '''
+    A subscriber of an event bus. The events are queued and passed to
+    the callback of the subscriber in its own thread, so that a slow
+    subscriber never delays the publishers or the other subscribers.
+    The events published while the queue is full are dropped.
+
+    Do not instantiate this class directly. Call the `subscribe` method
+    of the event bus.
+
+    '''
+    def __init__(self, bus, name, callback, types, queue_size):
+        self._bus = bus
+        self._name = name
+        self._callback = callback
+        self._types = frozenset(types) if types else None
+        self._queue = Queue(queue_size)
+        self._dropped = 0
+
+        self._dropped_total = Registry.get().counter(
+            'oniond_events_dropped_total',
+            'Events dropped because a subscriber was too slow.',
+            ('subscriber',))
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+
+            if event is None:
+                return
+
+            try:
+                self._callback(event)
+
+            except Exception as err:
+                Logger.get().error(f'The {self._name} subscriber failed '
+                                   f'to process a {event.type} event: '
+                                   f'{err}')
+
+    def _push(self, event):
+        '''
+        Queues an event if the subscriber is interested in it. This
+        operation is non-blocking.
+
+        '''
+        if self._types is not None and event.type not in self._types:
+            return
+
+        try:
+            self._queue.put_nowait(event)
+
+        except Full:
+            self._dropped += 1
+            self._dropped_total.labels(self._name).inc()
+
+    def _close(self):
+        # The sentinel is queued after the pending events, which are
+        # delivered first
+        self._queue.put(None)
+        self._thread.join()
+
+    def unsubscribe(self):
+        '''
+        Stops receiving events. The pending events are delivered before
+        this method returns.
+
+        '''
+        if self._bus.remove(self):
+            self._close()
+
+    @property
+    def name(self):
+        '''
+        The name of the subscriber.
+
+        '''
+        return self._name
+
+    @property
+    def dropped(self):
+        '''
+        The number of events dropped because the queue of the
+        subscriber was full.
+
+        '''
+        return self._dropped
+
+
+class EventBus:
+    '''
+    An in-process publish/subscribe bus that delivers the changes of
+    state of the cluster (see the event types above) to subscribers.
+    Events are published when they happen: nothing is polled.
+
+    Usage::
+
+        bus = EventBus()
+        bus.subscribe('logger', print, types=(NODE_UP, NODE_DOWN))
+        bus.publish(NODE_UP, node=describe(node))
+        bus.close()
+
+    '''
+    def __init__(self):
+        self._subscriptions = []
+        self._lock = Lock()
+
+    def subscribe(self, name, callback, types=None, queue_size=1024):
+        '''
+        Registers a subscriber.
+
+        :type name: str
+        :param name: The name of the subscriber, used in the logs and
+            in the metrics.
+
+        :type callback: callable
+        :param callback: The function receiving each `Event`. It is
+            called in a thread dedicated to the subscriber.
+
+        :type types: list of str
+        :param types: (Optional) The types of events to receive. By
+            default, all the events are received.
+
+        :type queue_size: int
+        :param queue_size: (Optional) The maximum number of events
+            waiting to be processed. The default size is 1024.
+
+        :rtype: Subscription
+        :returns: The subscription, which can be cancelled.
+
+        :raises ValueError: If an event type is unknown.
+
+        '''
+        for type in types or ():
+            if type not in TYPES:
+                raise ValueError(f'Unknown event type: {type}')
+
+        subscription = Subscription(
+            bus=self,
+            name=name,
+            callback=callback,
+            types=types,
+            queue_size=queue_size)
+
+        # The list is replaced as a whole so that the publishers do
+        # not need the lock
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+
+        return subscription
+
+    def remove(self, subscription):
+        '''
+        Removes a subscription without waiting for its pending events.
+        Returns `True` if the subscription was registered.
+
+        '''
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return False
+
+            self._subscriptions = [
+                other
+                for other in self._subscriptions
+                if other is not subscription
+            ]
+
+        return True
+
+    def publish(self, type, **data):
+        '''
+        Publishes an event to the subscribers. This operation is
+        non-blocking.
+
+        :type type: str
+        :param type: The type of the event.
+
+        :param data: The data of the event, serializable in JSON.
+
+        '''
+        event = Event(type=type, time=time(), data=data)
+
+        for subscription in self._subscriptions:
+            subscription._push(event)
+
+    def close(self):
+        '''
+        Removes all the subscribers, once their pending events have
+        been delivered.
+
+        '''
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+
+        for subscription in subscriptions:
+            subscription._close()
@@ -24,7 +24,12 @@
     <https://www.gnu.org/licenses/>.
 '''
 
+from collections import deque
 from datetime import datetime
+from os import rename
+from os.path import exists, getsize
+from sys import stdout
+from threading import Thread, Event, Lock
 
 
 class Logger:
@@ -82,6 +87,15 @@ class Logger:
         '''
         self._handlers.extend(handlers)
 
+    def close(self):
+        '''
+        Closes the handlers of this logger. The pending messages are
+        written before returning.
+
+        '''
+        for handler in self._handlers:
+            handler.close()
+
     def debug(self, message):
         '''
         Logs a message with the level `DEBUG`. The message is
@@ -162,6 +176,22 @@ class LogHandler:
     def log(self, scope, level, message):
         '''
         Logs an event according to the rules defined by the handler.
+        By default, the formatted event is passed to `write`.
+
+        '''
+        self.write([self._format(scope, level, message)])
+
+    def write(self, entries):
+        '''
+        Writes a batch of formatted events.
+        May be overridden.
+
+        '''
+        pass
+
+    def close(self):
+        '''
+        Releases the resources used by the handler.
         May be overridden.
 
         '''
@@ -173,36 +203,67 @@ class StreamHandler(LogHandler):
     Handler that writes events to the standard output stream (stdout).
 
     '''
-    def log(self, scope, level, message):
+    def write(self, entries):
         '''
-        Writes an event to the standard output.
+        Writes a batch of events to the standard output.
 
         '''
-        print(self._format(scope, level, message), flush=True)
+        stdout.write(''.join(entry + '\n' for entry in entries))
+        stdout.flush()
 
 
 class FileHandler(LogHandler):
     '''
     Handler that writes events to a log file.
 
+    When the file reaches `max_size` bytes, it is renamed with the
+    suffix `.1`, the previous backups are shifted (`.1` becomes `.2`,
+    and so on) and a new file is created.
+
     :type filename: str
     :param filename: The name of the log file.
 
+    :type max_size: int
+    :param max_size: (Optional) The size from which the log file is
+        rotated (in bytes). By default, the file is never rotated.
+
+    :type backup_count: int
+    :param backup_count: (Optional) The number of rotated files to
+        keep. The default count is 5.
+
     '''
-    def __init__(self, filename):
+    def __init__(self, filename, max_size=0, backup_count=5):
         super().__init__()
         self._filename = filename
+        self._max_size = max_size
+        self._backup_count = backup_count
 
-    def log(self, scope, level, message):
-        '''
-        Logs an event in a file.
+    def _rotate(self):
+        for i in range(self._backup_count - 1, 0, -1):
+            source = f'{self._filename}.{i}'
+
+            if exists(source):
+                rename(source, f'{self._filename}.{i + 1}')
+
+        if self._backup_count > 0:
+            rename(self._filename, f'{self._filename}.1')
+
+        else:
+            open(self._filename, 'w').close()
 
+    def write(self, entries):
         '''
-        entry = self._format(scope, level, message)
+        Writes a batch of events in the log file and rotates it if
+        necessary.
 
+        '''
         try:
             with open(self._filename, 'a') as file:
-                file.write(entry + '\n')
+                file.write(''.join(entry + '\n' for entry in entries))
+
+            if (self._max_size and
+                getsize(self._filename) >= self._max_size):
+                self._rotate()
 
         except OSError:
             pass
@@ -214,3 +275,119 @@ class FileHandler(LogHandler):
 
         '''
         return self._filename
+
+    @property
+    def max_size(self):
+        '''
+        The size from which the log file is rotated (in bytes). Returns
+        0 if the file is never rotated.
+
+        '''
+        return self._max_size
+
+
+class QueueHandler(LogHandler):
+    '''
+    Handler that queues events and passes them to other handlers in
+    batches, from a background thread. Logging an event never waits for
+    the other handlers, which may write to a slow disk.
+
+    The queue is bounded: when it is full, new events are dropped and
+    counted. The number of events dropped is logged with the next
+    batch.
+
+    :type handlers: LogHandler
+    :param handlers: The handlers to which the events are passed.
+
+    :type flush_interval: float
+    :param flush_interval: (Optional) The interval between two batches
+        (in seconds). The default interval is 1 second.
+
+    :type capacity: int
+    :param capacity: (Optional) The maximum number of events queued.
+        The default capacity is 10000.
+
+    '''
+    def __init__(self, *handlers, flush_interval=1, capacity=10000):
+        super().__init__()
+        self._handlers = handlers
+        self._flush_interval = flush_interval
+        self._capacity = capacity
+
+        self._queue = deque()
+        self._dropped = 0
+        self._total_dropped = 0
+        self._lock = Lock()
+        self._closed = Event()
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def log(self, scope, level, message):
+        '''
+        Queues an event. The event is dropped if the queue is full.
+
+        '''
+        entry = self._format(scope, level, message)
+
+        with self._lock:
+            if len(self._queue) < self._capacity:
+                self._queue.append(entry)
+
+            else:
+                self._dropped += 1
+                self._total_dropped += 1
+
+    def flush(self):
+        '''
+        Passes the queued events to the handlers. This method is called
+        by the background thread.
+
+        '''
+        with self._lock:
+            entries = list(self._queue)
+            dropped = self._dropped
+            self._queue.clear()
+            self._dropped = 0
+
+        if dropped:
+            entries.append(self._format(
+                'oniond', 'warn',
+                f'{dropped} log messages dropped (queue full)'))
+
+        if entries:
+            for handler in self._handlers:
+                handler.write(entries)
+
+    def _run(self):
+        while not self._closed.wait(self._flush_interval):
+            self.flush()
+
+    def close(self):
+        '''
+        Stops the background thread, writes the remaining events and
+        closes the handlers.
+
+        '''
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+
+        for handler in self._handlers:
+            handler.close()
+
+    @property
+    def dropped(self):
+        '''
+        The total number of events dropped because the queue was full.
+
+        '''
+        return self._total_dropped
+
+    @property
+    def pending(self):
+        '''
+        The number of events waiting to be written.
+
+        '''
+        return len(self._queue)
@@ -0,0 +1,398 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock
+
+
+def _escape(value):
+    '''
+    Escapes a label value for the Prometheus text format.
+
+    '''
+    return (str(value)
+        .replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('"', '\\"'))
+
+
+class _Metric:
+    '''
+    Base class for metrics. A metric has a set of children, one per
+    combination of label values.
+
+    '''
+    type = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self._name = name
+        self._help = help
+        self._labels = labels
+        self._children = {}
+        self._lock = Lock()
+
+        # A metric without label is exposed even if it is never updated
+        if not labels:
+            self._children[()] = self._create_child()
+
+    def _create_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        '''
+        Gets the child of the metric corresponding to the specified
+        label values, in the order of the label names. The child is
+        created if necessary.
+
+        '''
+        child = self._children.get(values)
+
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(
+                    values, self._create_child())
+
+        return child
+
+    def remove(self, *values):
+        '''
+        Removes the child corresponding to the specified label values.
+
+        '''
+        with self._lock:
+            self._children.pop(values, None)
+
+    def _format_labels(self, values, extra=()):
+        pairs = list(zip(self._labels, values)) + list(extra)
+
+        if not pairs:
+            return ''
+
+        labels = ','.join(
+            f'{name}="{_escape(value)}"'
+            for name, value in pairs)
+
+        return f'{{{labels}}}'
+
+    def expose(self):
+        '''
+        Returns the metric in the Prometheus text format.
+
+        '''
+        lines = [
+            f'# HELP {self._name} {self._help}',
+            f'# TYPE {self._name} {self.type}'
+        ]
+
+        for values, child in list(self._children.items()):
+            for suffix, extra, value in child.samples():
+                labels = self._format_labels(values, extra)
+                lines.append(f'{self._name}{suffix}{labels} {value}')
+
+        return '\n'.join(lines)
+
+    @property
+    def name(self):
+        '''
+        The name of the metric.
+
+        '''
+        return self._name
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        return [('', (), self.value)]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0
+        self._function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function:
+            value = self._function()
+
+            if value is None:
+                return []
+
+            return [('', (), value)]
+
+        return [('', (), self.value)]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self._buckets):
+            if value <= bound:
+                self._counts[i] += 1
+                break
+
+        self.count += 1
+        self.sum += value
+
+    def samples(self):
+        samples = []
+        total = 0
+
+        for bound, count in zip(self._buckets, self._counts):
+            total += count
+            samples.append(('_bucket', (('le', bound),), total))
+
+        samples.append(('_bucket', (('le', '+Inf'),), self.count))
+        samples.append(('_count', (), self.count))
+        samples.append(('_sum', (), self.sum))
+
+        return samples
+
+
+class Counter(_Metric):
+    '''
+    A metric whose value only increases, such as a number of packets.
+    Call `inc` on the metric or on one of its children.
+
+    '''
+    type = 'counter'
+
+    def _create_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        '''
+        Increments the value of the metric without label.
+
+        '''
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    '''
+    A metric whose value can go up and down, such as a round-trip
+    time. The value can be set directly or computed by a function when
+    the metrics are exposed. A function returning `None` hides the
+    sample.
+
+    '''
+    type = 'gauge'
+
+    def _create_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        '''
+        Sets the value of the metric without label.
+
+        '''
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    '''
+    A metric that counts observations, such as durations, in
+    configurable buckets.
+
+    :type buckets: tuple of float
+    :param buckets: The upper bounds of the buckets, in ascending
+        order.
+
+    '''
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(),
+            buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10,
+                     30, 60)):
+
+        self._buckets = buckets
+        super().__init__(name, help, labels)
+
+    def _create_child(self):
+        return _HistogramChild(self._buckets)
+
+    def observe(self, value):
+        '''
+        Records an observation of the metric without label.
+
+        '''
+        self.labels().observe(value)
+
+
+class Registry:
+    '''
+    A collection of metrics exposed together.
+
+    Do not instantiate this class directly. Call the `get` method to
+    create or retrieve the instance shared by Onion HA.
+
+    '''
+    _registry = None
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    @classmethod
+    def get(cls):
+        '''
+        Gets or creates the registry shared by Onion HA.
+
+        '''
+        if cls._registry is None:
+            cls._registry = Registry()
+
+        return cls._registry
+
+    def _register(self, cls, name, help, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help, *args, **kwargs)
+
+            return self._metrics[name]
+
+    def counter(self, name, help, labels=()):
+        '''
+        Gets or creates a counter.
+
+        '''
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        '''
+        Gets or creates a gauge.
+
+        '''
+        return self._register(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), **kwargs):
+        '''
+        Gets or creates a histogram.
+
+        '''
+        return self._register(Histogram, name, help, labels, **kwargs)
+
+    def expose(self):
+        '''
+        Returns all the metrics in the Prometheus text format.
+
+        '''
+        return ''.join(
+            metric.expose() + '\n'
+            for metric in list(self._metrics.values()))
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = self.server.registry.expose().encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type',
+                         'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    '''
+    An HTTP server exposing the metrics of a registry in the Prometheus
+    text format, on the `/metrics` path. It runs in its own thread.
+
+    :type address: str
+    :param address: The IP address on which the server listens. A local
+        address is recommended.
+
+    :type port: int
+    :param port: The listening port of the server.
+
+    :type registry: Registry
+    :param registry: (Optional) The registry to expose. By default, the
+        registry shared by Onion HA.
+
+    '''
+    def __init__(self, address, port, registry=None):
+        self._server = ThreadingHTTPServer(
+            (address, port), _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.registry = registry or Registry.get()
+        self._thread = Thread(target=self._server.serve_forever)
+
+    def start(self):
+        '''
+        Starts the server. This operation is non-blocking.
+
+        '''
+        self._thread.start()
+
+    def shutdown(self):
+        '''
+        Stops the server and waits for the end of its execution.
+
+        '''
+        self._server.shutdown()
+        self._thread.join()
+        self._server.server_close()
+
+    @property
+    def address(self):
+        '''
+        The IP address on which the server listens.
+
+        '''
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        '''
+        The listening port of the server.
+
+        '''
+        return self._server.server_address[1]
@@ -24,9 +24,34 @@
     <https://www.gnu.org/licenses/>.
 '''
 
-from time import time
-from socket import getfqdn
+from array import array
+from bisect import bisect_left, insort
+from collections import namedtuple
+from heapq import heappush, heappop
+from itertools import count
+from math import isinf
+from threading import RLock
+from time import monotonic
 from .exceptions import UnknownNodeError
+from .detectors import DeadlineDetector
+from .utils import is_ip_address
+
+
+# The state of a node in a snapshot. The status is 0 if the node is
+# dead, 1 if it is passive and 2 if it is active. The node itself is
+# kept to read its statistics, which are not part of the snapshot.
+NodeSnapshot = namedtuple('NodeSnapshot', [
+    'node', 'id', 'address', 'addresses', 'status', 'is_alive',
+    'is_active', 'is_current_node'
+])
+
+# An immutable view of a cluster. The snapshot is valid until the time
+# at which its first node alive expires (on a monotonic clock). The
+# table is a copy of the liveness table, or None if it is disabled.
+ClusterSnapshot = namedtuple('ClusterSnapshot', [
+    'version', 'nodes', 'current_node', 'active_node', 'expires_at',
+    'table'
+])
 
 
 class Cluster:
@@ -37,39 +62,337 @@ class Cluster:
     A cluster must contain at least two nodes and one of them must be
     the current node.
 
+    The nodes alive are kept sorted by priority and are only updated
+    when a node comes back to life or dies, so that the election does
+    not evaluate every node. The nodes that expire silently are found
+    with a heap of expiry times, with one valid entry per node alive.
+    An entry is checked against the failure detector when it reaches
+    the top of the heap: the heartbeats, which only postpone the
+    expiry, never touch the heap.
+
+    Each change of the cluster publishes an immutable snapshot (see
+    the `snapshot` property). The writers serialize on a lock, while
+    the readers only read the last snapshot published: they never see
+    a cluster in the middle of a change, such as two active nodes.
+
+    :type liveness_table: bool
+    :param liveness_table: (Optional) Indicates whether the liveness of
+        the nodes is mirrored in a `LivenessTable`, so that it can be
+        evaluated and copied for all the nodes at once. Disabled by
+        default.
+
     '''
-    def __init__(self):
+    def __init__(self, liveness_table=False):
         self._index = {}
+        self._ids = {}
         self._nodes = []
+        self._liveness_table = liveness_table
+        self._slots = ([], None)
+
+        self._alive = []
+        self._expiries = []
+        self._entries = {}
+        self._counter = count()
+        self._lock = RLock()
 
         self._current_node = None
         self._active_node = None
+        self._listeners = []
+        self._version = 0
+        self._snapshot = ClusterSnapshot(
+            version=0,
+            nodes=(),
+            current_node=None,
+            active_node=None,
+            expires_at=float('inf'),
+            table=None)
+
+    def _changed(self, node=None):
+        with self._lock:
+            now = monotonic()
+            self._version += 1
+
+            if node is not None:
+                self._update_alive(node, now)
+
+            self._publish(now)
+
+    def _publish(self, now):
+        '''
+        Builds a snapshot of the cluster and publishes it. The snapshot
+        expires when the first node alive expires. Must be called with
+        the lock held.
+
+        '''
+        self._pop_obsolete(now)
+        nodes = []
+        current_node = None
+        active_node = None
+
+        for node, is_alive in self.liveness():
+            is_active = node.is_active
+
+            snapshot = NodeSnapshot(
+                node=node,
+                id=node.id,
+                address=node.address,
+                addresses=tuple(node.addresses),
+                status=int(is_alive) + int(is_active),
+                is_alive=is_alive,
+                is_active=is_active,
+                is_current_node=node.is_current_node)
+
+            if node is self._current_node:
+                current_node = snapshot
+
+            if node is self._active_node:
+                active_node = snapshot
+
+            nodes.append(snapshot)
+
+        table = self._slots[1]
+
+        # The snapshot is replaced as a whole: the readers do not need
+        # to take the lock
+        self._snapshot = ClusterSnapshot(
+            version=self._version,
+            nodes=tuple(nodes),
+            current_node=current_node,
+            active_node=active_node,
+            expires_at=self._expiries[0][0] if self._expiries else
+                float('inf'),
+            table=table.copy() if table is not None else None)
+
+    def _position(self, node):
+        '''
+        The position of a node in the sorted list of the nodes alive.
+        Returns `None` if the node is not listed.
+
+        '''
+        position = bisect_left(self._alive, node)
+
+        if (position < len(self._alive) and
+            self._alive[position] is node):
+            return position
+
+        return None
+
+    def _schedule(self, node, expires_at):
+        '''
+        Pushes the expiry of a node on the heap. The previous entry of
+        the node, if any, becomes obsolete.
+
+        '''
+        key = next(self._counter)
+        self._entries[node] = key
+        heappush(self._expiries, (expires_at, key, node))
+
+    def _update_alive(self, node, now):
+        '''
+        Adds a node to the nodes alive or removes it, according to its
+        failure detector. Must be called with the lock held.
+
+        '''
+        expires_at = node.detector.expires_at
+        position = self._position(node)
+
+        if expires_at > now:
+            if position is None:
+                insort(self._alive, node)
 
-    def register(self, node):
+            self._schedule(node, expires_at)
+
+        elif position is not None:
+            del self._alive[position]
+            del self._entries[node]
+
+    def _pop_obsolete(self, now):
+        '''
+        Pops the heap entries that no longer match the expiry of their
+        node, and the entries of the nodes that expired. The entries
+        of the nodes whose expiry has been postponed are pushed again.
+        Must be called with the lock held.
+
+        '''
+        expiries = self._expiries
+
+        while expiries:
+            expires_at, key, node = expiries[0]
+
+            if self._entries.get(node) != key:
+                heappop(expiries)
+                continue
+
+            actual_expires_at = node.detector.expires_at
+
+            if actual_expires_at == expires_at and expires_at > now:
+                return
+
+            heappop(expiries)
+
+            if actual_expires_at > now:
+                self._schedule(node, actual_expires_at)
+
+            else:
+                del self._alive[self._position(node)]
+                del self._entries[node]
+
+    def _rebuild_alive(self):
+        '''
+        Rebuilds the nodes alive and the heap from the failure detectors
+        of all the nodes. Must be called with the lock held.
+
+        '''
+        self._alive = []
+        self._expiries = []
+        self._entries = {}
+        now = monotonic()
+
+        for node in self._nodes:
+            self._update_alive(node, now)
+
+    def register(self, *nodes):
         '''
-        Registers a node in the cluster.
+        Registers one or several nodes in the cluster. Registering all
+        the nodes at once is faster.
 
         The order of the nodes is important: in case of failure, their
         order is used to determine the new active node. The first node
         registered is the master node and is active by default.
 
-        :type node: Node
-        :param node: The node to add to the cluster.
+        :type nodes: Node
+        :param nodes: The nodes to add to the cluster.
+
+        '''
+        with self._lock:
+            for node in nodes:
+                self._ids[node.id] = node
+                self._nodes.append(node)
+
+                if node.is_current_node:
+                    self._current_node = node
+
+                node.add_listener(self._changed)
+
+                for callback in self._listeners:
+                    node.add_listener(callback)
+
+            self._nodes.sort()
+            self._rebuild_alive()
+            self._build_table()
+            self._build_index()
+            self._changed()
+
+    def reconfigure(self, nodes):
+        '''
+        Replaces the nodes of the cluster after a reload of the
+        configuration. The nodes kept must be passed as the same
+        objects: they keep their state. Their new identifier is
+        assigned under the lock of the cluster, since the nodes alive
+        are sorted by identifier. The active node is reset if it is
+        removed.
+
+        :type nodes: list of tuple
+        :param nodes: The nodes of the cluster, including the current
+            node, as `(node, id)` tuples.
+
+        '''
+        with self._lock:
+            new_nodes = [node for node, _ in nodes]
+
+            for node in new_nodes:
+                if node not in self._nodes:
+                    node.add_listener(self._changed)
+
+                    for callback in self._listeners:
+                        node.add_listener(callback)
+
+            for node in self._nodes:
+                if node not in new_nodes:
+                    node.bind(None)
+
+            for node, id in nodes:
+                node.id = id
+
+            # The lists are replaced as a whole so that they can be
+            # read from other threads while being updated
+            self._ids = {node.id: node for node in new_nodes}
+            self._nodes = sorted(new_nodes)
+
+            for node in new_nodes:
+                if node.is_current_node:
+                    self._current_node = node
+
+            # The identifiers, and therefore the priorities, have
+            # changed: the nodes alive are sorted again before any
+            # snapshot is published
+            self._rebuild_alive()
+            self._build_table()
+            self._build_index()
+
+            if self._active_node not in new_nodes:
+                self.reset_active_node()
+
+            self._changed()
+
+    def _build_table(self):
+        '''
+        Builds the liveness table, if enabled, and binds the nodes to
+        their slot. The table and its nodes are replaced as a whole so
+        that they can be read from other threads while being updated.
+
+        '''
+        if not self._liveness_table:
+            return
+
+        nodes = self._nodes
+        table = LivenessTable(len(nodes))
+
+        for slot, node in enumerate(nodes):
+            node.bind(table, slot)
+
+        self._slots = (nodes, table)
+
+    def _build_index(self):
+        '''
+        Builds the index of the nodes by IP address. The index is
+        replaced as a whole so that it can be read from other threads
+        while being updated.
 
         '''
-        self._index[node.address] = node
-        self._nodes.append(node)
-        self._nodes.sort()
+        index = {}
 
-        if node.is_current_node:
-            self._current_node = node
+        for node in self._nodes:
+            for address in node.addresses:
+                index.setdefault(address, node)
+
+        self._index = index
+
+    def update_addresses(self, node, addresses):
+        '''
+        Replaces the IP addresses of a node of the cluster, after its
+        FQDN has been resolved.
+
+        :type node: Node
+        :param node: The node to update.
+
+        :type addresses: list of str
+        :param addresses: The IP addresses of the node.
+
+        '''
+        with self._lock:
+            node.addresses = addresses
+            self._build_index()
+            self._changed()
 
     def get(self, address):
         '''
-        Gets the node corresponding to the specified address.
+        Gets the node corresponding to the specified IP address. This
+        method never queries the name servers: the nodes configured by
+        FQDN are known by their resolved addresses.
 
         :type address: str
-        :param address: The address of the node.
+        :param address: The IP address of the node.
 
         :rtype: Node
         :returns: The desired node.
@@ -77,18 +400,57 @@ class Cluster:
         :raises UnknownNodeError: If the node cannot be found.
 
         '''
-        source_address = address
+        node = self._index.get(address)
+
+        if node:
+            return node
 
         if address == '127.0.0.1':
             return self._current_node
 
-        if address not in self._index:
-            address = getfqdn(address)
+        raise UnknownNodeError(address)
+
+    def get_by_id(self, id):
+        '''
+        Gets the node corresponding to the specified identifier.
+        Returns `None` if the node cannot be found.
+
+        '''
+        return self._ids.get(id)
+
+    def add_listener(self, callback):
+        '''
+        Registers a function to call when a node of the cluster comes
+        back to life, is marked as dead, or when its expiry is brought
+        forward. The function receives the node as its only argument.
+        The nodes registered later are monitored too.
+
+        '''
+        self._listeners.append(callback)
+
+        for node in self._nodes:
+            node.add_listener(callback)
 
-        if address in self._index:
-            return self._index[address]
+    def liveness(self):
+        '''
+        Indicates whether each node of the cluster is alive. With a
+        liveness table, the expiry times of all the nodes are compared
+        at once.
+
+        :rtype: list of tuple
+        :returns: A list of `(node, is_alive)` tuples, sorted by
+            priority.
+
+        '''
+        nodes, table = self._slots
+
+        if table is not None:
+            return list(zip(nodes, table.alive(monotonic())))
 
-        raise UnknownNodeError(source_address)
+        return [
+            (node, node.is_alive)
+            for node in self._nodes
+        ]
 
     def get_next_active_node(self):
         '''
@@ -96,10 +458,11 @@ class Cluster:
         still alive. Returns `None` if no node is alive.
 
         '''
-        nodes = self.nodes_alive
+        with self._lock:
+            self._pop_obsolete(monotonic())
 
-        if nodes:
-            return nodes[0]
+            if self._alive:
+                return self._alive[0]
 
         return None
 
@@ -110,20 +473,24 @@ class Cluster:
         can be active.
 
         '''
-        if self._active_node:
-            self._active_node.is_active = False
+        with self._lock:
+            if self._active_node:
+                self._active_node.is_active = False
 
-        node.is_active = True
-        self._active_node = node
+            node.is_active = True
+            self._active_node = node
+            self._changed()
 
     def reset_active_node(self):
         '''
         Switches the last active node to passive mode.
 
         '''
-        if self._active_node:
-            self._active_node.is_active = False
-            self._active_node = None
+        with self._lock:
+            if self._active_node:
+                self._active_node.is_active = False
+                self._active_node = None
+                self._changed()
 
     @property
     def nodes(self):
@@ -136,14 +503,81 @@ class Cluster:
     @property
     def nodes_alive(self):
         '''
-        The list of nodes still alive.
+        The list of nodes still alive, sorted by priority.
 
         '''
-        return [
-            node
-            for node in self._nodes
-            if node.is_alive
-        ]
+        with self._lock:
+            self._pop_obsolete(monotonic())
+            return list(self._alive)
+
+    @property
+    def next_expiry(self):
+        '''
+        The time remaining before the next node still alive is
+        considered as dead (in seconds). Returns `None` if no node is
+        alive, or if no node expires on its own: with the SWIM
+        protocol, a node only expires once suspected.
+
+        '''
+        now = monotonic()
+
+        with self._lock:
+            self._pop_obsolete(now)
+
+            if self._expiries and not isinf(self._expiries[0][0]):
+                return self._expiries[0][0] - now
+
+        return None
+
+    @property
+    def snapshot(self):
+        '''
+        The last snapshot of the cluster (see `ClusterSnapshot`), which
+        must not be modified. A new snapshot is published at each
+        change of the cluster and when a node alive expires.
+
+        '''
+        snapshot = self._snapshot
+
+        if monotonic() < snapshot.expires_at:
+            return snapshot
+
+        with self._lock:
+            now = monotonic()
+            snapshot = self._snapshot
+
+            if now >= snapshot.expires_at:
+                liveness = [is_alive for _, is_alive in self.liveness()]
+
+                # The expiry may have been postponed by a heartbeat
+                if liveness != [node.is_alive for node in snapshot.nodes]:
+                    self._version += 1
+
+                self._publish(now)
+                snapshot = self._snapshot
+
+        return snapshot
+
+    @property
+    def version(self):
+        '''
+        A number incremented each time a node is registered, comes back
+        to life or is marked as dead, each time the active node changes
+        and each time the addresses of a node are updated. A node that
+        expires silently changes the version when the `snapshot`
+        property is read.
+
+        '''
+        return self._version
+
+    @property
+    def table(self):
+        '''
+        The liveness table of the nodes. Returns `None` if the table is
+        disabled.
+
+        '''
+        return self._slots[1]
 
     @property
     def current_node(self):
@@ -162,6 +596,220 @@ class Cluster:
         return self._active_node
 
 
+class LivenessTable:
+    '''
+    A compact table of the liveness of the nodes of a cluster. The
+    expiry times, the times of the last heartbeats and the dead times
+    of the nodes are stored in arrays of floats, and their state in an
+    array of flags, indexed by slot (the position of the node in the
+    cluster, which is its identifier minus one).
+
+    The liveness of all the nodes is evaluated with a single comparison
+    over the expiry times, and the table is copied one buffer at a
+    time. The nodes write their slot after each change of their
+    failure detector.
+
+    :type size: int
+    :param size: (Optional) The number of slots. The default size is 0.
+
+    '''
+    __slots__ = ('_expires_at', '_last_heartbeats', '_deadtimes',
+                 '_flags')
+
+    FLAG_CURRENT_NODE = 0x01
+    FLAG_ACTIVE = 0x02
+
+    def __init__(self, size=0):
+        self._expires_at = array('d', [float('-inf')]) * size
+        self._last_heartbeats = array('d', [float('-inf')]) * size
+        self._deadtimes = array('d', [0.0]) * size
+        self._flags = array('B', [0]) * size
+
+    def __len__(self):
+        return len(self._flags)
+
+    def update(self, slot, detector, flags=0):
+        '''
+        Writes the state of a node in its slot.
+
+        :type slot: int
+        :param slot: The slot of the node.
+
+        :type detector: FailureDetector
+        :param detector: The failure detector of the node.
+
+        :type flags: int
+        :param flags: (Optional) The state flags of the node (see the
+            `FLAG_*` constants).
+
+        '''
+        self._expires_at[slot] = detector.expires_at
+        self._last_heartbeats[slot] = detector.last_heartbeat
+        self._deadtimes[slot] = detector.deadtime
+        self._flags[slot] = flags
+
+    def alive(self, now):
+        '''
+        Indicates whether each node is alive at the specified time (in
+        seconds, on a monotonic clock).
+
+        :rtype: list of bool
+
+        '''
+        return list(map(now.__lt__, self._expires_at))
+
+    def copy(self):
+        '''
+        Returns an independent copy of the table.
+
+        '''
+        table = LivenessTable()
+        table._expires_at = array('d', self._expires_at)
+        table._last_heartbeats = array('d', self._last_heartbeats)
+        table._deadtimes = array('d', self._deadtimes)
+        table._flags = array('B', self._flags)
+
+        return table
+
+    @property
+    def expires_at(self):
+        '''
+        The times at which the nodes will be considered as dead if no
+        other heartbeat is received (`array` of floats).
+
+        '''
+        return self._expires_at
+
+    @property
+    def last_heartbeats(self):
+        '''
+        The times at which the last heartbeats of the nodes were
+        received (`array` of floats).
+
+        '''
+        return self._last_heartbeats
+
+    @property
+    def deadtimes(self):
+        '''
+        The dead times of the nodes (`array` of floats).
+
+        '''
+        return self._deadtimes
+
+    @property
+    def flags(self):
+        '''
+        The state flags of the nodes (`array` of bytes).
+
+        '''
+        return self._flags
+
+
+class LatencyHistogram:
+    '''
+    A fixed-size histogram of durations, with a relative precision of
+    12.5%. The durations are counted in microseconds: values below 8
+    have their own bucket, and each power of two above is divided into
+    8 buckets (as in HDR histograms). Durations above 1000 seconds are
+    counted in the last bucket.
+
+    '''
+    __slots__ = ('_counts', '_count', '_sum', '_max')
+
+    _SUB_BUCKETS = 8
+    _MAX_VALUE = 2 ** 30 - 1
+
+    def __init__(self):
+        self._counts = [0] * self._index(self._MAX_VALUE) + [0]
+        self._count = 0
+        self._sum = 0
+        self._max = 0
+
+    def _index(self, value):
+        if value < self._SUB_BUCKETS:
+            return value
+
+        exponent = value.bit_length() - 4
+        mantissa = value >> exponent
+
+        return (exponent + 1) * self._SUB_BUCKETS + mantissa - 8
+
+    def _upper_bound(self, index):
+        if index < self._SUB_BUCKETS:
+            return index
+
+        exponent = index // self._SUB_BUCKETS - 1
+        mantissa = index % self._SUB_BUCKETS + 8
+
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, duration):
+        '''
+        Records a duration (in seconds).
+
+        '''
+        value = min(max(int(duration * 1e6), 0), self._MAX_VALUE)
+
+        self._counts[self._index(value)] += 1
+        self._count += 1
+        self._sum += value
+        self._max = max(self._max, value)
+
+    def percentile(self, percentile):
+        '''
+        Gets the duration below which the specified percentage of the
+        durations fall (in seconds). The result is the upper bound of
+        a bucket. Returns `None` if no duration has been recorded.
+
+        '''
+        if not self._count:
+            return None
+
+        rank = max(self._count * percentile / 100, 1)
+        total = 0
+
+        for index, count in enumerate(self._counts):
+            total += count
+
+            if total >= rank:
+                return min(self._upper_bound(index), self._max) / 1e6
+
+        return self._max / 1e6
+
+    @property
+    def count(self):
+        '''
+        The number of durations recorded.
+
+        '''
+        return self._count
+
+    @property
+    def mean(self):
+        '''
+        The mean of the durations recorded (in seconds). Returns `None`
+        if no duration has been recorded.
+
+        '''
+        if not self._count:
+            return None
+
+        return self._sum / self._count / 1e6
+
+    @property
+    def max(self):
+        '''
+        The longest duration recorded (in seconds). Returns `None` if no
+        duration has been recorded.
+
+        '''
+        if not self._count:
+            return None
+
+        return self._max / 1e6
+
+
 class Device:
     '''
     A class that represents a simple network equipment.
@@ -173,16 +821,26 @@ class Device:
     :param address: The IP address or FQDN of the device. An IP address
         is preferred for a deterministic behavior.
 
-    :type deadtime: int
+    :type deadtime: float
     :param deadtime: The waiting time before considering the device as
         dead (in seconds).
 
+    :type detector: FailureDetector
+    :param detector: (Optional) The failure detector used to determine
+        if the device is alive. By default, the device is considered as
+        dead after `deadtime` seconds without heartbeat.
+
     '''
-    def __init__(self, id, address, deadtime):
+    __slots__ = ('_id', '_address', '_addresses', '_detector',
+                 '_listeners', '_binding')
+
+    def __init__(self, id, address, deadtime, detector=None):
         self._id = id
         self._address = address
-        self._deadtime = deadtime
-        self._last_seen = 0
+        self._addresses = [address] if is_ip_address(address) else []
+        self._detector = detector or DeadlineDetector(deadtime)
+        self._listeners = []
+        self._binding = None
 
     def __str__(self):
         return f'{self.__class__.__name__} {self._address}'
@@ -190,13 +848,89 @@ class Device:
     def __lt__(self, other):
         return self.id < other.id
 
+    def add_listener(self, callback):
+        '''
+        Registers a function to call when the device comes back to
+        life, is marked as dead, or when its expiry is brought forward
+        (which can happen with an adaptive failure detector). The
+        function receives the device as its only argument.
+
+        '''
+        self._listeners.append(callback)
+
+    def bind(self, table, slot=None):
+        '''
+        Binds the device to a slot of a liveness table, which is then
+        updated after each change of the failure detector. `None`
+        unbinds the device.
+
+        :type table: LivenessTable
+        :param table: The liveness table, or `None`.
+
+        :type slot: int
+        :param slot: The slot of the device in the table.
+
+        '''
+        # The table and the slot are replaced as a whole since they can
+        # be read from another thread
+        self._binding = (table, slot) if table is not None else None
+        self._write_slot()
+
+    def _write_slot(self):
+        '''
+        Writes the state of the device in its slot of the liveness
+        table, if bound. May be overridden.
+
+        '''
+        binding = self._binding
+
+        if binding is not None:
+            table, slot = binding
+            table.update(slot, self._detector)
+
+    def _update(self, update):
+        '''
+        Applies a change to the failure detector and notifies the
+        registered listeners if the device comes back to life, dies, or
+        will expire earlier than expected.
+
+        '''
+        now = monotonic()
+        expires_at = self._detector.expires_at
+        update(now)
+        new_expires_at = self._detector.expires_at
+        self._write_slot()
+
+        if ((expires_at > now) is not (new_expires_at > now) or
+            new_expires_at < expires_at):
+            for callback in self._listeners:
+                callback(self)
+
     def mark_as_alive(self):
         '''
         Resets the internal countdown used to determine if the device
-        is alive or not.
+        is alive or not. The registered listeners are notified if the
+        device was considered as dead or if it will expire earlier than
+        expected.
+
+        '''
+        self._update(self._detector.heartbeat)
+
+    def mark_as_suspect(self):
+        '''
+        Reports that the device is suspected to be dead. The effect of
+        this method depends on the failure detector.
+
+        '''
+        self._update(self._detector.suspect)
+
+    def mark_as_dead(self):
+        '''
+        Considers the device as dead until the next call to the
+        `mark_as_alive` method.
 
         '''
-        self._last_seen = time()
+        self._update(lambda now: self._detector.kill())
 
     @property
     def id(self):
@@ -206,6 +940,10 @@ class Device:
         '''
         return self._id
 
+    @id.setter
+    def id(self, id):
+        self._id = id
+
     @property
     def address(self):
         '''
@@ -214,13 +952,64 @@ class Device:
         '''
         return self._address
 
+    @property
+    def addresses(self):
+        '''
+        The IP addresses of the device. If the device is configured by
+        FQDN, this list is empty until the FQDN is resolved.
+
+        '''
+        return self._addresses
+
+    @addresses.setter
+    def addresses(self, addresses):
+        self._addresses = addresses
+
+    @property
+    def ip_address(self):
+        '''
+        The IP address used to communicate with the device. Returns
+        `None` if its FQDN has not been resolved yet.
+
+        '''
+        if self._addresses:
+            return self._addresses[0]
+
+        return None
+
+    @property
+    def detector(self):
+        '''
+        The failure detector used to determine if the device is alive.
+
+        '''
+        return self._detector
+
     @property
     def is_alive(self):
         '''
         Indicates whether the node is alive. Returns a `boolean`.
 
         '''
-        return time() - self._last_seen < self._deadtime
+        return monotonic() < self._detector.expires_at
+
+    @property
+    def expires_in(self):
+        '''
+        The time remaining before considering the device as dead (in
+        seconds). Returns 0 if the device is already dead.
+
+        '''
+        return max(self._detector.expires_at - monotonic(), 0)
+
+    @property
+    def suspicion(self):
+        '''
+        The suspicion level of the failure detector for this device.
+        Its scale depends on the detector (see `FailureDetector`).
+
+        '''
+        return self._detector.suspicion(monotonic())
 
 
 class Gateway(Device):
@@ -234,13 +1023,54 @@ class Gateway(Device):
     :param address: The IP address or FQDN of the device. An IP address
         is preferred for a deterministic behavior.
 
-    :type deadtime: int
+    :type deadtime: float
     :param deadtime: The waiting time before considering the device as
         dead (in seconds).
 
+    :type detector: FailureDetector
+    :param detector: (Optional) The failure detector used to determine
+        if the device is alive. By default, the device is considered as
+        dead after `deadtime` seconds without heartbeat.
+
     '''
-    def __init__(self, id, address, deadtime):
-        super().__init__(id, address, deadtime)
+    __slots__ = ('_rtt', '_smoothed_rtt')
+
+    def __init__(self, id, address, deadtime, detector=None):
+        super().__init__(id, address, deadtime, detector)
+        self._rtt = None
+        self._smoothed_rtt = None
+
+    def record_rtt(self, rtt):
+        '''
+        Records the round-trip time of a reply of the gateway (in
+        seconds).
+
+        '''
+        self._rtt = rtt
+
+        if self._smoothed_rtt is None:
+            self._smoothed_rtt = rtt
+
+        else:
+            self._smoothed_rtt += (rtt - self._smoothed_rtt) / 8
+
+    @property
+    def rtt(self):
+        '''
+        The round-trip time of the last reply of the gateway (in
+        seconds). Returns `None` if the gateway never replied.
+
+        '''
+        return self._rtt
+
+    @property
+    def smoothed_rtt(self):
+        '''
+        The smoothed round-trip time of the gateway (in seconds).
+        Returns `None` if the gateway never replied.
+
+        '''
+        return self._smoothed_rtt
 
 
 class Node(Device):
@@ -258,7 +1088,7 @@ class Node(Device):
     :param port: The listening port of the node to communicate in UDP
         with the other nodes.
 
-    :type deadtime: int
+    :type deadtime: float
     :param deadtime: The waiting time before considering the device as
         dead (in seconds).
 
@@ -266,13 +1096,126 @@ class Node(Device):
     :param is_current_node: Indicates whether the node is the current
         node.
 
+    :type detector: FailureDetector
+    :param detector: (Optional) The failure detector used to determine
+        if the device is alive. By default, the device is considered as
+        dead after `deadtime` seconds without heartbeat.
+
     '''
-    def __init__(self, id, address, port, deadtime, is_current_node):
-        super().__init__(id, address, deadtime)
+    __slots__ = ('_port', '_is_current_node', '_is_active', '_protocol',
+                 '_flags', '_sequence', '_sequence_window',
+                 '_packets_received', '_packets_lost', '_packets_reordered',
+                 '_clock_offset', '_transit', '_rtt_histogram',
+                 '_jitter_histogram', '_multicast_received_at',
+                 '_multicast_acknowledged')
+
+    def __init__(self, id, address, port, deadtime, is_current_node,
+            detector=None):
+        super().__init__(id, address, deadtime, detector)
         self._port = port
         self._is_current_node = is_current_node
         self._is_active = False
 
+        self._protocol = None
+        self._flags = 0
+        self._sequence = None
+        self._sequence_window = 0
+        self._packets_received = 0
+        self._packets_lost = 0
+        self._packets_reordered = 0
+        self._clock_offset = None
+        self._transit = None
+        self._rtt_histogram = LatencyHistogram()
+        self._jitter_histogram = LatencyHistogram()
+
+        self._multicast_received_at = float('-inf')
+        self._multicast_acknowledged = False
+
+    def _write_slot(self):
+        binding = self._binding
+
+        if binding is not None:
+            table, slot = binding
+            flags = 0
+
+            if self._is_current_node:
+                flags |= LivenessTable.FLAG_CURRENT_NODE
+
+            if self._is_active:
+                flags |= LivenessTable.FLAG_ACTIVE
+
+            table.update(slot, self._detector, flags)
+
+    def record_frame(self, frame, received_at):
+        '''
+        Updates the statistics of the node from a binary frame it sent.
+
+        Sequence numbers are used to count lost and reordered frames. A
+        frame arriving after a more recent one is counted as reordered
+        and no longer as lost. The last 64 sequence numbers received
+        are remembered to ignore duplicates. A step backward beyond
+        them, or a large step forward, means that the node has
+        restarted (nodes start from a random sequence number): its
+        state is reset.
+
+        The one-way jitter is the variation of the transit time between
+        two frames received in order (see RFC 3550).
+
+        :type frame: Frame
+        :param frame: The header of the frame.
+
+        :type received_at: int
+        :param received_at: The reception time of the frame
+            (nanoseconds since the epoch).
+
+        '''
+        self._protocol = 'binary'
+        self._packets_received += 1
+
+        sequence = frame.sequence
+        last_sequence = self._sequence
+
+        if (last_sequence is None or
+            last_sequence - sequence >= 64 or
+            sequence - last_sequence > 1024):
+            self._sequence = sequence
+            self._sequence_window = 1
+            self._flags = frame.flags
+            self._transit = received_at - frame.timestamp
+
+        elif sequence > last_sequence:
+            shift = sequence - last_sequence
+            self._packets_lost += shift - 1
+            self._sequence = sequence
+            self._sequence_window = (
+                (self._sequence_window << shift) | 1) & (2 ** 64 - 1)
+            self._flags = frame.flags
+
+            transit = received_at - frame.timestamp
+            self._jitter_histogram.record(
+                abs(transit - self._transit) / 1e9)
+            self._transit = transit
+
+        else:
+            bit = 1 << (last_sequence - sequence)
+
+            if bit & self._sequence_window:
+                return
+
+            self._sequence_window |= bit
+            self._packets_reordered += 1
+            self._packets_lost -= 1
+
+        # The offset includes the transmission delay. It is smoothed to
+        # reduce the impact of the jitter.
+        offset = (received_at - frame.timestamp) / 1e9
+
+        if self._clock_offset is None:
+            self._clock_offset = offset
+
+        else:
+            self._clock_offset += (offset - self._clock_offset) / 8
+
     @property
     def port(self):
         '''
@@ -302,3 +1245,116 @@ class Node(Device):
     @is_active.setter
     def is_active(self, is_active):
         self._is_active = is_active
+        self._write_slot()
+
+    @property
+    def protocol(self):
+        '''
+        The protocol spoken by the node: `binary`, `text` for the
+        versions prior to the binary protocol, or `None` if the node
+        has not been heard yet.
+
+        '''
+        return self._protocol
+
+    @protocol.setter
+    def protocol(self, protocol):
+        self._protocol = protocol
+
+    @property
+    def flags(self):
+        '''
+        The state flags advertised by the node in its last binary
+        frame.
+
+        '''
+        return self._flags
+
+    @property
+    def packets_received(self):
+        '''
+        The number of binary frames received from the node.
+
+        '''
+        return self._packets_received
+
+    @property
+    def packets_lost(self):
+        '''
+        The number of binary frames from the node that never arrived,
+        according to their sequence numbers.
+
+        '''
+        return self._packets_lost
+
+    @property
+    def packets_reordered(self):
+        '''
+        The number of binary frames from the node that arrived after a
+        more recent frame.
+
+        '''
+        return self._packets_reordered
+
+    @property
+    def multicast_received_at(self):
+        '''
+        The time at which the last multicast heartbeat of the node was
+        received (in seconds, on a monotonic clock).
+
+        '''
+        return self._multicast_received_at
+
+    @multicast_received_at.setter
+    def multicast_received_at(self, received_at):
+        self._multicast_received_at = received_at
+
+    @property
+    def multicast_acknowledged(self):
+        '''
+        Indicates whether the node receives the multicast heartbeats of
+        the current node, according to its last heartbeat. Returns a
+        `boolean`.
+
+        '''
+        return self._multicast_acknowledged
+
+    @multicast_acknowledged.setter
+    def multicast_acknowledged(self, acknowledged):
+        self._multicast_acknowledged = acknowledged
+
+    @property
+    def clock_offset(self):
+        '''
+        The estimated offset between the clock of this host and the
+        clock of the node, transmission delay included (in seconds).
+        Returns `None` if no binary frame has been received.
+
+        '''
+        return self._clock_offset
+
+    def record_rtt(self, rtt):
+        '''
+        Records the round-trip time of a heartbeat echoed by the node
+        (in seconds).
+
+        '''
+        self._rtt_histogram.record(rtt)
+
+    @property
+    def rtt_histogram(self):
+        '''
+        The histogram of the round-trip times of the heartbeats echoed
+        by the node (see `LatencyHistogram`).
+
+        '''
+        return self._rtt_histogram
+
+    @property
+    def jitter_histogram(self):
+        '''
+        The histogram of the one-way jitter of the frames sent by the
+        node (see `LatencyHistogram`).
+
+        '''
+        return self._jitter_histogram
@@ -0,0 +1,275 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from errno import EEXIST, EADDRNOTAVAIL
+from ipaddress import ip_interface
+from itertools import count
+from os import strerror
+import socket
+import struct
+
+
+# Netlink message types and flags (linux/netlink.h, linux/rtnetlink.h)
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_RTM_NEWADDR = 20
+_RTM_DELADDR = 21
+_RTM_GETADDR = 22
+
+_NLM_F_REQUEST = 0x001
+_NLM_F_ACK = 0x004
+_NLM_F_EXCL = 0x200
+_NLM_F_CREATE = 0x400
+_NLM_F_DUMP = 0x300
+
+# Address attributes (linux/if_addr.h)
+_IFA_ADDRESS = 1
+_IFA_LOCAL = 2
+_IFA_F_NODAD = 0x02
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_IFADDRMSG = struct.Struct('=BBBBI')
+_RTATTR = struct.Struct('=HH')
+_NLMSGERR = struct.Struct('=i')
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _attribute(type, value):
+    length = _RTATTR.size + len(value)
+    padding = b'\x00' * (_align(length) - length)
+
+    return _RTATTR.pack(length, type) + value + padding
+
+
+def _parse_attributes(data):
+    '''
+    Reads the route attributes of a message. Returns a dictionary.
+
+    '''
+    attributes = {}
+    offset = 0
+
+    while offset + _RTATTR.size <= len(data):
+        length, type = _RTATTR.unpack_from(data, offset)
+
+        if length < _RTATTR.size:
+            break
+
+        attributes[type] = data[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+
+    return attributes
+
+
+class NetlinkSocket:
+    '''
+    A minimal rtnetlink client used to add and remove IP addresses
+    without running iproute2. Only the requests needed by Onion HA are
+    implemented.
+
+    Requires the CAP_NET_ADMIN capability (in the network namespace of
+    the process) to modify the addresses.
+
+    '''
+    def __init__(self):
+        self._sequence = count(1)
+
+        self._socket = socket.socket(
+            socket.AF_NETLINK,
+            socket.SOCK_RAW,
+            socket.NETLINK_ROUTE)
+
+        self._socket.bind((0, 0))
+
+    def _send(self, type, flags, payload):
+        sequence = next(self._sequence)
+        header = _NLMSGHDR.pack(
+            _NLMSGHDR.size + len(payload),
+            type, flags, sequence, 0)
+
+        self._socket.send(header + payload)
+        return sequence
+
+    def _receive(self, sequence):
+        '''
+        Yields the type and the payload of the messages answering the
+        request `sequence`, until the end of a dump or an
+        acknowledgement.
+
+        :raises OSError: If the kernel rejects the request.
+
+        '''
+        while True:
+            data = self._socket.recv(65536)
+            offset = 0
+
+            while offset + _NLMSGHDR.size <= len(data):
+                length, type, _, message_sequence, _ = \
+                    _NLMSGHDR.unpack_from(data, offset)
+
+                if length < _NLMSGHDR.size:
+                    return
+
+                payload = data[offset + _NLMSGHDR.size:offset + length]
+                offset += _align(length)
+
+                if message_sequence != sequence:
+                    continue
+
+                if type == _NLMSG_DONE:
+                    return
+
+                if type == _NLMSG_ERROR:
+                    error, = _NLMSGERR.unpack_from(payload)
+
+                    if error:
+                        raise OSError(-error, strerror(-error))
+
+                    return
+
+                yield type, payload
+
+    def _request(self, type, flags, payload):
+        sequence = self._send(type, flags | _NLM_F_REQUEST, payload)
+        return list(self._receive(sequence))
+
+    def get_addresses(self, interface):
+        '''
+        Retrieves the IP addresses assigned to an interface. Returns a
+        `set` of `ipaddress.IPv4Interface` and `IPv6Interface`.
+
+        '''
+        index = socket.if_nametoindex(interface)
+        addresses = set()
+
+        messages = self._request(
+            _RTM_GETADDR, _NLM_F_DUMP,
+            _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0))
+
+        for type, payload in messages:
+            if type != _RTM_NEWADDR:
+                continue
+
+            family, prefix_length, _, _, address_index = \
+                _IFADDRMSG.unpack_from(payload)
+
+            if address_index != index:
+                continue
+
+            attributes = _parse_attributes(payload[_IFADDRMSG.size:])
+            address = attributes.get(
+                _IFA_LOCAL, attributes.get(_IFA_ADDRESS))
+
+            if address is None:
+                continue
+
+            address = socket.inet_ntop(family, address)
+            addresses.add(ip_interface(f'{address}/{prefix_length}'))
+
+        return addresses
+
+    def _change_address(self, type, flags, address, interface):
+        address = ip_interface(address)
+        index = socket.if_nametoindex(interface)
+        packed = address.ip.packed
+
+        if address.version == 4:
+            family = socket.AF_INET
+            address_flags = 0
+            attributes = (_attribute(_IFA_LOCAL, packed) +
+                          _attribute(_IFA_ADDRESS, packed))
+
+        else:
+            # A virtual IP address must be usable at once
+            family = socket.AF_INET6
+            address_flags = _IFA_F_NODAD
+            attributes = _attribute(_IFA_ADDRESS, packed)
+
+        payload = _IFADDRMSG.pack(
+            family, address.network.prefixlen,
+            address_flags, 0, index) + attributes
+
+        self._request(type, flags | _NLM_F_ACK, payload)
+
+    def add_address(self, address, interface):
+        '''
+        Assigns an IP address (`address/prefix`) to an interface. This
+        operation is idempotent. Returns `True` if the address has been
+        added, `False` if it was already assigned.
+
+        :raises OSError: If the interface does not exist or if the
+            address cannot be assigned.
+
+        '''
+        try:
+            self._change_address(
+                _RTM_NEWADDR, _NLM_F_CREATE | _NLM_F_EXCL,
+                address, interface)
+
+        except OSError as err:
+            if err.errno == EEXIST:
+                return False
+
+            raise
+
+        return True
+
+    def delete_address(self, address, interface):
+        '''
+        Removes an IP address (`address/prefix`) from an interface.
+        This operation is idempotent. Returns `True` if the address has
+        been removed, `False` if it was not assigned.
+
+        :raises OSError: If the interface does not exist or if the
+            address cannot be removed.
+
+        '''
+        try:
+            self._change_address(_RTM_DELADDR, 0, address, interface)
+
+        except OSError as err:
+            if err.errno == EADDRNOTAVAIL:
+                return False
+
+            raise
+
+        return True
+
+    def close(self):
+        '''
+        Close the socket. It cannot be used after this call.
+
+        '''
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
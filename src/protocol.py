@@ -0,0 +1,302 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from collections import namedtuple
+from struct import Struct
+from time import time
+
+
+# Every binary frame starts with the following header:
+#
+#   magic       2 bytes     b'OH'
+#   version     1 byte      protocol version (1)
+#   type        1 byte      frame type (see below)
+#   flags       1 byte      state of the sender (see below)
+#   reserved    1 byte      always 0
+#   node_id     2 bytes     identifier of the sender in the cluster
+#   sequence    4 bytes     sequence number of the frame
+#   timestamp   8 bytes     send time (nanoseconds since the epoch)
+#
+# All fields are in network byte order. A STATUS frame is followed by
+# one entry per node (node_id: 2 bytes, status: 1 byte, median and
+# 99th percentile of the round-trip time and 99th percentile of the
+# jitter: 4 bytes each, in microseconds, 0xffffffff if unknown).
+#
+# A STATUS_REQUEST frame is sent by the command-line interface and by
+# the nodes that start, to learn the state of the cluster. It is
+# answered with a STATUS frame by any node of the cluster.
+#
+# A HEARTBEAT frame may be followed by a bitmap of the nodes whose
+# multicast heartbeats are received by the sender: the bit
+# `(node_id - 1) % 8` of the byte `(node_id - 1) // 8` is set for each
+# of them. The FLAG_MULTICAST flag is set on the frames sent to the
+# multicast group.
+#
+# A HEARTBEAT frame with the FLAG_ECHO flag must be answered with a
+# HEARTBEAT_ACK frame with the same sequence number, followed by the
+# timestamp of the heartbeat (8 bytes). The sender of the heartbeat
+# deduces the round-trip time from it.
+#
+# The SWIM_PING, SWIM_ACK and SWIM_PING_REQ frames of the SWIM
+# membership protocol are followed by the identifier of the probed node
+# (2 bytes, 0 if not relevant), the number of membership updates (1
+# byte) and the updates (node_id: 2 bytes, state: 1 byte, incarnation:
+# 4 bytes).
+#
+# The text protocol of the previous versions (b'HELLO', b'GET STATUS'
+# and b'STATUS ...') cannot be mistaken for a binary frame.
+
+MAGIC = b'OH'
+VERSION = 1
+
+HEARTBEAT = 1
+STATUS_REQUEST = 2
+STATUS = 3
+SWIM_PING = 4
+SWIM_ACK = 5
+SWIM_PING_REQ = 6
+HEARTBEAT_ACK = 7
+
+ALIVE = 0
+SUSPECT = 1
+DEAD = 2
+
+FLAG_ACTIVE = 0x01
+FLAG_MULTICAST = 0x02
+FLAG_ECHO = 0x04
+
+_HEADER = Struct('!2sBBBxHIQ')
+_STATUS_ENTRY = Struct('!HBIII')
+_ECHO = Struct('!Q')
+_SWIM_HEADER = Struct('!HB')
+_SWIM_UPDATE = Struct('!HBI')
+
+HEADER_SIZE = _HEADER.size
+
+
+_UNKNOWN = 0xffffffff
+
+
+Frame = namedtuple('Frame', [
+    'type', 'flags', 'node_id', 'sequence', 'timestamp', 'offset'
+])
+
+NodeStatus = namedtuple('NodeStatus', [
+    'status', 'rtt_median', 'rtt_p99', 'jitter_p99'
+])
+
+
+def timestamp():
+    '''
+    The current time in nanoseconds since the epoch.
+
+    '''
+    return int(time() * 1e9)
+
+
+def encode(type, node_id, sequence, flags=0, payload=b''):
+    '''
+    Builds a binary frame. Returns a `bytes` object.
+
+    '''
+    header = _HEADER.pack(
+        MAGIC, VERSION, type, flags, node_id,
+        sequence & 0xffffffff, timestamp())
+
+    return header + payload
+
+
+def decode(data):
+    '''
+    Reads the header of a binary frame. Returns a `Frame` whose
+    `offset` attribute is the position of the payload in `data`, or
+    `None` if the data is not a frame supported by this version.
+
+    '''
+    if (len(data) < HEADER_SIZE or
+        data[0:2] != MAGIC or
+        data[2] != VERSION):
+        return None
+
+    _, _, type, flags, node_id, sequence, sent_at = \
+        _HEADER.unpack_from(data)
+
+    return Frame(type, flags, node_id, sequence, sent_at, HEADER_SIZE)
+
+
+def encode_bitmap(node_ids):
+    '''
+    Builds the bitmap of the specified node identifiers (see the
+    HEARTBEAT frame). Returns a `bytes` object.
+
+    '''
+    bitmap = bytearray(max(node_ids, default=0) // 8 + 1)
+
+    for node_id in node_ids:
+        bitmap[(node_id - 1) // 8] |= 1 << ((node_id - 1) % 8)
+
+    return bytes(bitmap)
+
+
+def bitmap_contains(data, frame, node_id):
+    '''
+    Indicates whether the bitmap following the header of a HEARTBEAT
+    frame contains the specified node identifier. Returns a `boolean`.
+
+    '''
+    position = frame.offset + (node_id - 1) // 8
+
+    if position >= len(data):
+        return False
+
+    return bool(data[position] & (1 << ((node_id - 1) % 8)))
+
+
+def encode_heartbeat_ack(node_id, frame):
+    '''
+    Builds the HEARTBEAT_ACK frame answering a heartbeat.
+
+    '''
+    return encode(
+        type=HEARTBEAT_ACK,
+        node_id=node_id,
+        sequence=frame.sequence,
+        payload=_ECHO.pack(frame.timestamp))
+
+
+def decode_heartbeat_ack(data, frame):
+    '''
+    Reads the timestamp of the heartbeat echoed by a HEARTBEAT_ACK
+    frame. Returns `None` if the frame is truncated.
+
+    '''
+    if len(data) < frame.offset + _ECHO.size:
+        return None
+
+    return _ECHO.unpack_from(data, frame.offset)[0]
+
+
+def _to_microseconds(duration):
+    if duration is None:
+        return _UNKNOWN
+
+    return min(int(duration * 1e6), _UNKNOWN - 1)
+
+
+def _from_microseconds(value):
+    if value == _UNKNOWN:
+        return None
+
+    return value / 1e6
+
+
+def encode_status(cluster, sequence=0):
+    '''
+    Builds a STATUS frame describing the status of the nodes of a
+    cluster: 0 if the node is dead, 1 if it is passive and 2 if it is
+    active, and their latency.
+
+    '''
+    snapshot = cluster.snapshot
+    payload = b''.join(
+        _STATUS_ENTRY.pack(
+            entry.id,
+            entry.status,
+            _to_microseconds(entry.node.rtt_histogram.percentile(50)),
+            _to_microseconds(entry.node.rtt_histogram.percentile(99)),
+            _to_microseconds(entry.node.jitter_histogram.percentile(99)))
+        for entry in snapshot.nodes
+    )
+
+    return encode(
+        type=STATUS,
+        node_id=snapshot.current_node.id,
+        sequence=sequence,
+        payload=payload)
+
+
+def decode_status(data, frame):
+    '''
+    Reads the entries of a STATUS frame. Returns a dictionary whose
+    keys are the identifiers of the nodes and values a `NodeStatus`.
+    The latencies are in seconds, `None` if unknown.
+
+    '''
+    size = (len(data) - frame.offset) // _STATUS_ENTRY.size
+    entries = memoryview(data)[
+        frame.offset:frame.offset + size * _STATUS_ENTRY.size]
+
+    return {
+        node_id: NodeStatus(
+            status,
+            _from_microseconds(rtt_median),
+            _from_microseconds(rtt_p99),
+            _from_microseconds(jitter_p99))
+        for node_id, status, rtt_median, rtt_p99, jitter_p99
+        in _STATUS_ENTRY.iter_unpack(entries)
+    }
+
+
+def encode_swim(type, node_id, sequence, target_id=0, updates=()):
+    '''
+    Builds a frame of the SWIM membership protocol. `updates` is a
+    sequence of `(node_id, state, incarnation)` tuples (255 at most).
+
+    '''
+    payload = _SWIM_HEADER.pack(target_id, len(updates)) + b''.join(
+        _SWIM_UPDATE.pack(*update)
+        for update in updates
+    )
+
+    return encode(
+        type=type,
+        node_id=node_id,
+        sequence=sequence,
+        payload=payload)
+
+
+def decode_swim(data, frame):
+    '''
+    Reads the payload of a frame of the SWIM membership protocol.
+    Returns a tuple with the identifier of the probed node and a list
+    of `(node_id, state, incarnation)` updates.
+
+    '''
+    offset = frame.offset
+
+    if len(data) < offset + _SWIM_HEADER.size:
+        return 0, []
+
+    target_id, count = _SWIM_HEADER.unpack_from(data, offset)
+    offset += _SWIM_HEADER.size
+    count = min(count, (len(data) - offset) // _SWIM_UPDATE.size)
+
+    updates = [
+        _SWIM_UPDATE.unpack_from(data, offset + i * _SWIM_UPDATE.size)
+        for i in range(count)
+    ]
+
+    return target_id, updates
@@ -0,0 +1,172 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from .logs import Logger
+
+from threading import Thread
+import asyncio
+
+
+class ThreadedRuntime:
+    '''
+    Runs each service in its own thread. This is the historical
+    runtime of Onion HA.
+
+    :type services: list of Service
+    :param services: The services to run.
+
+    '''
+    def __init__(self, services):
+        self._services = services
+
+    def start(self):
+        '''
+        Starts the services. This operation is non-blocking.
+
+        '''
+        for service in self._services:
+            service.start()
+
+    def shutdown(self):
+        '''
+        Stops the services and waits for the end of their execution.
+
+        '''
+        for service in self._services:
+            service.shutdown()
+
+        for service in self._services:
+            service.join()
+
+    @property
+    def services(self):
+        '''
+        The services run by this runtime.
+
+        '''
+        return self._services
+
+
+class AsyncRuntime(ThreadedRuntime):
+    '''
+    Runs all the services in a single thread driven by an event loop.
+    Services are scheduled with timers instead of sleeping and the
+    socket is replaced by a non-blocking datagram endpoint.
+
+    :type services: list of Service
+    :param services: The services to run.
+
+    :type socket: UDPSocket
+    :param socket: The socket shared by the services. It must be bound
+        before starting the runtime.
+
+    '''
+    def __init__(self, services, socket):
+        super().__init__(services)
+        self._socket = socket
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._run)
+        self._tasks = []
+
+    async def _serve(self, service, endpoint, delay):
+        arguments = {
+            'cluster': service.cluster,
+            'gateways': service.gateways,
+            'socket': endpoint
+        }
+
+        await service._before_async(**arguments)
+        await asyncio.sleep(delay)
+
+        while service.is_alive:
+            if not service.is_paused:
+                await service._repeat_async(**arguments)
+
+            await asyncio.sleep(service.interval)
+
+    async def _run_service(self, service, endpoint):
+        delay = service.delay
+
+        # A service that crashes is restarted after its interval, so
+        # that the other services keep running
+        while service.is_alive:
+            try:
+                await self._serve(service, endpoint, delay)
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as err:
+                Logger.get().error(
+                    f'The {type(service).__name__} service has crashed '
+                    f'and will be restarted: {err!r}')
+
+                delay = 0
+                await asyncio.sleep(service.interval)
+
+    async def _main(self):
+        endpoint = await self._socket.create_endpoint(self._loop)
+
+        self._tasks = [
+            self._loop.create_task(
+                self._run_service(service, endpoint))
+            for service in self._services
+        ]
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+
+        try:
+            self._loop.run_until_complete(self._main())
+
+        finally:
+            self._loop.close()
+
+    def _cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def start(self):
+        '''
+        Starts the event loop and the services in a dedicated thread.
+        This operation is non-blocking.
+
+        '''
+        self._thread.start()
+
+    def shutdown(self):
+        '''
+        Stops the services and the event loop, then waits for the end
+        of their execution.
+
+        '''
+        for service in self._services:
+            service.shutdown()
+
+        self._loop.call_soon_threadsafe(self._cancel)
+        self._thread.join()
@@ -25,13 +25,18 @@
 '''
 
 from .logs import Logger
+from .metrics import Registry
 from .exceptions import UnknownNodeError
-from .utils import dump_cluster
+from .utils import dump_cluster, is_ip_address, resolve
+from . import events, protocol
 
-from socket import timeout as TimeoutExceeded
-from threading import Thread, Event
-from time import sleep
-from icmplib import ping
+from collections import OrderedDict
+from random import randrange
+from socket import getfqdn, timeout as TimeoutExceeded
+from threading import Thread, Event, Lock
+from time import monotonic
+from icmplib import multiping, async_multiping, ICMPLibError
+import asyncio
 
 
 class Service(Thread):
@@ -43,28 +48,42 @@ class Service(Thread):
     continuously until the program stops. Each service is independent
     and cannot communicate with another.
 
+    A service runs in its own thread when its `start` method is called.
+    It can also be driven by an event loop (see `AsyncRuntime`): in
+    this case, the `_before_async` and `_repeat_async` coroutines are
+    used instead. By default, they call their synchronous counterparts
+    which must therefore be non-blocking.
+
+    The `delay` attribute defines the waiting time before the first
+    repetition and the `interval` attribute, the waiting time between
+    two repetitions (in seconds).
+
     :type cluster: Cluster
     :param cluster: The Onion HA cluster correctly initialized.
 
-    :type gateway: Gateway
-    :param gateway: The gateway used to check the connectivity.
+    :type gateways: list of Gateway
+    :param gateways: The gateways used to check the connectivity.
 
     :type socket: UDPSocket
     :param socket: The socket used to communicate with the other nodes
         of the cluster.
 
     '''
-    def __init__(self, cluster, gateway, socket):
+    delay = 0
+    interval = 0
+
+    def __init__(self, cluster, gateways, socket):
         super().__init__()
         self._cluster = cluster
-        self._gateway = gateway
+        self._gateways = gateways
         self._socket = socket
         self._is_alive = True
 
         self._event = Event()
         self._event.set()
+        self._timer = Event()
 
-    def _before(self, cluster, gateway, socket):
+    def _before(self, cluster, gateways, socket):
         '''
         Actions to perform when the service starts.
         May be overridden.
@@ -72,7 +91,7 @@ class Service(Thread):
         '''
         pass
 
-    def _repeat(self, cluster, gateway, socket):
+    def _repeat(self, cluster, gateways, socket):
         '''
         Actions to repeat during operation of the service.
         May be overridden.
@@ -80,6 +99,22 @@ class Service(Thread):
         '''
         pass
 
+    async def _before_async(self, cluster, gateways, socket):
+        '''
+        Actions to perform when the service starts in an event loop.
+        May be overridden.
+
+        '''
+        self._before(cluster, gateways, socket)
+
+    async def _repeat_async(self, cluster, gateways, socket):
+        '''
+        Actions to repeat during operation of the service in an event
+        loop. May be overridden.
+
+        '''
+        self._repeat(cluster, gateways, socket)
+
     def run(self):
         '''
         Private method. Do not override it.
@@ -87,17 +122,21 @@ class Service(Thread):
         '''
         self._before(
             cluster=self._cluster,
-            gateway=self._gateway,
+            gateways=self._gateways,
             socket=self._socket)
 
+        self._timer.wait(self.delay)
+
         while self._is_alive:
             self._event.wait()
 
             self._repeat(
                 cluster=self._cluster,
-                gateway=self._gateway,
+                gateways=self._gateways,
                 socket=self._socket)
 
+            self._timer.wait(self.interval)
+
     def pause(self):
         '''
         Pauses the service.
@@ -120,6 +159,23 @@ class Service(Thread):
         '''
         self._is_alive = False
         self._event.set()
+        self._timer.set()
+
+    @property
+    def cluster(self):
+        '''
+        The Onion HA cluster.
+
+        '''
+        return self._cluster
+
+    @property
+    def gateways(self):
+        '''
+        The gateways used to check the connectivity.
+
+        '''
+        return self._gateways
 
     @property
     def is_alive(self):
@@ -140,68 +196,337 @@ class Service(Thread):
 
 class HeartbeatService(Service):
     '''
-    This service sends HELLO packets in UDP to the remote nodes to
+    This service sends HEARTBEAT frames in UDP to the remote nodes to
     notify them of the existence of the current node.
 
+    Nodes running a version prior to the binary protocol receive HELLO
+    packets instead. Until a node has been heard, it receives both.
+
+    In multicast mode, a single frame is sent to the multicast group on
+    each interval. Each heartbeat lists the nodes whose multicast
+    frames were received during the last intervals. A node keeps
+    receiving unicast frames until it acknowledges the multicast
+    frames of the current node this way.
+
     :type cluster: Cluster
     :param cluster: The Onion HA cluster correctly initialized.
 
-    :type gateway: Gateway
-    :param gateway: The gateway used to check the connectivity.
+    :type gateways: list of Gateway
+    :param gateways: The gateways used to check the connectivity.
 
     :type socket: UDPSocket
     :param socket: The socket used to communicate with the other nodes
         of the cluster.
 
+    :type interval: float
+    :param interval: The interval between two heartbeats (in seconds).
+        The default interval is 0.5 seconds.
+
+    :type multicast_group: str
+    :param multicast_group: (Optional) The multicast group to which the
+        heartbeats are sent. The socket must be subscribed to it. By
+        default, heartbeats are only sent in unicast.
+
+    :type echo_interval: float
+    :param echo_interval: (Optional) The interval between two
+        heartbeats that the nodes must echo to measure the round-trip
+        time (in seconds). 0 disables the measurement. The default
+        interval is 1 second.
+
     '''
-    def _repeat(self, cluster, gateway, socket):
-        nodes = cluster.nodes
+    def __init__(self, cluster, gateways, socket, interval=0.5,
+            multicast_group=None, echo_interval=1):
 
-        try:
-            for node in nodes:
-                if node.is_current_node:
-                    continue
+        super().__init__(cluster, gateways, socket)
+        self.interval = interval
+        self._multicast_group = multicast_group
+        self._echo_interval = echo_interval
+        self._echoed_at = float('-inf')
+
+        # A random initial sequence number lets the other nodes detect
+        # a restart
+        self._sequence = randrange(2 ** 32)
+
+        self._packets_sent = Registry.get().counter(
+            'oniond_packets_sent_total',
+            'Packets sent to the other nodes.', ('node',))
+
+    def _repeat(self, cluster, gateways, socket):
+        current_node = cluster.current_node
+        flags = 0
+        payload = b''
+
+        now = monotonic()
+
+        if current_node.is_active:
+            flags |= protocol.FLAG_ACTIVE
+
+        if (self._echo_interval and
+            now - self._echoed_at >= self._echo_interval):
+            flags |= protocol.FLAG_ECHO
+            self._echoed_at = now
+
+        if self._multicast_group:
+            # A node is acknowledged if one of its last multicast
+            # heartbeats has been received
+            deadline = now - self.interval * 2.5
 
+            payload = protocol.encode_bitmap([
+                node.id
+                for node in cluster.nodes
+                if node.multicast_received_at > deadline
+            ])
+
+            try:
                 socket.send(
-                    payload=b'HELLO',
-                    address=node.address,
-                    port=node.port)
+                    payload=protocol.encode(
+                        type=protocol.HEARTBEAT,
+                        node_id=current_node.id,
+                        sequence=self._sequence,
+                        flags=flags | protocol.FLAG_MULTICAST,
+                        payload=payload),
+                    address=self._multicast_group,
+                    port=socket.port)
+
+                self._packets_sent.labels(self._multicast_group).inc()
+
+            except OSError as err:
+                Logger.get().debug(str(err))
+
+        frame = protocol.encode(
+            type=protocol.HEARTBEAT,
+            node_id=current_node.id,
+            sequence=self._sequence,
+            flags=flags,
+            payload=payload)
+
+        self._sequence = (self._sequence + 1) & 0xffffffff
+
+        for node in cluster.nodes:
+            address = node.ip_address
+
+            if (node.is_current_node or
+                node.multicast_acknowledged or
+                address is None):
+                continue
 
-        except OSError as err:
-            Logger.get().debug(str(err))
+            packets_sent = self._packets_sent.labels(node.address)
+
+            try:
+                if node.protocol != 'text':
+                    socket.send(
+                        payload=frame,
+                        address=address,
+                        port=node.port)
+
+                    packets_sent.inc()
 
-        sleep(0.5)
+                if node.protocol != 'binary':
+                    socket.send(
+                        payload=b'HELLO',
+                        address=address,
+                        port=node.port)
+
+                    packets_sent.inc()
+
+            except OSError as err:
+                Logger.get().debug(str(err))
 
 
 class ConnectivityService(Service):
     '''
     This service checks the network connectivity of this node by
-    sending ICMP packets to the gateway. It updates the status of the
-    gateway and the current node.
+    sending ICMP packets to the gateways, concurrently. It updates the
+    status and the round-trip time of the gateways, and the status of
+    the current node: the current node is alive when at least `quorum`
+    gateways respond.
 
     :type cluster: Cluster
     :param cluster: The Onion HA cluster correctly initialized.
 
-    :type gateway: Gateway
-    :param gateway: The gateway used to check the connectivity.
+    :type gateways: list of Gateway
+    :param gateways: The gateways used to check the connectivity.
 
     :type socket: UDPSocket
     :param socket: The socket used to communicate with the other nodes
         of the cluster.
 
+    :type interval: float
+    :param interval: The interval between two connectivity checks
+        (in seconds). The default interval is 0.5 seconds.
+
+    :type quorum: int
+    :param quorum: The number of gateways that must respond to consider
+        the current node as connected. The default quorum is 1.
+
+    :type timeout: float
+    :param timeout: The maximum waiting time for the replies of the
+        gateways (in seconds). The default timeout is 1 second.
+
+    :type events: EventBus
+    :param events: (Optional) The bus on which the `gateway_up` and
+        `gateway_down` events are published.
+
     '''
-    def _repeat(self, cluster, gateway, socket):
-        current_node = cluster.current_node
+    def __init__(self, cluster, gateways, socket, interval=0.5,
+            quorum=1, timeout=1, events=None):
+
+        super().__init__(cluster, gateways, socket)
+        self.interval = interval
+        self._quorum = quorum
+        self._timeout = timeout
+        self._events = events
+
+        registry = Registry.get()
+
+        self._probes = registry.counter(
+            'oniond_gateway_probes_total',
+            'ICMP probes sent to the gateways.', ('gateway', 'result'))
+
+        self._rtt = registry.histogram(
+            'oniond_gateway_rtt_seconds',
+            'Round-trip time of the gateways.', ('gateway',),
+            buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25,
+                     .5, 1))
+
+    def _update(self, cluster, resolved, hosts):
+        replies = 0
+
+        for (gateway, _), host in zip(resolved, hosts):
+            if host.is_alive:
+                rtt = host.avg_rtt / 1000
+                gateway.mark_as_alive()
+                gateway.record_rtt(rtt)
+                replies += 1
+
+                self._probes.labels(gateway.address, 'success').inc()
+                self._rtt.labels(gateway.address).observe(rtt)
+
+            else:
+                self._probes.labels(gateway.address, 'failure').inc()
+
+        if replies >= self._quorum:
+            cluster.current_node.mark_as_alive()
+
+    def _publish_changes(self, gateways):
+        '''
+        Publishes an event for each gateway that came back to life or
+        died since the previous check.
+
+        '''
+        for gateway in gateways:
+            is_alive = gateway.is_alive
+
+            if is_alive is self._history.get(gateway, is_alive):
+                continue
+
+            self._history[gateway] = is_alive
+
+            if self._events:
+                self._events.publish(
+                    events.GATEWAY_UP if is_alive else events.GATEWAY_DOWN,
+                    gateway=events.describe(gateway))
+
+    def _resolved(self, gateways):
+        '''
+        Returns the gateways whose address is resolved, with this
+        address. The gateways are resolved once per check, so that the
+        replies are matched with the gateways that were pinged.
+
+        '''
+        resolved = []
+
+        for gateway in gateways:
+            ip_address = gateway.ip_address
+
+            if ip_address:
+                resolved.append((gateway, ip_address))
 
-        host = ping(
-            address=gateway.address,
-            count=1,
-            timeout=1)
+        return resolved
 
-        if host.is_alive:
-            gateway.mark_as_alive()
-            current_node.mark_as_alive()
-            sleep(0.5)
+    def _before(self, cluster, gateways, socket):
+        self._history = {
+            gateway: gateway.is_alive
+            for gateway in gateways
+        }
+
+    def _repeat(self, cluster, gateways, socket):
+        resolved = self._resolved(gateways)
+
+        try:
+            hosts = multiping(
+                addresses=[
+                    ip_address
+                    for _, ip_address in resolved
+                ],
+                count=1,
+                timeout=self._timeout)
+
+            self._update(cluster, resolved, hosts)
+
+        except ICMPLibError as err:
+            Logger.get().debug(str(err))
+
+        self._publish_changes(gateways)
+
+    async def _repeat_async(self, cluster, gateways, socket):
+        resolved = self._resolved(gateways)
+
+        try:
+            hosts = await async_multiping(
+                addresses=[
+                    ip_address
+                    for _, ip_address in resolved
+                ],
+                count=1,
+                timeout=self._timeout)
+
+            self._update(cluster, resolved, hosts)
+
+        except ICMPLibError as err:
+            Logger.get().debug(str(err))
+
+        self._publish_changes(gateways)
+
+
+class _RateLimiter:
+    '''
+    A set of token buckets, one per key. Each bucket holds up to
+    `burst` tokens and is refilled at `rate` tokens per second. The
+    number of buckets is bounded: the oldest ones are forgotten first.
+
+    '''
+    def __init__(self, rate, burst, max_keys=4096):
+        self._rate = rate
+        self._burst = burst
+        self._max_keys = max_keys
+        self._buckets = {}
+
+    def allow(self, key, now):
+        '''
+        Takes a token from the bucket of the specified key. Returns
+        `False` if the bucket is empty.
+
+        '''
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            if len(self._buckets) >= self._max_keys:
+                del self._buckets[next(iter(self._buckets))]
+
+            bucket = self._buckets[key] = [self._burst, now]
+
+        else:
+            bucket[0] = min(
+                bucket[0] + (now - bucket[1]) * self._rate,
+                self._burst)
+            bucket[1] = now
+
+        if bucket[0] < 1:
+            return False
+
+        bucket[0] -= 1
+        return True
 
 
 class ListenerService(Service):
@@ -210,26 +535,138 @@ class ListenerService(Service):
     processes them and updates the status of the nodes.
 
     Requests from hosts that are not part of the cluster are ignored
-    and logged.
+    and logged. The warnings and the lookups of the unknown sources are
+    rate-limited per source: the excess packets are dropped without
+    further processing and summarized every 10 seconds.
 
     :type cluster: Cluster
     :param cluster: The Onion HA cluster correctly initialized.
 
-    :type gateway: Gateway
-    :param gateway: The gateway used to check the connectivity.
+    :type gateways: list of Gateway
+    :param gateways: The gateways used to check the connectivity.
 
     :type socket: UDPSocket
     :param socket: The socket used to communicate with the other nodes
         of the cluster.
 
+
+    :type membership: SwimService
+    :param membership: (Optional) The service implementing the SWIM
+        membership protocol, if enabled. It processes the frames of
+        this protocol.
+
+    :type resolver: ResolverService
+    :param resolver: (Optional) The service to which the unknown
+        sources are reported, to be looked up in the background.
+
+    :type bootstrap: Bootstrap
+    :param bootstrap: (Optional) The object collecting the state of
+        the cluster when the current node starts. It receives the
+        STATUS frames sent by the remote nodes.
+
+    :type rate_limit: float
+    :param rate_limit: The number of packets per second processed for
+        each unknown source, after a burst of `5 * rate_limit` packets.
+        The default limit is 1 packet per second.
+
     '''
-    def _repeat(self, cluster, gateway, socket):
+    _SUMMARY_INTERVAL = 10
+
+    def __init__(self, cluster, gateways, socket, membership=None,
+            resolver=None, bootstrap=None, rate_limit=1):
+
+        super().__init__(cluster, gateways, socket)
+        self._membership = membership
+        self._resolver = resolver
+        self._bootstrapper = bootstrap
+        self._rate_limiter = _RateLimiter(rate_limit, 5 * rate_limit)
+
+        self._suppressed = {}
+        self._summarized_at = monotonic()
+        self._unknown_packets = 0
+        self._dropped_packets = 0
+
+        registry = Registry.get()
+
+        self._packets_received = registry.counter(
+            'oniond_packets_received_total',
+            'Packets received from the other nodes.', ('node',))
+
+        self._unknown_counter = registry.counter(
+            'oniond_unknown_packets_total',
+            'Packets received from unauthorized hosts.')
+
+        self._dropped_counter = registry.counter(
+            'oniond_dropped_packets_total',
+            'Packets from unauthorized hosts dropped by the rate '
+            'limiter.')
+
+    def _reject(self, address):
+        '''
+        Handles a packet sent by a host that is not part of the
+        cluster.
+
+        '''
+        self._unknown_packets += 1
+        self._unknown_counter.inc()
+
+        if not self._rate_limiter.allow(address, monotonic()):
+            self._dropped_packets += 1
+            self._dropped_counter.inc()
+            self._suppressed[address] = \
+                self._suppressed.get(address, 0) + 1
+            return
+
+        if self._resolver:
+            self._resolver.report_unknown(address)
+
+        Logger.get().warn(
+            f'Possible port scan attack: request received '
+            f'from an unauthorized host ({address})')
+
+    def _summarize(self):
+        '''
+        Logs the number of packets dropped per source since the last
+        summary.
+
+        '''
+        now = monotonic()
+
+        if now - self._summarized_at < self._SUMMARY_INTERVAL:
+            return
+
+        suppressed, self._suppressed = self._suppressed, {}
+        self._summarized_at = now
+
+        for address, count in sorted(
+                suppressed.items(), key=lambda item: -item[1])[:10]:
+            Logger.get().warn(
+                f'Possible port scan attack: {count} packets dropped '
+                f'from an unauthorized host ({address}) in the last '
+                f'{self._SUMMARY_INTERVAL} seconds')
+
+        if len(suppressed) > 10:
+            Logger.get().warn(
+                f'Possible port scan attack: packets dropped from '
+                f'{len(suppressed) - 10} other unauthorized hosts')
+
+    def _process(self, cluster, socket, payload, address, port):
         try:
-            payload, address, port = socket.receive()
             node = cluster.get(address)
-
-            if payload == b'HELLO':
+            frame = protocol.decode(payload)
+            self._packets_received.labels(node.address).inc()
+
+            if frame:
+                self._process_frame(
+                    cluster, socket, node, frame, payload, address,
+                    port)
+
+            # The upgraded nodes send HELLO until they hear from this
+            # node: only the nodes never heard in binary use the text
+            # protocol
+            elif payload == b'HELLO' and node.protocol != 'binary':
                 node.mark_as_alive()
+                node.protocol = 'text'
 
             elif (payload == b'GET STATUS' and
                   node.is_current_node):
@@ -241,9 +678,67 @@ class ListenerService(Service):
                     port=port)
 
         except UnknownNodeError as err:
-            Logger.get().warn(
-                f'Possible port scan attack: request received '
-                f'from an unauthorized host ({err.address})')
+            self._reject(err.address)
+
+        except OSError as err:
+            Logger.get().debug(str(err))
+
+    def _process_frame(self, cluster, socket, node, frame, payload,
+            address, port):
+
+        if frame.type == protocol.HEARTBEAT:
+            node.mark_as_alive()
+            node.record_frame(frame, protocol.timestamp())
+
+            node.multicast_acknowledged = protocol.bitmap_contains(
+                payload, frame, cluster.current_node.id)
+
+            if frame.flags & protocol.FLAG_MULTICAST:
+                node.multicast_received_at = monotonic()
+
+            if frame.flags & protocol.FLAG_ECHO:
+                socket.send(
+                    payload=protocol.encode_heartbeat_ack(
+                        cluster.current_node.id, frame),
+                    address=address,
+                    port=port)
+
+        elif frame.type == protocol.HEARTBEAT_ACK:
+            sent_at = protocol.decode_heartbeat_ack(payload, frame)
+
+            # The timestamp comes from the clock of this host: a step of
+            # the clock can produce an aberrant value
+            if sent_at is not None:
+                rtt = (protocol.timestamp() - sent_at) / 1e9
+
+                if 0 <= rtt < 60:
+                    node.record_rtt(rtt)
+
+        elif (frame.type in (protocol.SWIM_PING,
+                             protocol.SWIM_ACK,
+                             protocol.SWIM_PING_REQ) and
+              self._membership):
+            self._membership.process(
+                cluster, socket, node, frame, payload)
+
+        # The status is requested by the command-line interface and by
+        # the remote nodes when they start
+        elif frame.type == protocol.STATUS_REQUEST:
+            socket.send(
+                payload=protocol.encode_status(cluster, frame.sequence),
+                address=address,
+                port=port)
+
+        elif (frame.type == protocol.STATUS and
+              not node.is_current_node and
+              self._bootstrapper):
+            self._bootstrapper.process(
+                node, protocol.decode_status(payload, frame))
+
+    def _repeat(self, cluster, gateways, socket):
+        try:
+            payload, address, port = socket.receive()
+            self._process(cluster, socket, payload, address, port)
 
         except TimeoutExceeded:
             pass
@@ -251,52 +746,172 @@ class ListenerService(Service):
         except OSError as err:
             Logger.get().debug(str(err))
 
+        self._summarize()
+
+    async def _repeat_async(self, cluster, gateways, socket):
+        try:
+            payload, address, port = await socket.receive()
+            self._process(cluster, socket, payload, address, port)
+
+        except TimeoutExceeded:
+            pass
+
+        self._summarize()
+
+    @property
+    def unknown_packets(self):
+        '''
+        The number of packets received from hosts that are not part of
+        the cluster.
+
+        '''
+        return self._unknown_packets
 
-class SupervisorService(Service):
+    @property
+    def dropped_packets(self):
+        '''
+        The number of packets from unknown hosts dropped by the rate
+        limiter.
+
+        '''
+        return self._dropped_packets
+
+
+class ResolverService(Service):
     '''
-    This service continually analyzes the status of the nodes and logs
-    the changes.
+    This service resolves the FQDN of the nodes and gateways, so that
+    the other services only handle IP addresses and never wait for the
+    name servers. The FQDN are resolved again every `ttl` seconds.
+
+    The unknown sources reported by the listener are looked up in the
+    background: if the reverse name of a source matches the FQDN of a
+    node, the source becomes an address of this node. Otherwise, the
+    source is kept in a bounded negative cache for `ttl` seconds.
 
     :type cluster: Cluster
     :param cluster: The Onion HA cluster correctly initialized.
 
-    :type gateway: Gateway
-    :param gateway: The gateway used to check the connectivity.
+    :type gateways: list of Gateway
+    :param gateways: The gateways used to check the connectivity.
 
     :type socket: UDPSocket
     :param socket: The socket used to communicate with the other nodes
         of the cluster.
 
+    :type ttl: float
+    :param ttl: The lifetime of the resolved addresses and of the
+        negative cache entries (in seconds). The default TTL is 60
+        seconds.
+
+    :type negative_cache_size: int
+    :param negative_cache_size: The maximum number of unknown sources
+        remembered. The oldest ones are forgotten first. The default
+        size is 1024.
+
     '''
-    def _before(self, cluster, gateway, socket):
-        self._devices = [
-            node
-            for node in cluster.nodes
-            if not node.is_current_node
-        ]
+    interval = 1
 
-        self._devices.append(gateway)
+    def __init__(self, cluster, gateways, socket, ttl=60,
+            negative_cache_size=1024):
 
-        self._history = {
-            device.id: True
-            for device in self._devices
-        }
+        super().__init__(cluster, gateways, socket)
+        self._ttl = ttl
+        self._negative_cache_size = negative_cache_size
+        self._negative_cache = OrderedDict()
+        self._pending = set()
+        self._aliases = {}
+        self._resolved_at = float('-inf')
+        self._lock = Lock()
 
-        sleep(1)
+    def refresh(self, cluster, gateways):
+        '''
+        Resolves the FQDN of the nodes and gateways. This method blocks
+        until the name servers reply. If a FQDN cannot be resolved, the
+        previous addresses are kept.
 
-    def _repeat(self, cluster, gateway, socket):
-        for device in self._devices:
-            if device.is_alive is self._history[device.id]:
+        '''
+        self._resolved_at = monotonic()
+
+        for device in cluster.nodes + gateways:
+            if is_ip_address(device.address):
+                continue
+
+            addresses = resolve(device.address)
+
+            if not addresses:
+                Logger.get().warn(
+                    f'The address {device.address} cannot be resolved')
+                continue
+
+            addresses += [
+                address
+                for address, node in self._aliases.items()
+                if node is device and address not in addresses
+            ]
+
+            if addresses == device.addresses:
                 continue
 
-            if device.is_alive:
-                status = 'up'
+            if device in gateways:
+                device.addresses = addresses
 
             else:
-                status = 'down'
+                cluster.update_addresses(device, addresses)
+
+    def invalidate(self):
+        '''
+        Requests a new resolution of the FQDN of the nodes and gateways
+        at the next iteration, for example after new nodes have been
+        added. This method is non-blocking.
+
+        '''
+        self._resolved_at = float('-inf')
+
+    def report_unknown(self, address):
+        '''
+        Reports a source that is not part of the cluster. The source is
+        looked up later, unless it is in the negative cache. This
+        method is non-blocking.
+
+        '''
+        with self._lock:
+            expires_at = self._negative_cache.get(address)
+
+            if ((expires_at is None or expires_at < monotonic()) and
+                len(self._pending) < self._negative_cache_size):
+                self._pending.add(address)
+
+    def _lookup(self, cluster, address):
+        name = getfqdn(address)
+
+        for node in cluster.nodes:
+            if name == node.address:
+                Logger.get().info(
+                    f'The address {address} belongs to the node '
+                    f'{node.address}')
+
+                self._aliases[address] = node
+                cluster.update_addresses(node, node.addresses + [address])
+                return
+
+        with self._lock:
+            self._negative_cache[address] = monotonic() + self._ttl
+            self._negative_cache.move_to_end(address)
+
+            while len(self._negative_cache) > self._negative_cache_size:
+                self._negative_cache.popitem(last=False)
+
+    def _repeat(self, cluster, gateways, socket):
+        if monotonic() - self._resolved_at >= self._ttl:
+            self.refresh(cluster, gateways)
+
+        with self._lock:
+            pending, self._pending = self._pending, set()
 
-            device_name = str(device).lower()
-            Logger.get().info(f'The {device_name} is {status}')
-            self._history[device.id] = device.is_alive
+        for address in pending:
+            self._lookup(cluster, address)
 
-        sleep(0.5)
+    async def _repeat_async(self, cluster, gateways, socket):
+        # The resolver of the system is blocking
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._repeat, cluster, gateways, socket)
@@ -25,6 +25,7 @@
 '''
 
 import socket
+import asyncio
 
 
 class UDPSocket:
@@ -54,6 +55,37 @@ class UDPSocket:
         self._port = port
         self._socket.bind((address, port))
 
+    def join_multicast_group(self, group, interface='0.0.0.0', ttl=1):
+        '''
+        Subscribes the socket to an IPv4 multicast group and sends the
+        multicast datagrams through the specified interface (IP
+        address). Datagrams sent by this socket to the group are not
+        looped back.
+
+        '''
+        membership = (socket.inet_aton(group) +
+                      socket.inet_aton(interface))
+
+        self._socket.setsockopt(
+            socket.IPPROTO_IP,
+            socket.IP_ADD_MEMBERSHIP,
+            membership)
+
+        self._socket.setsockopt(
+            socket.IPPROTO_IP,
+            socket.IP_MULTICAST_IF,
+            socket.inet_aton(interface))
+
+        self._socket.setsockopt(
+            socket.IPPROTO_IP,
+            socket.IP_MULTICAST_TTL,
+            ttl)
+
+        self._socket.setsockopt(
+            socket.IPPROTO_IP,
+            socket.IP_MULTICAST_LOOP,
+            False)
+
     def send(self, payload, address, port):
         '''
         Sends the payload (in bytes) to the destination address.
@@ -61,10 +93,12 @@ class UDPSocket:
         '''
         return self._socket.sendto(payload, (address, port))
 
-    def receive(self, timeout=5, buffer_size=1024):
+    def receive(self, timeout=5, buffer_size=65535):
         '''
         Reads incoming data from this socket and returns a tuple with
-        the payload, the address and the source port.
+        the payload, the address and the source port. The default
+        buffer holds the largest UDP datagram, such as the status of a
+        large cluster: the excess of a datagram is discarded.
 
         '''
         self._socket.settimeout(timeout)
@@ -76,6 +110,21 @@ class UDPSocket:
 
         return payload, address, port
 
+    async def create_endpoint(self, loop, queue_size=1024):
+        '''
+        Wraps this socket into a datagram endpoint of the specified
+        event loop. Returns an `AsyncUDPSocket` that can only be used
+        from this event loop.
+
+        '''
+        endpoint = AsyncUDPSocket(self, queue_size)
+
+        await loop.create_datagram_endpoint(
+            lambda: endpoint,
+            sock=self._socket)
+
+        return endpoint
+
     def close(self):
         '''
         Close the socket. It cannot be used after this call.
@@ -100,3 +149,84 @@ class UDPSocket:
 
         '''
         return self._port
+
+
+class AsyncUDPSocket(asyncio.DatagramProtocol):
+    '''
+    A datagram endpoint that exposes the interface of `UDPSocket` to
+    the coroutines of an event loop. Do not instantiate this class
+    directly. Call the `UDPSocket.create_endpoint` method instead.
+
+    Incoming datagrams are queued until they are read. If the queue is
+    full, new datagrams are dropped.
+
+    :type udp_socket: UDPSocket
+    :param udp_socket: The underlying socket.
+
+    :type queue_size: int
+    :param queue_size: The maximum number of datagrams waiting to be
+        read.
+
+    '''
+    def __init__(self, udp_socket, queue_size):
+        self._udp_socket = udp_socket
+        self._transport = None
+        self._queue = asyncio.Queue(queue_size)
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            self._queue.put_nowait((data, addr[0], addr[1]))
+
+        except asyncio.QueueFull:
+            pass
+
+    def send(self, payload, address, port):
+        '''
+        Sends the payload (in bytes) to the destination address. This
+        operation is non-blocking.
+
+        '''
+        self._transport.sendto(payload, (address, port))
+
+    async def receive(self, timeout=5):
+        '''
+        Waits for incoming data and returns a tuple with the payload,
+        the address and the source port.
+
+        :raises socket.timeout: If no data is received before the
+            timeout expires.
+
+        '''
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+
+        except asyncio.TimeoutError:
+            raise socket.timeout
+
+    def close(self):
+        '''
+        Detaches the endpoint from the event loop. The underlying
+        socket is closed too.
+
+        '''
+        if self._transport:
+            self._transport.close()
+
+    @property
+    def address(self):
+        '''
+        The address of the underlying socket.
+
+        '''
+        return self._udp_socket.address
+
+    @property
+    def port(self):
+        '''
+        The port of the underlying socket.
+
+        '''
+        return self._udp_socket.port
@@ -0,0 +1,394 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    This program is free software: you can redistribute it and/or
+    modify it under the terms of the GNU General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see
+    <https://www.gnu.org/licenses/>.
+'''
+
+from .services import Service
+from .logs import Logger
+from .metrics import Registry
+from . import protocol
+
+from math import ceil, log2
+from random import sample, shuffle
+from threading import Lock
+from time import monotonic, time
+
+
+class SwimService(Service):
+    '''
+    This service replaces the all-to-all heartbeats of the
+    `HeartbeatService` by the SWIM membership protocol (Das et al.).
+    It allows a cluster to grow to hundreds of nodes while keeping the
+    network load per node and the detection time roughly constant.
+
+    Each protocol period, the current node pings one member chosen in
+    round-robin order. If no acknowledgment is received within half a
+    period, it asks `indirect_probes` other members to ping it on its
+    behalf (ping-req). If the member is still not acknowledged at the
+    end of the period, it becomes suspect. A suspect member that does
+    not refute the suspicion before the end of the suspicion period is
+    declared dead.
+
+    Changes of membership are piggybacked on the frames of the
+    protocol and disseminated by gossip. Incarnation numbers allow a
+    member to refute a suspicion about itself.
+
+    The remote nodes must use a `MembershipDetector`, whose dead time
+    is the suspicion period. The frames are processed by the
+    `ListenerService`, which calls the `process` method.
+
+    :type cluster: Cluster
+    :param cluster: The Onion HA cluster correctly initialized.
+
+    :type gateways: list of Gateway
+    :param gateways: The gateways used to check the connectivity.
+
+    :type socket: UDPSocket
+    :param socket: The socket used to communicate with the other nodes
+        of the cluster.
+
+    :type interval: float
+    :param interval: The duration of a protocol period (in seconds).
+        The default period is 0.5 seconds.
+
+    :type indirect_probes: int
+    :param indirect_probes: The number of members asked to probe a
+        member that did not respond. The default value is 3.
+
+    '''
+    _MAX_UPDATES = 32
+
+    def __init__(self, cluster, gateways, socket, interval=0.5,
+            indirect_probes=3):
+
+        super().__init__(cluster, gateways, socket)
+        self._period = interval
+        self._indirect_probes = indirect_probes
+        self._lock = Lock()
+
+        # Each period is divided into two phases: the direct probe and
+        # the indirect probes
+        self.interval = interval / 2
+        self._phase = 0
+
+        # Restarting the node always gives it a higher incarnation
+        self._incarnation = int(time()) & 0xffffffff
+        self._members = {}
+        self._updates = []
+        self._targets = []
+        self._sequence = 0
+        self._probe = None
+        self._relays = {}
+
+        self._packets_sent = Registry.get().counter(
+            'oniond_packets_sent_total',
+            'Packets sent to the other nodes.', ('node',))
+
+    def _next_sequence(self):
+        self._sequence = (self._sequence + 1) & 0xffffffff
+        return self._sequence
+
+    def _send(self, socket, type, node, sequence, target_id=0):
+        '''
+        Sends a frame to a node with as many pending updates as
+        possible. The least transmitted updates are sent first. The
+        incarnation of the current node is always sent, so that the
+        nodes learn it as soon as they receive a frame from it.
+
+        '''
+        if node.ip_address is None:
+            return
+
+        self._updates.sort(key=lambda update: update[3])
+        updates = self._updates[:self._MAX_UPDATES - 1]
+        limit = 3 * ceil(log2(len(self._members) + 2))
+
+        for update in updates:
+            update[3] += 1
+
+        self._updates = [
+            update
+            for update in self._updates
+            if update[3] < limit
+        ]
+
+        current_node_id = self._cluster.current_node.id
+        updates = [(current_node_id, protocol.ALIVE, self._incarnation)] \
+            + [tuple(update[:3]) for update in updates]
+
+        try:
+            socket.send(
+                payload=protocol.encode_swim(
+                    type=type,
+                    node_id=current_node_id,
+                    sequence=sequence,
+                    target_id=target_id,
+                    updates=updates),
+                address=node.ip_address,
+                port=node.port)
+
+            self._packets_sent.labels(node.address).inc()
+
+        except OSError as err:
+            Logger.get().debug(str(err))
+
+    def _gossip(self, node_id, state, incarnation):
+        '''
+        Queues an update to disseminate. It replaces the previous
+        update about the same node.
+
+        '''
+        self._updates = [
+            update
+            for update in self._updates
+            if update[0] != node_id
+        ]
+
+        self._updates.append([node_id, state, incarnation, 0])
+
+    def _apply(self, cluster, node_id, state, incarnation):
+        '''
+        Applies a membership update received from another node or
+        decided locally. Returns a `boolean` indicating whether the
+        update has been accepted.
+
+        '''
+        current_node = cluster.current_node
+
+        # A node suspected or declared dead refutes it with a new
+        # incarnation, sent with each of its frames
+        if node_id == current_node.id:
+            if state != protocol.ALIVE and incarnation >= self._incarnation:
+                self._incarnation = (incarnation + 1) & 0xffffffff
+
+            return False
+
+        node = cluster.get_by_id(node_id)
+
+        if node is None:
+            return False
+
+        member = self._members.get(node_id)
+
+        if member is not None:
+            current_state, current_incarnation = member
+
+            if state == protocol.ALIVE:
+                accepted = incarnation > current_incarnation
+
+            elif state == protocol.SUSPECT:
+                accepted = (
+                    incarnation > current_incarnation or
+                    incarnation == current_incarnation and
+                    current_state == protocol.ALIVE)
+
+            else:
+                accepted = (
+                    incarnation > current_incarnation or
+                    incarnation == current_incarnation and
+                    current_state != protocol.DEAD)
+
+            if not accepted:
+                return False
+
+        self._members[node_id] = (state, incarnation)
+        self._gossip(node_id, state, incarnation)
+
+        if state == protocol.ALIVE:
+            node.mark_as_alive()
+
+        elif state == protocol.SUSPECT:
+            node.mark_as_suspect()
+
+        else:
+            node.mark_as_dead()
+
+        return True
+
+    def _repeat(self, cluster, gateways, socket):
+        with self._lock:
+            if self._phase == 0:
+                self._probe_directly(cluster, socket)
+
+            else:
+                self._probe_indirectly(cluster, socket)
+
+            self._phase = 1 - self._phase
+
+    def _probe_directly(self, cluster, socket):
+        '''
+        Ends the previous protocol period and pings the next member.
+
+        '''
+        now = monotonic()
+
+        # The member probed during the previous period becomes suspect
+        if self._probe and not self._probe[2]:
+            node = self._probe[0]
+            _, incarnation = self._members.get(
+                node.id, (protocol.ALIVE, 0))
+
+            self._apply(cluster, node.id, protocol.SUSPECT, incarnation)
+
+        # Suspect members whose suspicion period is over are dead
+        for node_id, (state, incarnation) in list(self._members.items()):
+            node = cluster.get_by_id(node_id)
+
+            # The node may have been removed by a configuration reload
+            if node is None:
+                del self._members[node_id]
+
+            elif state == protocol.SUSPECT and not node.is_alive:
+                self._apply(cluster, node_id, protocol.DEAD, incarnation)
+
+        # Forgets the relays that have not been acknowledged
+        self._relays = {
+            sequence: relay
+            for sequence, relay in self._relays.items()
+            if relay[2] > now
+        }
+
+        if not self._targets:
+            self._targets = [
+                node
+                for node in cluster.nodes
+                if not node.is_current_node
+            ]
+
+            shuffle(self._targets)
+
+        if not self._targets:
+            self._probe = None
+            return
+
+        node = self._targets.pop()
+        sequence = self._next_sequence()
+        self._probe = [node, sequence, False]
+
+        self._send(socket, protocol.SWIM_PING, node, sequence)
+
+    def _probe_indirectly(self, cluster, socket):
+        '''
+        Asks other members to ping the member that did not respond.
+
+        '''
+        if not self._probe or self._probe[2]:
+            return
+
+        node, sequence, _ = self._probe
+
+        # Dead members are only probed directly
+        if not node.is_alive:
+            return
+
+        relays = [
+            relay
+            for relay in cluster.nodes
+            if (relay is not node and
+                not relay.is_current_node and
+                relay.is_alive)
+        ]
+
+        for relay in sample(relays, min(len(relays),
+                                        self._indirect_probes)):
+            self._send(
+                socket, protocol.SWIM_PING_REQ, relay, sequence,
+                target_id=node.id)
+
+    def process(self, cluster, socket, node, frame, payload):
+        '''
+        Processes a frame of the SWIM protocol received from a node.
+
+        :type node: Node
+        :param node: The node that sent the frame.
+
+        :type frame: Frame
+        :param frame: The header of the frame.
+
+        :type payload: bytes
+        :param payload: The received datagram.
+
+        '''
+        target_id, updates = protocol.decode_swim(payload, frame)
+
+        with self._lock:
+            # Receiving a frame from a node proves that it is alive
+            state, incarnation = self._members.get(
+                node.id, (None, 0))
+
+            if state != protocol.ALIVE:
+                self._members[node.id] = (protocol.ALIVE, incarnation)
+
+            node.mark_as_alive()
+
+            for update in updates:
+                self._apply(cluster, *update)
+
+            if frame.type == protocol.SWIM_PING:
+                self._send(
+                    socket, protocol.SWIM_ACK, node, frame.sequence,
+                    target_id=cluster.current_node.id)
+
+            elif frame.type == protocol.SWIM_PING_REQ:
+                target = cluster.get_by_id(target_id)
+
+                if target is None or target.is_current_node:
+                    return
+
+                sequence = self._next_sequence()
+                deadline = monotonic() + self._period
+                self._relays[sequence] = (node, frame.sequence, deadline)
+
+                self._send(socket, protocol.SWIM_PING, target, sequence)
+
+            elif frame.type == protocol.SWIM_ACK:
+                if (self._probe and
+                    self._probe[1] == frame.sequence and
+                    self._probe[0].id == target_id):
+                    self._probe[2] = True
+
+                elif frame.sequence in self._relays:
+                    requester, sequence, _ = self._relays.pop(
+                        frame.sequence)
+
+                    self._send(
+                        socket, protocol.SWIM_ACK, requester, sequence,
+                        target_id=target_id)
+
+    @property
+    def incarnation(self):
+        '''
+        The incarnation number of the current node.
+
+        '''
+        return self._incarnation
+
+    @property
+    def members(self):
+        '''
+        A dictionary containing the state and the incarnation number of
+        each known member, indexed by node identifier.
+
+        '''
+        return dict(self._members)
@@ -24,9 +24,11 @@
     <https://www.gnu.org/licenses/>.
 '''
 
-from os import getpid, geteuid
+from ipaddress import IPv4Address, ip_interface
+from os import getpid, geteuid, environ
 from pathlib import PosixPath
 from re import findall, sub
+from socket import socket, getaddrinfo, AF_INET, AF_UNIX, SOCK_DGRAM
 from subprocess import run, SubprocessError, DEVNULL, STDOUT
 
 
@@ -47,6 +49,20 @@ def parse_command(string):
     ]
 
 
+def parse_ip_interface(string):
+    '''
+    Checks that a string is an IP address followed by a prefix length
+    (`10.0.0.100/24`) and normalizes it. Returns a `str`.
+
+    :raises ValueError: If the string is not valid.
+
+    '''
+    if '/' not in string:
+        raise ValueError(f'{string} has no prefix length')
+
+    return str(ip_interface(string))
+
+
 def run_command(command):
     '''
     Executes the command passed in parameters and waits for the end of
@@ -62,32 +78,80 @@ def run_command(command):
         return False
 
 
-def dump_cluster(cluster):
+def is_ip_address(address):
     '''
-    Describes the status of the nodes of a cluster object in a string.
+    Indicates whether the specified address is an IPv4 address rather
+    than an FQDN. Returns a `boolean`.
 
     '''
-    dump = 'STATUS'
+    try:
+        IPv4Address(address)
+        return True
 
-    for node in cluster.nodes:
-        status = int(node.is_alive) + int(node.is_active)
-        dump += f' {node.address}:{status}'
+    except ValueError:
+        return False
 
-    return dump
 
+def resolve(address):
+    '''
+    Resolves an IP address or FQDN into its IPv4 addresses. This
+    function blocks until the name server replies. Returns a `list`,
+    empty if the address cannot be resolved.
+
+    '''
+    try:
+        infos = getaddrinfo(address, None, AF_INET, SOCK_DGRAM)
+
+    except OSError:
+        return []
+
+    addresses = []
+
+    for *_, sockaddr in infos:
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
 
-def read_cluster_dump(dump):
+    return addresses
+
+
+def notify_systemd(state):
+    '''
+    Sends a state notification to systemd (for example, `READY=1`),
+    if the program runs as a service of type `notify`. Returns a
+    `boolean` indicating whether the notification has been sent.
+
+    '''
+    address = environ.get('NOTIFY_SOCKET')
+
+    if not address:
+        return False
+
+    # Abstract namespace
+    if address[0] == '@':
+        address = '\0' + address[1:]
+
+    try:
+        with socket(AF_UNIX, SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode())
+
+        return True
+
+    except OSError:
+        return False
+
+
+def dump_cluster(cluster):
     '''
-    Reads the sequence generated by the `dump_cluster` function and
-    returns a dictionary containing the status of the nodes.
+    Describes the status of the nodes of a cluster object in a string.
 
     '''
-    pattern = r'([a-zA-Z0-9.-]*):([0-2])'
+    dump = 'STATUS'
 
-    return {
-        address: int(status)
-        for address, status in findall(pattern, dump)
-    }
+    for node in cluster.snapshot.nodes:
+        dump += f' {node.address}:{node.status}'
+
+    return dump
 
 
 def is_root():
@@ -0,0 +1,49 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    Tests the cluster with the different failure detectors.
+'''
+
+from os.path import dirname, abspath
+from sys import path
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from unittest import TestCase, main
+
+from src.models import Cluster, Node
+from src.detectors import MembershipDetector
+
+
+class SwimClusterTest(TestCase):
+    def setUp(self):
+        self.cluster = Cluster()
+        self.cluster.register(
+            Node(1, '10.0.0.1', 7500, 2, is_current_node=True),
+            Node(2, '10.0.0.2', 7500, 2, is_current_node=False,
+                 detector=MembershipDetector(2)))
+
+        self.node = self.cluster.nodes[1]
+
+    def test_next_expiry_of_a_node_not_suspected(self):
+        self.node.mark_as_alive()
+
+        self.assertTrue(self.node.is_alive)
+        self.assertIsNone(self.cluster.next_expiry)
+
+    def test_next_expiry_of_a_suspected_node(self):
+        self.node.mark_as_alive()
+        self.node.mark_as_suspect()
+
+        self.assertTrue(0 < self.cluster.next_expiry <= 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+'''
+    OnionHA
+    ~~~~~~~
+
+        https://github.com/ValentinBELYN/OnionHA
+
+    :copyright: Copyright 2017-2020 Valentin BELYN.
+    :license: GNU GPLv3, see the LICENSE for details.
+
+    ~~~~~~~
+
+    Exchanges heartbeats between two nodes on the loopback interface.
+'''
+
+from os.path import dirname, abspath
+from sys import path
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from socket import timeout
+from unittest import TestCase, main
+
+from src.models import Cluster, Node
+from src.services import HeartbeatService, ListenerService
+from src.sockets import UDPSocket
+
+
+_ADDRESSES = ('127.0.0.1', '127.0.0.2')
+_PORT = 7590
+
+
+class _Peer:
+    '''
+    A node of a two-node cluster, with its own socket and services.
+
+    '''
+    def __init__(self, address):
+        self.cluster = Cluster()
+        self.cluster.register(*(
+            Node(
+                id=i,
+                address=node_address,
+                port=_PORT,
+                deadtime=2,
+                is_current_node=node_address == address)
+            for i, node_address in enumerate(_ADDRESSES, 1)
+        ))
+
+        self.socket = UDPSocket()
+        self.socket.bind(address, _PORT)
+
+        self.heartbeat = HeartbeatService(
+            self.cluster, [], self.socket, echo_interval=0.01)
+        self.listener = ListenerService(self.cluster, [], self.socket)
+
+    def send(self):
+        self.heartbeat._repeat(self.cluster, [], self.socket)
+
+    def receive(self):
+        while True:
+            try:
+                payload, address, port = self.socket.receive(timeout=0.1)
+
+            except timeout:
+                return
+
+            self.listener._process(
+                self.cluster, self.socket, payload, address, port)
+
+    def close(self):
+        self.socket.close()
+
+
+class TwoNodesTest(TestCase):
+    def setUp(self):
+        self.peers = [_Peer(address) for address in _ADDRESSES]
+
+    def tearDown(self):
+        for peer in self.peers:
+            peer.close()
+
+    def _exchange(self, ticks):
+        for _ in range(ticks):
+            for peer in self.peers:
+                peer.send()
+
+            for peer in self.peers:
+                peer.receive()
+
+    def _remote_node(self, peer):
+        return next(
+            node
+            for node in peer.cluster.nodes
+            if not node.is_current_node)
+
+    def test_binary_protocol_is_kept(self):
+        self._exchange(5)
+
+        for peer in self.peers:
+            node = self._remote_node(peer)
+
+            self.assertEqual(node.protocol, 'binary')
+            self.assertEqual(node.packets_received, 5)
+            self.assertEqual(node.packets_lost, 0)
+
+    def test_round_trip_time_is_measured(self):
+        self._exchange(5)
+
+        # The echo requested on the last interval is answered once the
+        # remote node has received the heartbeat
+        for peer in self.peers:
+            peer.receive()
+
+        for peer in self.peers:
+            node = self._remote_node(peer)
+
+            self.assertEqual(node.rtt_histogram.count, 5)
+            self.assertEqual(node.jitter_histogram.count, 4)
+            self.assertIsNotNone(node.rtt_histogram.percentile(99))
+
+
+if __name__ == '__main__':
+    main()